@@ -25,5 +25,6 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown():
-    from .routers.network import topology_manager
-    topology_manager.stop_network()
\ No newline at end of file
+    from .routers.network import emulator_manager, trace_scheduler
+    trace_scheduler.shutdown()
+    emulator_manager.stop_all()
\ No newline at end of file
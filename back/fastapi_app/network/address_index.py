@@ -0,0 +1,100 @@
+from bisect import bisect_left, bisect_right
+from ipaddress import IPv4Interface, IPv4Network
+
+
+def _mask(length):
+    return (0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF
+
+
+class AddressSpaceIndex:
+    """
+    Индекс адресного пространства IPv4 для проверок топологии.
+    Подсети хранятся отсортированным списком интервалов по (началу, длине
+    префикса). Префиксы либо вложены, либо не пересекаются, поэтому
+    пересекающиеся с подсетью - это объемлющие её (не более 33 надсетей,
+    поиск по словарю) и вложенные в неё (диапазон начал, бинарный поиск).
+    Адреса интерфейсов индексируются отдельно для поиска дубликатов.
+    """
+
+    def __init__(self):
+        self._networks = {}
+        self._addresses = {}
+        self._sorted = None
+        self._starts = None
+
+    def add(self, address, owner):
+        """Добавляет адрес интерфейса (IPv4Interface) или подсеть (IPv4Network) с владельцем"""
+        if isinstance(address, IPv4Interface):
+            self._addresses.setdefault(address.ip, []).append(owner)
+            network = address.network
+        elif isinstance(address, IPv4Network):
+            network = address
+        else:
+            network = IPv4Network(address, strict=False)
+        key = (int(network.network_address), network.prefixlen)
+        entry = self._networks.get(key)
+        if entry is None:
+            entry = self._networks[key] = (network, [])
+            self._sorted = None
+        entry[1].append(owner)
+
+    def __len__(self):
+        return len(self._networks)
+
+    def owners(self, network):
+        entry = self._networks.get((int(network.network_address), network.prefixlen))
+        return list(entry[1]) if entry else []
+
+    def _index(self):
+        if self._sorted is None:
+            keys = sorted(self._networks)
+            self._sorted = [self._networks[key][0] for key in keys]
+            self._starts = [key[0] for key in keys]
+        return self._sorted
+
+    def _supernets(self, network):
+        start = int(network.network_address)
+        for length in range(network.prefixlen + 1):
+            entry = self._networks.get((start & _mask(length), length))
+            if entry is not None:
+                yield entry[0]
+
+    def _contained_range(self, network):
+        networks = self._index()
+        lo = bisect_left(self._starts, int(network.network_address))
+        hi = bisect_right(self._starts, int(network.broadcast_address))
+        return networks, lo, hi
+
+    def overlaps(self, network):
+        """Есть ли в индексе подсеть, пересекающаяся с network (равная, объемлющая или вложенная)"""
+        if next(self._supernets(network), None) is not None:
+            return True
+        _, lo, hi = self._contained_range(network)
+        return lo < hi
+
+    def overlapping(self, network):
+        """Подсети индекса, пересекающиеся с network: объемлющие, равная и вложенные"""
+        result = list(self._supernets(network))
+        networks, lo, hi = self._contained_range(network)
+        result.extend(n for n in networks[lo:hi] if n.prefixlen > network.prefixlen)
+        return result
+
+    def containments(self):
+        """
+        Все пары (объемлющая, вложенная) подсетей разной длины в порядке адресов.
+        Проход по отсортированным интервалам со стеком открытых подсетей:
+        O(n log n + число пар).
+        """
+        pairs = []
+        stack = []
+        for network in self._index():
+            start = int(network.network_address)
+            while stack and int(stack[-1].broadcast_address) < start:
+                stack.pop()
+            pairs.extend((outer, network) for outer in stack)
+            stack.append(network)
+        return pairs
+
+    def duplicates(self):
+        """Адреса, назначенные нескольким интерфейсам: [(адрес, [владельцы])] в порядке добавления"""
+        return [(address, list(owners)) for address, owners in self._addresses.items() if len(owners) > 1]
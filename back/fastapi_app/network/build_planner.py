@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+BUILD_WORKERS = int(os.environ.get('BUILD_WORKERS', '8'))
+
+
+def independent_rounds(pairs):
+    """
+    Разбивает пары узлов (связи) на раунды, в каждом из которых узел встречается
+    не более одного раза. Связи одного раунда можно создавать параллельно:
+    каждая из них изменяет только свои два узла.
+    """
+    rounds = []
+    busy = []
+    for pair in pairs:
+        node1, node2 = pair[0], pair[1]
+        for index, used in enumerate(busy):
+            if node1 not in used and node2 not in used:
+                rounds[index].append(pair)
+                used.update((node1, node2))
+                break
+        else:
+            rounds.append([pair])
+            busy.append({node1, node2})
+    return rounds
+
+
+class BuildStage:
+    """
+    Этап построения сети: набор независимых операций. Операции этапа
+    с parallel=False выполняются по одной - для вызовов, изменяющих общее
+    состояние (создание объектов Mininet).
+    """
+
+    def __init__(self, name, critical=True, parallel=True):
+        self.name = name
+        self.critical = critical
+        self.parallel = parallel
+        self.tasks = []
+        self.duration = 0.0
+        self.errors = []
+
+    def add(self, label, func, *args):
+        self.tasks.append((label, func, args))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "tasks": len(self.tasks),
+            "duration_ms": round(self.duration * 1000, 1),
+            "errors": [{"task": label, "error": str(error)} for label, error in self.errors]
+        }
+
+
+class BuildPlanner:
+    """
+    Планировщик построения сети. Операции группируются в этапы, этапы
+    выполняются по порядку, а операции внутри этапа - параллельно
+    в ограниченном пуле потоков. Для каждого этапа замеряется время.
+    """
+
+    def __init__(self, max_workers=BUILD_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self.stages = []
+        self.duration = 0.0
+
+    def stage(self, name, critical=True, parallel=True):
+        """Добавление нового этапа"""
+        stage = BuildStage(name, critical, parallel)
+        self.stages.append(stage)
+        return stage
+
+    def _run_task(self, stage, label, func, args):
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Error in build stage '{stage.name}' ({label}): {str(e)}")
+            stage.errors.append((label, e))
+
+    def _run_stage(self, stage, executor):
+        started = time.perf_counter()
+        if len(stage.tasks) == 1 or executor is None or not stage.parallel:
+            for label, func, args in stage.tasks:
+                self._run_task(stage, label, func, args)
+        else:
+            futures = [executor.submit(self._run_task, stage, label, func, args) for label, func, args in stage.tasks]
+            for future in futures:
+                future.result()
+        stage.duration = time.perf_counter() - started
+        print(f"Build stage '{stage.name}': {len(stage.tasks)} tasks in {stage.duration:.3f}s")
+
+    def run(self):
+        """
+        Выполнение всех этапов. Ошибка в критическом этапе прерывает построение
+        после завершения остальных операций этого этапа.
+        """
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='build') if self.max_workers > 1 else None
+        try:
+            for stage in self.stages:
+                if not stage.tasks:
+                    continue
+                self._run_stage(stage, executor)
+                if stage.critical and stage.errors:
+                    label, error = stage.errors[0]
+                    raise Exception(f"Build stage '{stage.name}' failed on {label}: {str(error)}")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            self.duration = time.perf_counter() - started
+        return self.report()
+
+    def report(self):
+        """Отчёт о времени выполнения этапов"""
+        return {
+            "workers": self.max_workers,
+            "total_ms": round(self.duration * 1000, 1),
+            "stages": [stage.to_dict() for stage in self.stages if stage.tasks]
+        }
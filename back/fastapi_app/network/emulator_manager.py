@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import threading
+import time
+from .topology import NetworkTopology
+from .packet_tracer import PacketTracer
+from .topology_validator import TopologyValidator
+from .traffic_generator import TrafficGenerator
+from .measurement import NetworkMeasurement
+
+MAX_INSTANCES = int(os.environ.get('MAX_EMULATOR_INSTANCES', '8'))
+IDLE_TIMEOUT = float(os.environ.get('EMULATOR_IDLE_TIMEOUT', '300'))
+# Префикс имени моста "t<slot>" и имя коммутатора вместе должны уложиться
+# в ограничение длины имени интерфейса Linux (15 символов)
+MAX_SLOTS = 1000
+
+
+class InstanceLimitReached(Exception):
+    """Все разрешённые экземпляры эмулятора заняты"""
+
+
+class EmulatorInstance:
+    """
+    Изолированный экземпляр эмулятора одного пользователя: своя сеть Mininet,
+    свой распределитель адресов и трассировщик. Коммутаторы и мосты OVS
+    получают префикс экземпляра, хосты и маршрутизаторы изолированы
+    собственными сетевыми пространствами имён.
+    """
+
+    def __init__(self, key, slot, ip_base='10.0.0.0/24'):
+        self.key = key
+        self.slot = slot
+        self.prefix = f"t{slot}"
+        self.topology = NetworkTopology(name_prefix=self.prefix, ip_base=ip_base)
+        self.packet_tracer = PacketTracer(self.topology)
+        self.topology_validator = TopologyValidator(self.topology)
+        self.traffic_generator = TrafficGenerator(self.topology)
+        self.measurement = NetworkMeasurement(self.topology)
+        self.last_used = time.monotonic()
+        self._users = 0
+        self._lock = threading.Lock()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self):
+        """Пометка экземпляра как занятого на время операции (построение сети и т.п.)"""
+        with self._lock:
+            self._users += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._users -= 1
+            self.touch()
+
+    def has_running_traces(self):
+        return any(trace.get("state") == "in_progress" for trace in list(self.packet_tracer.traces.values()))
+
+    def is_idle(self, timeout=IDLE_TIMEOUT, now=None):
+        """Экземпляр не используется и не обращался к сети дольше timeout секунд"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            busy = self._users > 0
+        return not busy and not self.has_running_traces() and now - self.last_used >= timeout
+
+    def get_status(self):
+        return {
+            "key": self.key,
+            "prefix": self.prefix,
+            "running": self.topology.is_running(),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "nodes": len(self.topology.nodes)
+        }
+
+
+class EmulatorManager:
+    """
+    Экземпляры эмулятора по пользователям. Число одновременно запущенных
+    сетей ограничено MAX_INSTANCES; при нехватке места останавливается
+    давно не используемая сеть (LRU), а если таких нет - запуск отклоняется.
+    """
+
+    def __init__(self, max_instances=MAX_INSTANCES, idle_timeout=IDLE_TIMEOUT):
+        self.max_instances = max(1, max_instances)
+        self.idle_timeout = idle_timeout
+        self._instances = OrderedDict()
+        self._lock = threading.RLock()
+        # Экземпляры, сеть которых строится (место под неё зарезервировано),
+        # и вытесняемые экземпляры, сеть которых останавливается
+        self._starting = set()
+        self._evicting = set()
+
+    def _free_slot(self):
+        used = {instance.slot for instance in self._instances.values()}
+        for slot in range(MAX_SLOTS):
+            if slot not in used:
+                return slot
+        # Слоты закончились: освобождаем слот самого давнего остановленного экземпляра
+        for key, instance in self._instances.items():
+            if not instance.topology.is_running():
+                del self._instances[key]
+                return instance.slot
+        raise InstanceLimitReached("No free emulator slots")
+
+    def get(self, key):
+        """Экземпляр эмулятора пользователя; создаётся при первом обращении"""
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is None:
+                instance = EmulatorInstance(key, self._free_slot())
+                self._instances[key] = instance
+            self._instances.move_to_end(key)
+            instance.touch()
+            return instance
+
+    def running(self):
+        with self._lock:
+            return [instance for instance in self._instances.values() if instance.topology.is_running()]
+
+    @contextmanager
+    def make_room(self, instance):
+        """
+        Место под запуск сети экземпляра на время построения. Проверка лимита
+        и резерв места выполняются под одной блокировкой, поэтому параллельные
+        запуски не превышают max_instances. При достижении лимита
+        останавливается наиболее давно использованная простаивающая сеть;
+        резерв снимается только после её остановки и построения своей сети.
+        """
+        victim = None
+        with self._lock:
+            if instance.topology.is_running() or instance.key in self._starting:
+                reserved = False
+            else:
+                occupied = {other.key for other in self._instances.values() if other.topology.is_running()}
+                occupied |= self._starting
+                occupied.discard(instance.key)
+                if len(occupied) >= self.max_instances:
+                    now = time.monotonic()
+                    victim = next((other for other in self._instances.values()
+                                   if other.key in occupied and other.key not in self._starting
+                                   and other.key not in self._evicting
+                                   and other.topology.is_running() and other.is_idle(self.idle_timeout, now)), None)
+                    if victim is None:
+                        raise InstanceLimitReached(
+                            f"All {self.max_instances} emulator instances are busy, try again later")
+                    self._evicting.add(victim.key)
+                    print(f"Evicting idle emulator instance {victim.prefix} (user {victim.key})")
+                self._starting.add(instance.key)
+                reserved = True
+        try:
+            if victim is not None:
+                try:
+                    victim.topology.stop_network()
+                finally:
+                    with self._lock:
+                        self._evicting.discard(victim.key)
+            yield victim.key if victim is not None else None
+        finally:
+            if reserved:
+                with self._lock:
+                    self._starting.discard(instance.key)
+
+    def create_network(self, instance, config):
+        """Запуск сети экземпляра с учётом лимита запущенных сетей"""
+        with instance.use(), self.make_room(instance):
+            instance.topology.create_network(config)
+
+    def reconcile_network(self, instance, config):
+        """Применение изменений к сети экземпляра с учётом лимита запущенных сетей"""
+        with instance.use(), self.make_room(instance):
+            return instance.topology.reconcile_network(config)
+
+    def stop(self, key):
+        with self._lock:
+            instance = self._instances.get(key)
+        if instance is not None and instance.topology.is_running():
+            with instance.use():
+                instance.topology.stop_network()
+
+    def stop_all(self):
+        for instance in self.running():
+            try:
+                instance.topology.stop_network()
+            except Exception as e:
+                print(f"Error stopping emulator instance {instance.prefix}: {str(e)}")
+
+    def get_stats(self):
+        with self._lock:
+            instances = [instance.get_status() for instance in self._instances.values()]
+        return {
+            "max_instances": self.max_instances,
+            "idle_timeout": self.idle_timeout,
+            "running": sum(1 for status in instances if status["running"]),
+            "instances": instances
+        }
@@ -0,0 +1,457 @@
+from ipaddress import IPv4Address, IPv4Interface
+from collections import deque
+from .routing_table import RoutingTable
+from .ip_allocator import IPAllocator
+
+
+def node_kind(name):
+    """Определяет тип узла по префиксу имени (r - маршрутизатор, s - коммутатор, иначе хост)"""
+    if name.startswith('r'):
+        return 'router'
+    if name.startswith('s'):
+        return 'switch'
+    return 'host'
+
+
+def parse_interface(ip, default_mask=24):
+    """Разбирает строку вида 'a.b.c.d[/mask]' в IPv4Interface, возвращает None для пустых и неверных адресов"""
+    if not ip:
+        return None
+    ip = str(ip)
+    if '/' not in ip:
+        ip = f"{ip}/{default_mask}"
+    try:
+        interface = IPv4Interface(ip)
+    except ValueError:
+        return None
+    if interface.ip == IPv4Address('0.0.0.0'):
+        return None
+    return interface
+
+
+class NextHop:
+    """Решение о пересылке: интерфейс, следующий L3-узел и сеть, по которой он выбран"""
+    __slots__ = ('interface', 'target', 'network')
+
+    def __init__(self, interface, target, network=None):
+        self.interface = interface
+        self.target = target
+        self.network = network
+
+
+class ForwardingModel:
+    """
+    Скомпилированная модель пересылки для активной сети.
+    Строится один раз на версию топологии и содержит смежность узлов,
+    таблицы пересылки маршрутизаторов и L2-сегменты коммутаторов.
+    """
+
+    def __init__(self, version=0):
+        self.version = version
+        self.kinds = {}
+        self.ports = {}
+        self.addresses = {}
+        self.ip_index = {}
+        self.fibs = {}
+        self._shared_fibs = set()
+        self.segment_of = {}
+        self.segment_switches = {}
+        self._names = {}
+        self._next_segment = 0
+        self._l2_paths = {}
+        self._neighbors = {}
+        self._gateways = {}
+
+    @classmethod
+    def compile(cls, topology_manager):
+        """Компилирует модель из менеджера топологии (Mininet и конфигурация из БД)"""
+        model = cls(topology_manager.version)
+
+        for name, node in topology_manager.nodes.items():
+            model.add_node(name, node)
+            table = topology_manager.routing_tables.get(name)
+            if table is not None and model.kinds[name] == 'router':
+                model.fibs[name] = table
+                model._shared_fibs.add(name)
+
+        net = topology_manager.net
+        if net is not None and hasattr(net, 'links'):
+            for link in net.links:
+                model.add_mininet_link(link)
+
+        for name, node in topology_manager.nodes.items():
+            if model.kinds[name] == 'switch':
+                continue
+            try:
+                interfaces = node.intfList()
+            except Exception:
+                interfaces = []
+            for intf in interfaces:
+                if intf.name != 'lo' and getattr(intf, 'ip', None):
+                    model.set_address(name, intf.name, f"{intf.ip}/{getattr(intf, 'prefixLen', None) or 24}")
+
+        db = topology_manager.active_topology
+        if db is not None:
+            model.load_addresses(db.hosts or [], getattr(db, 'routers', None) or [])
+
+        for switch_name, ip in topology_manager.switch_ip_map.items():
+            model.index_ip(ip, switch_name)
+
+        return model
+
+    @classmethod
+    def from_config(cls, config, version=0, ip_base='10.0.0.0/24'):
+        """
+        Строит модель по конфигурации топологии из БД без запущенной сети.
+        Интерфейсы именуются как в Mininet - {узел}-eth{n} в порядке связей,
+        у коммутаторов нумерация с 1; хостам без адреса выделяются адреса из ip_base.
+        """
+        model = cls(version)
+        for section in ('hosts', 'switches', 'routers'):
+            for node in config.get(section) or []:
+                model.add_node(node['name'])
+
+        next_port = {name: 1 if kind == 'switch' else 0 for name, kind in model.kinds.items()}
+        for link in config.get('links') or []:
+            node1, node2 = link.get('node1'), link.get('node2')
+            if node1 not in model.kinds or node2 not in model.kinds or node1 == node2:
+                continue
+            intf1 = f"{node1}-eth{next_port[node1]}"
+            intf2 = f"{node2}-eth{next_port[node2]}"
+            next_port[node1] += 1
+            next_port[node2] += 1
+            model.add_link(node1, intf1, node2, intf2)
+
+        allocator = IPAllocator()
+        allocator.add_pool(ip_base)
+        for section in ('hosts', 'switches', 'routers'):
+            for node in config.get(section) or []:
+                for ip in [node.get('ip')] + [intf.get('ip') for intf in node.get('interfaces') or []]:
+                    if parse_interface(ip) is not None:
+                        allocator.reserve(ip, owner=node['name'])
+
+        hosts = []
+        for db_host in config.get('hosts') or []:
+            if not db_host.get('ip'):
+                db_host = {**db_host, 'ip': str(allocator.allocate(owner=db_host['name']))}
+            hosts.append(db_host)
+        model.load_addresses(hosts, config.get('routers') or [])
+
+        for switch in config.get('switches') or []:
+            model.index_ip(switch.get('ip'), switch['name'])
+        return model
+
+    def add_node(self, name, node=None):
+        """Добавляет узел в модель"""
+        self.kinds[name] = node_kind(name)
+        self.ports.setdefault(name, {})
+        self.addresses.setdefault(name, {})
+        if node is not None:
+            self._names[id(node)] = name
+        if self.kinds[name] == 'router':
+            self.fibs.setdefault(name, RoutingTable())
+        elif self.kinds[name] == 'switch' and name not in self.segment_of:
+            self._new_segment(name)
+
+    def name_of(self, node):
+        """Возвращает имя узла в модели для объекта Mininet"""
+        return self._names.get(id(node), node.name)
+
+    def attach_node(self, name, node):
+        """Добавляет узел Mininet вместе с его связями и адресами"""
+        self.add_node(name, node)
+        for intf in node.intfList():
+            if intf.name == 'lo':
+                continue
+            if getattr(intf, 'link', None):
+                self.add_mininet_link(intf.link)
+            if self.kinds[name] != 'switch' and getattr(intf, 'ip', None):
+                self.set_address(name, intf.name, f"{intf.ip}/{getattr(intf, 'prefixLen', None) or 24}")
+
+    def add_mininet_link(self, link):
+        """Добавляет связь Mininet"""
+        n1 = self.name_of(link.intf1.node)
+        n2 = self.name_of(link.intf2.node)
+        if n1 not in self.kinds or n2 not in self.kinds:
+            return
+        self.add_link(n1, link.intf1.name, n2, link.intf2.name)
+
+    def add_link(self, node1, intf1, node2, intf2):
+        """Добавляет связь между интерфейсами двух узлов, объединяя L2-сегменты при необходимости"""
+        self.ports[node1][intf1] = (node2, intf2)
+        self.ports[node2][intf2] = (node1, intf1)
+        if self.kinds[node1] == 'switch' and self.kinds[node2] == 'switch':
+            self._merge_segments(self.segment_of[node1], self.segment_of[node2])
+        self._l2_paths = {}
+        self._neighbors = {}
+        self._gateways = {}
+
+    def set_address(self, name, interface, ip):
+        """Назначает адрес интерфейсу узла; для маршрутизатора добавляет подключённую сеть"""
+        address = parse_interface(ip)
+        if address is None or name not in self.kinds:
+            return
+        previous = self.addresses[name].get(interface)
+        if previous is not None and self.ip_index.get(str(previous.ip)) == (name, interface):
+            del self.ip_index[str(previous.ip)]
+        self.addresses[name][interface] = address
+        self.ip_index[str(address.ip)] = (name, interface)
+        self._gateways = {}
+        if self.kinds[name] == 'router' and name not in self._shared_fibs:
+            self.fibs[name].add_connected(address.network, interface)
+
+    def index_ip(self, ip, name, interface=None):
+        """Регистрирует адрес узла без влияния на пересылку (например, управляющий IP коммутатора)"""
+        address = parse_interface(ip)
+        if address is not None:
+            self.ip_index.setdefault(str(address.ip), (name, interface))
+
+    def add_route(self, router, network, next_hop=None, interface=None):
+        """
+        Добавляет статический маршрут в таблицу пересылки маршрутизатора.
+        Таблицы, общие с менеджером топологии, уже содержат маршрут и не изменяются.
+        """
+        if router not in self.fibs or router in self._shared_fibs:
+            return
+        try:
+            self.fibs[router].add_static(network, next_hop, interface)
+        except ValueError:
+            return
+
+    def load_addresses(self, hosts, routers):
+        """Дополняет модель адресами и маршрутами из конфигурации топологии в БД"""
+        for db_host in hosts:
+            name = db_host.get('name')
+            if name in self.kinds and not self.addresses[name] and db_host.get('ip'):
+                self.set_address(name, self._first_port(name), db_host['ip'])
+
+        for db_router in routers:
+            name = db_router.get('name')
+            if name not in self.kinds:
+                continue
+            for intf in db_router.get('interfaces') or []:
+                if not intf.get('ip'):
+                    continue
+                interface = intf.get('name')
+                if interface not in self.ports[name]:
+                    interface = self._first_port(name, unaddressed=True) or interface
+                self.set_address(name, interface, intf['ip'] if '/' in intf['ip'] else f"{intf['ip']}/{intf.get('subnet_mask', 24)}")
+            for route in db_router.get('routes') or []:
+                if route.get('network'):
+                    self.add_route(name, route['network'], route.get('next_hop'), route.get('interface'))
+
+    def _first_port(self, name, unaddressed=False):
+        for interface in sorted(self.ports[name]):
+            if not unaddressed or interface not in self.addresses[name]:
+                return interface
+        return None
+
+    def _new_segment(self, switch):
+        segment = self._next_segment
+        self._next_segment += 1
+        self.segment_of[switch] = segment
+        self.segment_switches[segment] = {switch}
+
+    def _merge_segments(self, a, b):
+        if a == b:
+            return
+        if len(self.segment_switches[a]) < len(self.segment_switches[b]):
+            a, b = b, a
+        for switch in self.segment_switches.pop(b):
+            self.segment_of[switch] = a
+            self.segment_switches[a].add(switch)
+
+    def owner_of(self, ip):
+        """Возвращает имя узла, которому принадлежит адрес"""
+        owner = self.ip_index.get(ip.split('/')[0] if ip else ip)
+        return owner[0] if owner else None
+
+    def primary_ip(self, name):
+        """Первый адрес узла без маски"""
+        for interface in sorted(self.addresses.get(name, {})):
+            return str(self.addresses[name][interface].ip)
+        return None
+
+    def owns_ip(self, name, ip):
+        return self.owner_of(ip) == name
+
+    def segment_nodes(self, names):
+        """Узлы и все участники их L2-сегментов (коммутаторы и подключённые к ним узлы)"""
+        result = set()
+        segments = set()
+        for name in names:
+            if name not in self.kinds:
+                continue
+            result.add(name)
+            if self.kinds[name] == 'switch':
+                segments.add(self.segment_of[name])
+            for peer, _ in self.ports[name].values():
+                result.add(peer)
+                if self.kinds[peer] == 'switch':
+                    segments.add(self.segment_of[peer])
+        for segment in segments:
+            for switch in self.segment_switches[segment]:
+                result.add(switch)
+                result.update(other for other, _ in self.ports[switch].values())
+        return result
+
+    def l2_domain(self, name, interface):
+        """Ключ L2-домена интерфейса: сегмент коммутаторов или прямая связь двух узлов"""
+        peer = self.ports.get(name, {}).get(interface)
+        if peer is None:
+            return None
+        if self.kinds[peer[0]] == 'switch':
+            return ('segment', self.segment_of[peer[0]])
+        return ('link',) + tuple(sorted([(name, interface), peer]))
+
+    def l2_neighbors(self, name, interface):
+        """L3-узлы, достижимые через интерфейс без маршрутизации (не изменять - множество кэшируется)"""
+        key = (name, interface)
+        if key in self._neighbors:
+            return self._neighbors[key]
+        peer = self.ports.get(name, {}).get(interface)
+        if peer is None:
+            members = frozenset()
+        elif self.kinds[peer[0]] != 'switch':
+            members = frozenset([peer[0]])
+        else:
+            members = frozenset(
+                other
+                for switch in self.segment_switches[self.segment_of[peer[0]]]
+                for other, _ in self.ports[switch].values()
+                if self.kinds[other] != 'switch' and other != name
+            )
+        self._neighbors[key] = members
+        return members
+
+    def l2_path(self, name, interface, target):
+        """Путь от узла через интерфейс до целевого L3-узла: промежуточные коммутаторы и сама цель"""
+        peer = self.ports.get(name, {}).get(interface)
+        if peer is None:
+            return None
+        neighbor = peer[0]
+        if neighbor == target:
+            return [target]
+        if self.kinds[neighbor] != 'switch':
+            return None
+
+        key = (neighbor, target)
+        if key in self._l2_paths:
+            return self._l2_paths[key]
+
+        parents = {neighbor: None}
+        queue = deque([neighbor])
+        found = None
+        while queue:
+            switch = queue.popleft()
+            if any(other == target for other, _ in self.ports[switch].values()):
+                found = switch
+                break
+            for other, _ in self.ports[switch].values():
+                if self.kinds[other] == 'switch' and other not in parents:
+                    parents[other] = switch
+                    queue.append(other)
+
+        path = None
+        if found is not None:
+            path = [target]
+            while found is not None:
+                path.append(found)
+                found = parents[found]
+            path.reverse()
+        self._l2_paths[key] = path
+        return path
+
+    def l3_path(self, name, dest_ip, max_hops=20):
+        """
+        L3-узлы на пути от узла к адресу (без коммутаторов) и итог:
+        reachable, no_route, loop или timeout
+        """
+        path = [name]
+        current = name
+        while not self.owns_ip(current, dest_ip):
+            if len(path) > max_hops:
+                return path, 'timeout'
+            next_hop = self.next_hop(current, dest_ip)
+            if next_hop is None or not self.l2_path(current, next_hop.interface, next_hop.target):
+                return path, 'no_route'
+            if next_hop.target in path:
+                return path, 'loop'
+            path.append(next_hop.target)
+            current = next_hop.target
+        return path, 'reachable'
+
+    def next_hop(self, name, dest_ip):
+        """Определяет следующий L3-узел для адреса назначения или None, если маршрута нет"""
+        try:
+            address = IPv4Address(dest_ip)
+        except ValueError:
+            return None
+        return self.resolve_next_hop(name, address, self.owner_of(dest_ip))
+
+    def resolve_next_hop(self, name, address, dest):
+        """next_hop для уже разобранного адреса и известного владельца (для массовых расчётов)"""
+        if self.kinds.get(name) == 'router':
+            return self._router_next_hop(name, address, dest)
+        if self.kinds.get(name) == 'host':
+            return self._host_next_hop(name, address, dest)
+        return None
+
+    def _host_next_hop(self, name, address, dest):
+        addresses = self.addresses[name]
+
+        if dest:
+            for interface in sorted(self.ports[name]):
+                own = addresses.get(interface)
+                if (own is None or address in own.network) and dest in self.l2_neighbors(name, interface):
+                    return NextHop(interface, dest, own.network if own else None)
+
+        return self.host_gateway(name)
+
+    def host_gateway(self, name):
+        """Шлюз хоста для адресов вне его сегментов; от адреса назначения не зависит"""
+        if name in self._gateways:
+            return self._gateways[name]
+        addresses = self.addresses[name]
+        ports = sorted(self.ports[name])
+        fallback = None
+        for interface in ports:
+            own = addresses.get(interface)
+            for neighbor in sorted(self.l2_neighbors(name, interface)):
+                if self.kinds[neighbor] != 'router':
+                    continue
+                if own is not None and any(a.ip in own.network for a in self.addresses[neighbor].values()):
+                    self._gateways[name] = NextHop(interface, neighbor, own.network)
+                    return self._gateways[name]
+                if fallback is None:
+                    fallback = NextHop(interface, neighbor, own.network if own else None)
+        self._gateways[name] = fallback
+        return fallback
+
+    def _router_next_hop(self, name, address, dest):
+        entry = self.fibs[name].lookup(address)
+        if entry is None:
+            return None
+
+        if entry.kind == 'connected':
+            if dest and dest in self.l2_neighbors(name, entry.interface):
+                return NextHop(entry.interface, dest, entry.network)
+            return None
+
+        if entry.next_hop:
+            gateway = self.owner_of(entry.next_hop)
+            if gateway is None:
+                return None
+            interfaces = [entry.interface] if entry.interface else sorted(self.ports[name])
+            for interface in interfaces:
+                if gateway in self.l2_neighbors(name, interface):
+                    return NextHop(interface, gateway, entry.network)
+            return None
+
+        if entry.interface:
+            neighbors = self.l2_neighbors(name, entry.interface)
+            if dest in neighbors:
+                return NextHop(entry.interface, dest, entry.network)
+            if len(neighbors) == 1:
+                return NextHop(entry.interface, next(iter(neighbors)), entry.network)
+        return None
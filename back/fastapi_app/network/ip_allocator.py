@@ -0,0 +1,248 @@
+from ipaddress import IPv4Address, IPv4Interface, IPv4Network
+import random
+import threading
+
+MAX_POOL_PREFIX = 8
+
+
+class AddressPoolExhausted(Exception):
+    """В пуле не осталось свободных адресов"""
+
+
+class AddressPool:
+    """
+    Пул адресов одной сети. Занятые адреса хранятся в битовой карте,
+    освобождённые - в стеке, поэтому выделение и освобождение выполняются
+    за O(1) (амортизированно) независимо от размера сети.
+    """
+
+    def __init__(self, network, policy='sequential', rng=None):
+        network = IPv4Network(network, strict=False)
+        if network.prefixlen < MAX_POOL_PREFIX:
+            raise ValueError(f"Пул {network} больше допустимого /{MAX_POOL_PREFIX}")
+        if policy not in ('sequential', 'random'):
+            raise ValueError(f"Неизвестная политика выделения адресов: {policy}")
+
+        self.network = network
+        self.policy = policy
+        self._rng = rng or random.Random()
+        if network.prefixlen < 31:
+            self._first = int(network.network_address) + 1
+            self.size = network.num_addresses - 2
+        else:
+            self._first = int(network.network_address)
+            self.size = network.num_addresses
+        self._bitmap = bytearray((self.size + 7) // 8)
+        self._cursor = 0
+        self._free = []
+        self.used = 0
+
+    def __contains__(self, address):
+        return 0 <= int(IPv4Address(address)) - self._first < self.size
+
+    def _is_set(self, index):
+        return self._bitmap[index >> 3] & (1 << (index & 7))
+
+    def _set(self, index):
+        self._bitmap[index >> 3] |= 1 << (index & 7)
+        self.used += 1
+
+    def _address(self, index):
+        return IPv4Interface((self._first + index, self.network.prefixlen))
+
+    def allocate(self):
+        """Выделение свободного адреса согласно политике пула"""
+        if self.used >= self.size:
+            raise AddressPoolExhausted(f"Нет доступных IP-адресов в пуле {self.network}")
+
+        if self.policy == 'random' and self.used * 2 < self.size:
+            for _ in range(8):
+                index = self._rng.randrange(self.size)
+                if not self._is_set(index):
+                    self._set(index)
+                    return self._address(index)
+
+        while self._free:
+            index = self._free.pop()
+            if not self._is_set(index):
+                self._set(index)
+                return self._address(index)
+
+        while self._cursor < self.size:
+            index = self._cursor
+            self._cursor += 1
+            if not self._is_set(index):
+                self._set(index)
+                return self._address(index)
+
+        raise AddressPoolExhausted(f"Нет доступных IP-адресов в пуле {self.network}")
+
+    def reserve(self, address):
+        """Пометка конкретного адреса занятым; возвращает False, если он уже занят"""
+        index = int(IPv4Address(address)) - self._first
+        if not 0 <= index < self.size:
+            raise ValueError(f"Адрес {address} не принадлежит пулу {self.network}")
+        if self._is_set(index):
+            return False
+        self._set(index)
+        return True
+
+    def release(self, address):
+        """Освобождение адреса; возвращает False, если адрес не был занят"""
+        index = int(IPv4Address(address)) - self._first
+        if not 0 <= index < self.size or not self._is_set(index):
+            return False
+        self._bitmap[index >> 3] &= ~(1 << (index & 7))
+        self.used -= 1
+        if index < self._cursor:
+            self._free.append(index)
+        return True
+
+    def is_used(self, address):
+        index = int(IPv4Address(address)) - self._first
+        return 0 <= index < self.size and bool(self._is_set(index))
+
+    def reset(self):
+        """Освобождение всех адресов пула"""
+        self._bitmap = bytearray(len(self._bitmap))
+        self._cursor = 0
+        self._free = []
+        self.used = 0
+
+    def to_dict(self):
+        return {
+            "network": str(self.network),
+            "policy": self.policy,
+            "size": self.size,
+            "used": self.used
+        }
+
+
+class IPAllocator:
+    """
+    Распределитель IP-адресов с несколькими непересекающимися пулами.
+    Запоминает владельца каждого адреса, чтобы освобождать адреса узла целиком.
+    """
+
+    def __init__(self, policy='sequential', seed=None):
+        self.policy = policy
+        self.pools = {}
+        self.default_pool = None
+        self._rng = random.Random(seed)
+        self._by_prefix = {}
+        self._owners = {}
+        self._owner_of = {}
+        self._lock = threading.Lock()
+
+    def add_pool(self, network, name=None, policy=None, default=False):
+        """Добавление пула адресов"""
+        network = IPv4Network(network, strict=False)
+        name = name or str(network)
+        with self._lock:
+            if name in self.pools:
+                raise ValueError(f"Пул {name} уже существует")
+            for pool in self.pools.values():
+                if pool.network.overlaps(network):
+                    raise ValueError(f"Пул {network} пересекается с пулом {pool.network}")
+
+            pool = AddressPool(network, policy or self.policy, self._rng)
+            self.pools[name] = pool
+            self._by_prefix.setdefault(network.prefixlen, {})[int(network.network_address)] = pool
+            if default or self.default_pool is None:
+                self.default_pool = name
+            return pool
+
+    def remove_pool(self, name):
+        """Удаление пула вместе со всеми выделенными из него адресами"""
+        with self._lock:
+            pool = self.pools.pop(name)
+            del self._by_prefix[pool.network.prefixlen][int(pool.network.network_address)]
+            if not self._by_prefix[pool.network.prefixlen]:
+                del self._by_prefix[pool.network.prefixlen]
+            for address in [a for a in self._owner_of if a in pool]:
+                self._forget(address)
+            if self.default_pool == name:
+                self.default_pool = next(iter(self.pools), None)
+
+    def _pool_for(self, address):
+        value = int(address)
+        for prefixlen, pools in self._by_prefix.items():
+            pool = pools.get(value & ((0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF))
+            if pool is not None and address in pool:
+                return pool
+        return None
+
+    def _remember(self, address, owner):
+        if owner is not None:
+            self._owner_of[address] = owner
+            self._owners.setdefault(owner, set()).add(address)
+
+    def _forget(self, address):
+        owner = self._owner_of.pop(address, None)
+        if owner is not None:
+            addresses = self._owners.get(owner)
+            if addresses is not None:
+                addresses.discard(address)
+                if not addresses:
+                    del self._owners[owner]
+
+    def allocate(self, pool=None, owner=None):
+        """Выделение адреса из пула (по умолчанию - из основного); возвращает IPv4Interface"""
+        with self._lock:
+            name = pool or self.default_pool
+            if name not in self.pools:
+                raise AddressPoolExhausted("Нет доступных IP-адресов: пул не настроен")
+            interface = self.pools[name].allocate()
+            self._remember(interface.ip, owner)
+            return interface
+
+    def reserve(self, ip, owner=None):
+        """
+        Резервирование явно назначенного адреса. Адреса вне пулов не учитываются.
+        Возвращает False, если адрес уже занят.
+        """
+        address = IPv4Address(str(ip).split('/')[0])
+        with self._lock:
+            pool = self._pool_for(address)
+            if pool is None:
+                return True
+            if not pool.reserve(address):
+                return self._owner_of.get(address) == owner and owner is not None
+            self._remember(address, owner)
+            return True
+
+    def release(self, ip):
+        """Освобождение адреса"""
+        address = IPv4Address(str(ip).split('/')[0])
+        with self._lock:
+            self._forget(address)
+            pool = self._pool_for(address)
+            return pool.release(address) if pool is not None else False
+
+    def release_owner(self, owner):
+        """Освобождение всех адресов, принадлежащих узлу"""
+        with self._lock:
+            addresses = self._owners.pop(owner, set())
+            for address in addresses:
+                self._owner_of.pop(address, None)
+                pool = self._pool_for(address)
+                if pool is not None:
+                    pool.release(address)
+            return [str(address) for address in addresses]
+
+    def release_all(self):
+        """Освобождение всех адресов во всех пулах"""
+        with self._lock:
+            for pool in self.pools.values():
+                pool.reset()
+            self._owners = {}
+            self._owner_of = {}
+
+    def is_used(self, ip):
+        address = IPv4Address(str(ip).split('/')[0])
+        with self._lock:
+            pool = self._pool_for(address)
+            return pool.is_used(address) if pool is not None else False
+
+    def get_stats(self):
+        return {name: pool.to_dict() for name, pool in self.pools.items()}
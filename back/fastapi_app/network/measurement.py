@@ -0,0 +1,185 @@
+import ipaddress
+import math
+import os
+import re
+
+MAX_MEASUREMENT_DURATION = float(os.environ.get('MAX_MEASUREMENT_DURATION', '30'))
+MAX_PROBE_COUNT = 1000
+MAX_SWEEP_TARGETS = int(os.environ.get('MAX_SWEEP_TARGETS', '1024'))
+# Сколько адресов опрашивается одним запросом к агенту
+PING_SWEEP_CHUNK = int(os.environ.get('PING_SWEEP_CHUNK', '64'))
+MAX_SWEEP_COUNT = 10
+# Запас на завершение приёмника после окончания передачи
+SINK_GRACE = 2.0
+
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def rtt_statistics(rtts, sent):
+    """Статистика RTT в миллисекундах: min/avg/p50/p99, джиттер и потери"""
+    received = len(rtts)
+    stats = {
+        "sent": sent,
+        "received": received,
+        "loss_percent": round((sent - received) * 100.0 / sent, 2) if sent else 0.0,
+        "min_ms": None, "avg_ms": None, "max_ms": None,
+        "p50_ms": None, "p99_ms": None, "jitter_ms": None
+    }
+    if not rtts:
+        return stats
+    # Джиттер - средний модуль разности соседних RTT
+    deltas = [abs(current - previous) for previous, current in zip(rtts, rtts[1:])]
+    stats.update({
+        "min_ms": round(min(rtts), 3),
+        "avg_ms": round(sum(rtts) / received, 3),
+        "max_ms": round(max(rtts), 3),
+        "p50_ms": round(percentile(rtts, 0.5), 3),
+        "p99_ms": round(percentile(rtts, 0.99), 3),
+        "jitter_ms": round(sum(deltas) / len(deltas), 3) if deltas else 0.0
+    })
+    return stats
+
+
+class NetworkMeasurement:
+    """
+    Измерения между узлами эмулируемой сети внутри их пространств имён:
+    RTT реальными ICMP-запросами `ping` и пропускная способность TCP/UDP
+    через агентов Scapy узлов (приёмник на узле назначения, передатчик на источнике).
+    """
+
+    def __init__(self, topology_manager):
+        self.topology_manager = topology_manager
+
+    def _node(self, name):
+        node = self.topology_manager.get_node(name)
+        if node is None:
+            raise Exception(f"Node {name} not found")
+        return node
+
+    def _node_ip(self, name):
+        addresses = self.topology_manager.get_node_addresses(name)
+        if addresses:
+            return addresses[0][1].split('/')[0]
+        node = self._node(name)
+        ip = node.IP() if hasattr(node, 'IP') else None
+        if not ip:
+            raise Exception(f"Node {name} has no IP address")
+        return ip
+
+    def rtt(self, source, destination_ip, count=10, interval=0.2, timeout=1):
+        """Серия ICMP-запросов от узла source; статистика по фактическим ответам"""
+        count = max(1, min(int(count), MAX_PROBE_COUNT))
+        interval = max(0.01, float(interval))
+        try:
+            destination_ip = str(ipaddress.IPv4Address(str(destination_ip)))
+        except ValueError:
+            raise Exception(f"Invalid destination IP {destination_ip}")
+        node = self._node(source)
+        output = node.cmd(f"ping -n -c {count} -i {interval} -W {max(1, int(timeout))} {destination_ip}")
+        rtts = [float(match) for match in re.findall(r'time=([\d.]+) ms', output)]
+        stats = rtt_statistics(rtts, count)
+        stats.update({"source": source, "destination_ip": destination_ip})
+        return stats
+
+    def sweep_targets(self, destinations=None, cidr=None):
+        """Список адресов для опроса: явные адреса и узлы плюс адреса сети cidr"""
+        targets = []
+        for destination in destinations or []:
+            destination = destination.split('/')[0]
+            try:
+                ipaddress.IPv4Address(destination)
+                targets.append(destination)
+            except ValueError:
+                targets.append(self._node_ip(destination))
+        if cidr:
+            network = ipaddress.IPv4Network(cidr, strict=False)
+            if network.num_addresses > MAX_SWEEP_TARGETS + 2:
+                raise Exception(f"Network {cidr} is larger than {MAX_SWEEP_TARGETS} addresses")
+            targets.extend(str(address) for address in network.hosts())
+        targets = list(dict.fromkeys(targets))
+        if not targets:
+            raise Exception("No destinations specified")
+        if len(targets) > MAX_SWEEP_TARGETS:
+            raise Exception(f"Too many destinations ({len(targets)} > {MAX_SWEEP_TARGETS})")
+        return targets
+
+    def ping_sweep(self, source, targets, count=1, timeout=1, interval=0):
+        """
+        Проверка достижимости адресов targets от узла source. Путь по модели
+        пересылки считается один раз на адрес, запросы отправляются агентом
+        узла пачками по PING_SWEEP_CHUNK адресов. Генератор возвращает
+        итоги по адресам каждой пачки по мере их получения.
+        """
+        count = max(1, min(int(count), MAX_SWEEP_COUNT))
+        node = self._node(source)
+        agent = self.topology_manager.scapy_agents.get(node)
+        model = self.topology_manager.get_forwarding_model()
+        source_name = model.name_of(node)
+
+        for start in range(0, len(targets), PING_SWEEP_CHUNK):
+            chunk = targets[start:start + PING_SWEEP_CHUNK]
+            rtts = agent.ping_sweep(chunk, count=count, timeout=timeout, interval=interval)
+            summaries = []
+            for target in chunk:
+                path, status = model.l3_path(source_name, target)
+                stats = rtt_statistics(rtts.get(target, []), count)
+                stats.update({
+                    "destination_ip": target,
+                    "node": model.owner_of(target),
+                    "reachable": stats["received"] > 0,
+                    "expected_path": path,
+                    "path_status": status
+                })
+                summaries.append(stats)
+            yield summaries
+
+    def throughput(self, source, destination, protocol='tcp', duration=5, bitrate=None, port=5201, size=None):
+        """
+        Нагрузочный тест от source к destination: goodput по данным приёмника,
+        для UDP также потери, джиттер и задержка в одну сторону
+        """
+        protocol = protocol.lower()
+        if protocol not in ('tcp', 'udp'):
+            raise Exception(f"Unsupported protocol {protocol}")
+        if duration <= 0 or duration > MAX_MEASUREMENT_DURATION:
+            raise Exception(f"Duration must be within (0, {MAX_MEASUREMENT_DURATION}] seconds")
+
+        agents = self.topology_manager.scapy_agents
+        sender = agents.get(self._node(source))
+        receiver = agents.get(self._node(destination))
+        destination_ip = self._node_ip(destination)
+
+        sink_id = receiver.sink_start(protocol, port, duration + SINK_GRACE)
+        sent = sender.bulk_send(protocol, destination_ip, port, duration, bitrate=bitrate, size=size)
+        received = receiver.sink_result(sink_id, duration + 2 * SINK_GRACE)
+
+        elapsed = received["elapsed"] or sent["elapsed"]
+        result = {
+            "source": source,
+            "destination": destination,
+            "destination_ip": destination_ip,
+            "protocol": protocol,
+            "duration": sent["elapsed"],
+            "sent_bytes": sent["bytes"],
+            "received_bytes": received["bytes"],
+            "goodput_bps": round(received["bytes"] * 8 / elapsed, 1) if elapsed else 0.0,
+            "offered_bps": round(sent["bytes"] * 8 / sent["elapsed"], 1) if sent["elapsed"] else 0.0
+        }
+        if protocol == 'udp':
+            lost = max(0, sent["packets"] - received["packets"])
+            result.update({
+                "sent_packets": sent["packets"],
+                "received_packets": received["packets"],
+                "lost_packets": lost,
+                "loss_percent": round(lost * 100.0 / sent["packets"], 2) if sent["packets"] else 0.0,
+                "jitter_ms": received["jitter_ms"],
+                "one_way_delay_ms": received["one_way_delay_ms"]
+            })
+        return result
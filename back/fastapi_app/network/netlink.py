@@ -0,0 +1,198 @@
+import errno
+import os
+import threading
+from socket import AF_INET
+
+try:
+    from pyroute2 import IPRoute
+    from pyroute2.netlink.exceptions import NetlinkError
+    from pyroute2.netns import setns
+except ImportError:
+    IPRoute = None
+
+NETLINK_ENABLED = os.environ.get('NETLINK_CONFIG', '1') != '0'
+
+
+def run_in_namespace(pid, func):
+    """
+    Выполнение func в сетевом пространстве имён процесса pid.
+    setns применяется к отдельному короткоживущему потоку, поэтому потоки
+    приложения остаются в корневом пространстве имён. Сокеты и файлы
+    /proc/sys/net, открытые в func, остаются привязанными к пространству узла.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            setns(f'/proc/{pid}/ns/net', flags=0)
+            outcome['result'] = func()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, name=f'netns-{pid}', daemon=True)
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
+
+
+def _route_dst(network):
+    return '0.0.0.0/0' if network == 'default' else network
+
+
+class NetlinkConfigurator:
+    """
+    Настройка узлов Mininet через netlink без запуска `ip` в оболочке узла.
+    Для каждого узла открывается сокет IPRoute в его сетевом пространстве
+    имён; сокет переиспользуется, пока жив процесс узла. Состояние
+    читается обратно как структуры (интерфейсы, адреса, маршруты).
+    """
+
+    def __init__(self):
+        self._sockets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return IPRoute is not None and NETLINK_ENABLED and os.geteuid() == 0
+
+    def _socket(self, node):
+        with self._lock:
+            entry = self._sockets.get(node.name)
+            if entry is not None and entry[0] == node.pid:
+                return entry[1]
+        ipr = run_in_namespace(node.pid, IPRoute)
+        with self._lock:
+            stale = self._sockets.get(node.name)
+            self._sockets[node.name] = (node.pid, ipr)
+        if stale is not None:
+            stale[1].close()
+        return ipr
+
+    def _index(self, ipr, ifname):
+        indexes = ipr.link_lookup(ifname=ifname)
+        if not indexes:
+            raise Exception(f"Interface {ifname} not found")
+        return indexes[0]
+
+    def forget(self, name):
+        """Закрытие сокета удалённого узла"""
+        with self._lock:
+            entry = self._sockets.pop(name, None)
+        if entry is not None:
+            entry[1].close()
+
+    def close(self):
+        with self._lock:
+            sockets, self._sockets = self._sockets, {}
+        for _, ipr in sockets.values():
+            try:
+                ipr.close()
+            except Exception as e:
+                print(f"Error closing netlink socket: {str(e)}")
+
+    def link_up(self, node, ifname):
+        ipr = self._socket(node)
+        ipr.link('set', index=self._index(ipr, ifname), state='up')
+
+    def add_address(self, node, ifname, address):
+        """Добавление адреса вида a.b.c.d/len; уже назначенный адрес не считается ошибкой"""
+        ipr = self._socket(node)
+        ip, _, prefixlen = address.partition('/')
+        try:
+            ipr.addr('add', index=self._index(ipr, ifname), address=ip, prefixlen=int(prefixlen or 24))
+        except NetlinkError as e:
+            if e.code != errno.EEXIST:
+                raise
+            return False
+        return True
+
+    def del_address(self, node, ifname, address):
+        ipr = self._socket(node)
+        ip, _, prefixlen = address.partition('/')
+        try:
+            ipr.addr('del', index=self._index(ipr, ifname), address=ip, prefixlen=int(prefixlen or 24))
+        except NetlinkError as e:
+            if e.code != errno.EADDRNOTAVAIL:
+                raise
+            return False
+        return True
+
+    def add_route(self, node, network, next_hop=None, interface=None):
+        ipr = self._socket(node)
+        route = {'dst': _route_dst(network)}
+        if next_hop:
+            route['gateway'] = next_hop
+        if interface:
+            route['oif'] = self._index(ipr, interface)
+        try:
+            ipr.route('add', **route)
+        except NetlinkError as e:
+            if e.code != errno.EEXIST:
+                raise
+            return False
+        return True
+
+    def del_route(self, node, network, next_hop=None, interface=None):
+        ipr = self._socket(node)
+        route = {'dst': _route_dst(network)}
+        if next_hop:
+            route['gateway'] = next_hop
+        if interface:
+            route['oif'] = self._index(ipr, interface)
+        try:
+            ipr.route('del', **route)
+        except NetlinkError as e:
+            if e.code != errno.ESRCH:
+                raise
+            return False
+        return True
+
+    def set_sysctl(self, node, key, value):
+        """Запись параметра net.* в пространстве имён узла"""
+        path = '/proc/sys/' + key.replace('.', '/')
+
+        def write():
+            with open(path, 'w') as sysctl_file:
+                sysctl_file.write(str(value))
+
+        run_in_namespace(node.pid, write)
+
+    def links(self, node):
+        """Интерфейсы узла: имя, индекс, состояние, MAC и MTU"""
+        ipr = self._socket(node)
+        return [{
+            "name": link.get_attr('IFLA_IFNAME'),
+            "index": link['index'],
+            "state": (link.get_attr('IFLA_OPERSTATE') or '').lower(),
+            "mac": link.get_attr('IFLA_ADDRESS'),
+            "mtu": link.get_attr('IFLA_MTU')
+        } for link in ipr.get_links()]
+
+    def addresses(self, node, ifname=None):
+        """IPv4-адреса узла (или одного интерфейса)"""
+        ipr = self._socket(node)
+        query = {'family': AF_INET}
+        if ifname:
+            query['index'] = self._index(ipr, ifname)
+        names = {link['index']: link.get_attr('IFLA_IFNAME') for link in ipr.get_links()}
+        return [{
+            "interface": names.get(addr['index']),
+            "address": addr.get_attr('IFA_ADDRESS'),
+            "prefixlen": addr['prefixlen']
+        } for addr in ipr.get_addr(**query)]
+
+    def routes(self, node):
+        """IPv4-маршруты основной таблицы узла"""
+        ipr = self._socket(node)
+        names = {link['index']: link.get_attr('IFLA_IFNAME') for link in ipr.get_links()}
+        routes = []
+        for route in ipr.get_routes(family=AF_INET, table=254):
+            dst = route.get_attr('RTA_DST')
+            routes.append({
+                "network": f"{dst}/{route['dst_len']}" if dst else 'default',
+                "next_hop": route.get_attr('RTA_GATEWAY'),
+                "interface": names.get(route.get_attr('RTA_OIF'))
+            })
+        return routes
@@ -0,0 +1,103 @@
+import re
+import uuid
+
+# Команды передаются в оболочку узла Mininet одной строкой через pty;
+# в каноническом режиме строка терминала ограничена 4095 байтами
+MAX_SCRIPT_LENGTH = 3500
+
+
+class NodeCommand:
+    """Команда из пакета; вывод и код возврата заполняются при flush"""
+
+    def __init__(self, node, command, callback=None):
+        self.node = node
+        self.command = command
+        self.output = None
+        self.status = None
+        self._callback = callback
+
+    @property
+    def done(self):
+        return self.status is not None
+
+    @property
+    def ok(self):
+        return self.status == 0
+
+    def _complete(self, output, status):
+        self.output = output
+        self.status = status
+        if self._callback:
+            self._callback(self)
+
+
+class NodeCommandBatch:
+    """
+    Пакетное выполнение команд в оболочках узлов Mininet.
+    Команды копятся по узлам и при flush отправляются одним составным
+    вызовом `node.cmd` на узел; вывод каждой команды отделяется маркером
+    с кодом возврата и возвращается в её NodeCommand.
+    """
+
+    def __init__(self):
+        self._queues = {}
+
+    def __len__(self):
+        return sum(len(commands) for _, commands in self._queues.values())
+
+    def add(self, node, command, callback=None):
+        """Добавление команды узла в пакет; callback(NodeCommand) вызывается после выполнения"""
+        entry = NodeCommand(node, command, callback)
+        self._queues.setdefault(node.name, (node, []))[1].append(entry)
+        return entry
+
+    def ip(self, node, *args, callback=None):
+        """Добавление команды `ip` в пакет"""
+        return self.add(node, ' '.join(['ip'] + [str(arg) for arg in args]), callback)
+
+    def sysctl(self, node, key, value, callback=None):
+        return self.add(node, f'sysctl -w {key}={value}', callback)
+
+    def nodes(self):
+        return [node for node, _ in self._queues.values()]
+
+    def flush(self):
+        """Выполнение всех собранных команд: один вызов оболочки на узел (для длинных пакетов - несколько)"""
+        queues, self._queues = self._queues, {}
+        for node, commands in queues.values():
+            for chunk in _chunks(commands):
+                _run_chunk(node, chunk)
+        return sum(len(commands) for _, commands in queues.values())
+
+
+def _chunks(commands):
+    chunk, length = [], 0
+    for command in commands:
+        size = len(command.command) + 64
+        if chunk and length + size > MAX_SCRIPT_LENGTH:
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(command)
+        length += size
+    if chunk:
+        yield chunk
+
+
+def _run_chunk(node, commands):
+    marker = f"__batch_{uuid.uuid4().hex[:8]}__"
+    script = ' '.join(
+        f'{{ {command.command} ; }} 2>&1; echo "{marker} {index} $?";'
+        for index, command in enumerate(commands)
+    )
+    output = node.cmd(script).replace('\r', '')
+
+    position = 0
+    results = {}
+    for match in re.finditer(rf'{marker} (\d+) (\d+)', output):
+        results[int(match.group(1))] = (output[position:match.start()].strip('\n'), int(match.group(2)))
+        position = match.end()
+
+    for index, command in enumerate(commands):
+        # Без маркера команда не выполнилась (например, оболочка узла завершилась)
+        command_output, status = results.get(index, ('', -1))
+        command._complete(command_output, status)
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import tempfile
+
+MAX_TRANSACTION_COMMANDS = 500
+
+
+class OVSBatch:
+    """
+    Пакетная настройка коммутаторов Open vSwitch.
+    Настройки всех мостов собираются и применяются одной транзакцией
+    `ovs-vsctl -- ... -- ...`, а потоки каждого моста загружаются
+    одним вызовом `ovs-ofctl add-flows` из файла.
+    """
+
+    def __init__(self):
+        self._commands = []
+        self._flows = {}
+
+    def __len__(self):
+        return len(self._commands) + sum(len(flows) for flows in self._flows.values())
+
+    def vsctl(self, *args):
+        """Добавление команды ovs-vsctl в транзакцию"""
+        self._commands.append([str(arg) for arg in args])
+
+    def set_fail_mode(self, bridge, mode):
+        self.vsctl('set-fail-mode', bridge, mode)
+
+    def set_bridge(self, bridge, **columns):
+        """Установка столбцов записи Bridge"""
+        self.vsctl('set', 'bridge', bridge, *[f"{key}={value}" for key, value in columns.items()])
+
+    def del_bridge(self, bridge):
+        self.vsctl('--if-exists', 'del-br', bridge)
+
+    def add_flow(self, bridge, flow):
+        """Добавление потока OpenFlow для загрузки в мост"""
+        self._flows.setdefault(bridge, []).append(flow)
+
+    def configure_switch(self, bridge, fail_mode='standalone', stp=True, flows=('action=normal',)):
+        """Стандартная настройка коммутатора: режим отказа, STP и потоки"""
+        self.set_fail_mode(bridge, fail_mode)
+        self.set_bridge(bridge, stp_enable='true' if stp else 'false')
+        for flow in flows:
+            self.add_flow(bridge, flow)
+
+    def flow_bridges(self):
+        """Мосты, для которых собраны потоки"""
+        return list(self._flows)
+
+    def commit_settings(self):
+        """Применение собранных команд ovs-vsctl; длинные списки делятся на несколько транзакций"""
+        commands, self._commands = self._commands, []
+        for start in range(0, len(commands), MAX_TRANSACTION_COMMANDS):
+            args = ['ovs-vsctl']
+            for command in commands[start:start + MAX_TRANSACTION_COMMANDS]:
+                args.append('--')
+                args.extend(command)
+            result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise Exception(f"ovs-vsctl transaction failed: {result.stderr.strip()}")
+        return len(commands)
+
+    def commit_flows(self, bridge):
+        """Загрузка собранных потоков моста одним вызовом ovs-ofctl add-flows"""
+        flows = self._flows.pop(bridge, [])
+        if not flows:
+            return 0
+        fd, path = tempfile.mkstemp(prefix=f"{bridge}-", suffix='.flows')
+        try:
+            with os.fdopen(fd, 'w') as flows_file:
+                flows_file.write('\n'.join(flows) + '\n')
+            result = subprocess.run(['ovs-ofctl', 'add-flows', bridge, path],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise Exception(f"ovs-ofctl add-flows {bridge} failed: {result.stderr.strip()}")
+        finally:
+            os.unlink(path)
+        return len(flows)
+
+    def commit(self):
+        """Применение всех собранных настроек и потоков"""
+        self.commit_settings()
+        for bridge in self.flow_bridges():
+            self.commit_flows(bridge)
@@ -62,8 +62,15 @@ class PacketManager:
         return packet
 
     @staticmethod
-    def send_packet(node, packet: Packet, iface: Optional[str] = None, count: int = 1):
-        """Отправляет пакет от конкретного узла"""
+    def send_packet(node, packet: Packet, iface: Optional[str] = None, count: int = 1, agent=None):
+        """Отправляет пакет от конкретного узла (через агент Scapy узла, если он передан)"""
+        if agent is not None:
+            if iface:
+                agent.sendp(packet.command(), iface=iface, count=count)
+            else:
+                agent.send(packet.command(), count=count)
+            return
+
         packet_cmd = f"packet = {packet.command()}"
         
         if iface:
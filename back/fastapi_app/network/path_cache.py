@@ -0,0 +1,100 @@
+from collections import OrderedDict
+import os
+import threading
+
+PATH_CACHE_SIZE = int(os.environ.get('PATH_CACHE_SIZE', '2048'))
+
+
+class PathCache:
+    """
+    Кэш рассчитанных маршрутов трассировки для текущей версии топологии.
+    Запись хранит узлы, через которые прошёл расчёт; обратный индекс узел ->
+    записи позволяет при изменении сети удалить только затронутые маршруты
+    и перенести остальные на новую версию. Записи без списка узлов
+    (неудачные маршруты) удаляются при любом изменении.
+    """
+
+    def __init__(self, max_entries=PATH_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self.version = 0
+        self._entries = OrderedDict()
+        self._by_node = {}
+        self._volatile = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evicted = 0
+
+    def get(self, version, key):
+        with self._lock:
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, version, key, value, nodes=None):
+        """Сохранение результата; nodes=None - запись удаляется при любом изменении сети"""
+        with self._lock:
+            if version != self.version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, frozenset(nodes) if nodes is not None else None)
+            if nodes is None:
+                self._volatile.add(key)
+            else:
+                for node in nodes:
+                    self._by_node.setdefault(node, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evicted += 1
+
+    def advance(self, version, nodes=None):
+        """
+        Переход на новую версию топологии: удаляются записи, затронувшие
+        узлы nodes, и неудачные маршруты; при nodes=None кэш очищается
+        """
+        with self._lock:
+            if nodes is None:
+                self.invalidated += len(self._entries)
+                self._entries.clear()
+                self._by_node.clear()
+                self._volatile.clear()
+            else:
+                stale = set(self._volatile)
+                for node in nodes:
+                    stale.update(self._by_node.get(node, ()))
+                for key in stale:
+                    self._drop(key)
+                self.invalidated += len(stale)
+            self.version = version
+
+    def _drop(self, key):
+        _, nodes = self._entries.pop(key)
+        if nodes is None:
+            self._volatile.discard(key)
+            return
+        for node in nodes:
+            keys = self._by_node.get(node)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_node[node]
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidated": self.invalidated,
+                "evicted": self.evicted
+            }
@@ -0,0 +1,157 @@
+from ipaddress import IPv4Address
+import time
+
+MAX_HOPS = 20
+
+
+class _Walk:
+    """
+    Пути от всех узлов к одному адресату. Решение о пересылке зависит только
+    от текущего узла и адресата, поэтому результат для узла запоминается и
+    переиспользуется всеми источниками, чей путь проходит через него.
+    Результат узла - (итог, транзитные L3-узлы до адресата, число прыжков).
+    """
+
+    def __init__(self, model, destination, address):
+        self.model = model
+        self.destination = destination
+        self.address = address
+        self.memo = {destination: ('reachable', (), 0)}
+
+    def resolve(self, name):
+        stack = []
+        on_stack = set()
+        current = name
+        while current not in self.memo:
+            if current in on_stack:
+                result = ('loop', (), None)
+                break
+            next_hop = self.model.resolve_next_hop(current, self.address, self.destination)
+            if next_hop is None or not self.model.l2_path(current, next_hop.interface, next_hop.target):
+                result = ('no_route', (), None)
+                self.memo[current] = result
+                break
+            stack.append((current, next_hop.target))
+            on_stack.add(current)
+            current = next_hop.target
+        else:
+            result = self.memo[current]
+
+        for node, target in reversed(stack):
+            status, via, hops = result
+            result = (
+                status,
+                via if target == self.destination else (target,) + via,
+                hops + 1 if hops is not None else None
+            )
+            self.memo[node] = result
+        return result
+
+
+def _host_domains(model, hosts):
+    """L2-домены интерфейсов хостов: домен -> {сеть интерфейса или None: [хосты]}"""
+    members = {}
+    domains_of = {}
+    for host in hosts:
+        for interface in model.ports[host]:
+            domain = model.l2_domain(host, interface)
+            if domain is None:
+                continue
+            own = model.addresses[host].get(interface)
+            members.setdefault(domain, {}).setdefault(own.network if own else None, []).append(host)
+            domains_of.setdefault(host, set()).add(domain)
+    return members, domains_of
+
+
+def _transpose(columns):
+    return [list(row) for row in zip(*columns)]
+
+
+def reachability_matrix(model, hosts=None, max_hops=MAX_HOPS):
+    """
+    Матрица достижимости хост x хост по модели пересылки за один проход.
+    Первый прыжок хоста - либо напрямую к адресату в общем L2-домене,
+    либо к шлюзу, не зависящему от адресата; поэтому для каждого адресата
+    отдельно обходятся только шлюзы, а строки заполняются из их результатов.
+    Пути (транзитные L3-узлы) нумеруются один раз и передаются списком paths;
+    причины недостижимости: no_address, no_route, loop, timeout.
+    """
+    started = time.monotonic()
+    if hosts is None:
+        hosts = sorted(name for name, kind in model.kinds.items() if kind == 'host')
+
+    members, domains_of = _host_domains(model, hosts)
+    gateways = {}
+    for host in hosts:
+        gateway = model.host_gateway(host)
+        if gateway is not None and model.l2_path(host, gateway.interface, gateway.target):
+            gateways[host] = gateway.target
+        else:
+            gateways[host] = None
+
+    path_ids = {}
+
+    def cell(status, via, hops):
+        path_id = path_ids.get(via)
+        if path_id is None:
+            path_id = path_ids[via] = len(path_ids)
+        if status == 'reachable' and hops > max_hops:
+            status = 'timeout'
+        if status == 'reachable':
+            return (True, hops, path_id, None)
+        return (False, None, path_id, status)
+
+    unaddressed = (False, None, None, 'no_address')
+    columns = []
+    for destination in hosts:
+        ip = model.primary_ip(destination)
+        if ip is None:
+            columns.append([unaddressed] * len(hosts))
+            continue
+        address = IPv4Address(ip)
+        walk = _Walk(model, destination, address)
+
+        direct = set()
+        for domain in domains_of.get(destination, ()):
+            for network, hosts_in_network in members[domain].items():
+                if network is None or address in network:
+                    direct.update(hosts_in_network)
+
+        own_cell = cell('reachable', (), 0)
+        direct_cell = cell('reachable', (), 1)
+        via_gateway = {}
+        column = []
+        for source in hosts:
+            if source == destination:
+                column.append(own_cell)
+            elif source in direct:
+                column.append(direct_cell)
+            else:
+                gateway = gateways[source]
+                result = via_gateway.get(gateway)
+                if result is None:
+                    if gateway is None:
+                        result = cell('no_route', (), None)
+                    else:
+                        status, via, hops = walk.resolve(gateway)
+                        result = cell(
+                            status,
+                            via if gateway == destination else (gateway,) + via,
+                            hops + 1 if hops is not None else None
+                        )
+                    via_gateway[gateway] = result
+                column.append(result)
+        columns.append(column)
+
+    cells = _transpose(columns)
+    return {
+        "version": model.version,
+        "hosts": hosts,
+        "reachable": [[value[0] for value in row] for row in cells],
+        "hops": [[value[1] for value in row] for row in cells],
+        "path_id": [[value[2] for value in row] for row in cells],
+        "reason": [[value[3] for value in row] for row in cells],
+        "paths": [list(via) for via, _ in sorted(path_ids.items(), key=lambda item: item[1])],
+        "reachable_pairs": sum(value[0] for row in cells for value in row),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 3)
+    }
@@ -0,0 +1,219 @@
+import os
+import re
+import socket
+import subprocess
+import threading
+import time
+
+OVSDB_SOCKET = '/var/run/openvswitch/db.sock'
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', '60'))
+STP_TRANSITIONAL_STATES = ('listening', 'learning')
+
+
+def wait_until(check, timeout, initial=0.05, factor=2.0, max_interval=1.0, description=None):
+    """
+    Опрос условия с экспоненциальной задержкой между попытками.
+    Возвращает True, как только check() вернул истину, и False по истечении timeout.
+    """
+    deadline = time.monotonic() + timeout
+    interval = initial
+    while True:
+        try:
+            if check():
+                return True
+        except Exception as e:
+            print(f"Readiness check {description or check} failed: {str(e)}")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            if description:
+                print(f"Timed out waiting for {description}")
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * factor, max_interval)
+
+
+def _run(args):
+    return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def ovsdb_ready(path=OVSDB_SOCKET):
+    """Сокет OVSDB существует и принимает соединения"""
+    if not os.path.exists(path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(1)
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def missing_bridges(bridges):
+    """Мосты из списка, которых ещё нет в OVS"""
+    result = _run(['ovs-vsctl', 'list-br'])
+    if result.returncode != 0:
+        return set(bridges)
+    return set(bridges) - set(result.stdout.split())
+
+
+def processes_gone(patterns):
+    """Нет процессов, командная строка которых содержит один из шаблонов"""
+    return all(_run(['pgrep', '-f', pattern]).returncode != 0 for pattern in patterns)
+
+
+def _operstate(path):
+    try:
+        with open(path) as state_file:
+            return state_file.read().strip()
+    except OSError:
+        return None
+
+
+def interfaces_down(nodes, switch_names):
+    """
+    Интерфейсы со связями, которые ещё не перешли в состояние up.
+    Интерфейсы коммутаторов читаются в корневом пространстве имён,
+    интерфейсы хостов и маршрутизаторов - одной командой в пространстве узла.
+    """
+    down = []
+    for name, node in nodes.items():
+        interfaces = [intf.name for intf in node.intfList() if intf.name != 'lo' and getattr(intf, 'link', None)]
+        if not interfaces:
+            continue
+        if name in switch_names:
+            states = [_operstate(f"/sys/class/net/{intf}/operstate") for intf in interfaces]
+        else:
+            output = node.cmd(' '.join(f"cat /sys/class/net/{intf}/operstate 2>/dev/null || echo missing;" for intf in interfaces))
+            states = output.split()
+        for intf, state in zip(interfaces, states):
+            if state not in ('up', 'unknown'):
+                down.append(intf)
+    return down
+
+
+def stp_converging_ports(bridges=None):
+    """
+    Порты OVS, STP которых ещё не завершил переход (listening/learning).
+    Если задан список мостов, учитываются только их порты.
+    """
+    result = _run(['ovs-vsctl', '--format=csv', '--data=bare', '--no-headings', '--columns=name,status', 'list', 'Port'])
+    if result.returncode != 0:
+        return None
+    ports = []
+    for line in result.stdout.splitlines():
+        name, _, status = line.partition(',')
+        match = re.search(r'stp_state=(\w+)', status)
+        if match and match.group(1) in STP_TRANSITIONAL_STATES:
+            if bridges is None or any(name == bridge or name.startswith(f"{bridge}-") for bridge in bridges):
+                ports.append(name)
+    return ports
+
+
+def stp_enabled_bridges():
+    """Мосты OVS с включённым STP; None, если OVS недоступен"""
+    try:
+        result = _run(['ovs-vsctl', '--format=csv', '--data=bare', '--no-headings', '--columns=name,stp_enable', 'list', 'Bridge'])
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    bridges = set()
+    for line in result.stdout.splitlines():
+        name, _, enabled = line.partition(',')
+        if enabled.strip() == 'true':
+            bridges.add(name.strip())
+    return bridges
+
+
+class NetworkReadiness:
+    """
+    Готовность эмулируемой сети. После построения сети в фоне
+    проверяются OVSDB, наличие мостов, состояние интерфейсов и
+    схождение STP; по завершении устанавливается событие ready.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self._finished = threading.Event()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.status = {"ready": False, "state": "idle", "probes": []}
+
+    def reset(self, state="building"):
+        """Сброс готовности перед изменением сети"""
+        with self._lock:
+            self._generation += 1
+            self.ready.clear()
+            self._finished.clear()
+            self.status = {"ready": False, "state": state, "probes": []}
+            if state != "building":
+                self._finished.set()
+
+    def wait(self, timeout=None):
+        """Ожидание завершения проверок; возвращает True, если сеть готова"""
+        self._finished.wait(timeout)
+        return self.ready.is_set()
+
+    def start(self, topology_manager, timeout=READY_TIMEOUT):
+        """Запуск проверок готовности сети в фоновом потоке"""
+        self.reset()
+        generation = self._generation
+        switches = list(topology_manager.net.switches) if topology_manager.net else []
+        switch_names = {topology_manager.node_name(switch) for switch in switches}
+        bridges = {switch.name for switch in switches}
+        nodes = dict(topology_manager.nodes)
+        thread = threading.Thread(target=self._probe, args=(generation, nodes, switch_names, bridges, timeout),
+                                  name='network-readiness', daemon=True)
+        thread.start()
+        return thread
+
+    def _probe(self, generation, nodes, switch_names, bridges, timeout):
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        self._set_state(generation, "probing")
+        ready = True
+
+        probes = [("ovsdb", ovsdb_ready)]
+        if switch_names:
+            probes.append(("bridges", lambda: not missing_bridges(bridges)))
+        probes.append(("interfaces", lambda: not interfaces_down(nodes, switch_names)))
+        if switch_names:
+            probes.append(("stp", lambda: stp_converging_ports(bridges) == []))
+
+        for name, check in probes:
+            if generation != self._generation:
+                return
+            probe_started = time.monotonic()
+            ok = wait_until(check, max(0.0, deadline - time.monotonic()), description=f"{name} readiness")
+            self._record(generation, name, ok, time.monotonic() - probe_started)
+            if not ok:
+                ready = False
+                break
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self.status["ready"] = ready
+            self.status["state"] = "ready" if ready else "timeout"
+            self.status["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+            if ready:
+                self.ready.set()
+            self._finished.set()
+        print(f"Network readiness: {self.status}")
+
+    def _set_state(self, generation, state):
+        with self._lock:
+            if generation == self._generation:
+                self.status["state"] = state
+
+    def _record(self, generation, name, ok, duration):
+        with self._lock:
+            if generation == self._generation:
+                self.status["probes"].append({"name": name, "ok": ok, "duration_ms": round(duration * 1000, 1)})
+
+    def get_status(self):
+        with self._lock:
+            return dict(self.status, probes=list(self.status["probes"]))
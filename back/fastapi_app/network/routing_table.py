@@ -0,0 +1,177 @@
+from ipaddress import IPv4Address, IPv4Network
+
+CONNECTED_DISTANCE = 0
+STATIC_DISTANCE = 1
+
+
+class Route:
+    """Маршрут в таблице маршрутизации"""
+    __slots__ = ('network', 'kind', 'next_hop', 'interface', 'distance')
+
+    def __init__(self, network, kind, next_hop=None, interface=None):
+        self.network = network
+        self.kind = kind
+        self.next_hop = next_hop
+        self.interface = interface
+        self.distance = CONNECTED_DISTANCE if kind == 'connected' else STATIC_DISTANCE
+
+    def to_dict(self):
+        return {
+            "network": str(self.network),
+            "type": self.kind,
+            "next_hop": self.next_hop,
+            "interface": self.interface
+        }
+
+
+class _TrieNode:
+    __slots__ = ('prefix', 'length', 'children', 'routes')
+
+    def __init__(self, prefix, length):
+        self.prefix = prefix
+        self.length = length
+        self.children = [None, None]
+        self.routes = []
+
+
+def _bit(value, position):
+    """Бит адреса на позиции position (0 - старший)"""
+    return (value >> (31 - position)) & 1
+
+
+def _common_length(a, b, limit):
+    """Длина общего префикса двух адресов, не больше limit"""
+    diff = a ^ b
+    common = 32 - diff.bit_length()
+    return min(common, limit)
+
+
+def _mask(length):
+    return (0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF if length else 0
+
+
+class RoutingTable:
+    """
+    Таблица маршрутизации маршрутизатора на основе сжатого двоичного
+    префиксного дерева (Patricia). Поиск выбирает самый длинный
+    совпадающий префикс за O(32); при равных префиксах подключённая
+    сеть имеет приоритет над статическим маршрутом.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode(0, 0)
+        self._connected = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add_connected(self, network, interface):
+        """Добавление подключённой сети интерфейса (заменяет прежнюю сеть этого интерфейса)"""
+        network = IPv4Network(network, strict=False)
+        self.remove_connected(interface)
+        self._connected[interface] = network
+        self._insert(Route(network, 'connected', interface=interface))
+
+    def remove_connected(self, interface):
+        """Удаление подключённой сети интерфейса"""
+        network = self._connected.pop(interface, None)
+        if network is not None:
+            self._remove(network, lambda route: route.kind == 'connected' and route.interface == interface)
+
+    def connected(self):
+        """Подключённые сети по интерфейсам"""
+        return dict(self._connected)
+
+    def add_static(self, network, next_hop=None, interface=None):
+        """Добавление статического маршрута"""
+        network = IPv4Network(network, strict=False)
+        if next_hop:
+            next_hop = next_hop.split('/')[0]
+        self._remove(network, lambda route: route.kind == 'static' and route.next_hop == next_hop and route.interface == interface)
+        self._insert(Route(network, 'static', next_hop, interface))
+
+    def remove_static(self, network, next_hop=None):
+        """Удаление статических маршрутов к сети (через указанный шлюз, если он задан)"""
+        network = IPv4Network(network, strict=False)
+        return self._remove(network, lambda route: route.kind == 'static' and (next_hop is None or route.next_hop == next_hop))
+
+    def lookup(self, address):
+        """Поиск маршрута по самому длинному совпадающему префиксу"""
+        address = int(IPv4Address(address))
+        node = self._root
+        best = None
+        while node is not None:
+            if node.length and (address ^ node.prefix) & _mask(node.length):
+                break
+            if node.routes:
+                best = node.routes[0]
+            if node.length == 32:
+                break
+            node = node.children[_bit(address, node.length)]
+        return best
+
+    def routes(self):
+        """Все маршруты таблицы в порядке обхода дерева"""
+        result = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            result.extend(node.routes)
+            for child in reversed(node.children):
+                if child is not None:
+                    stack.append(child)
+        return result
+
+    def _insert(self, route):
+        prefix = int(route.network.network_address)
+        length = route.network.prefixlen
+        node = self._root
+
+        while True:
+            if node.length == length:
+                node.routes.append(route)
+                node.routes.sort(key=lambda r: r.distance)
+                self._size += 1
+                return
+
+            bit = _bit(prefix, node.length)
+            child = node.children[bit]
+            if child is None:
+                leaf = _TrieNode(prefix, length)
+                leaf.routes.append(route)
+                node.children[bit] = leaf
+                self._size += 1
+                return
+
+            common = _common_length(child.prefix, prefix, min(child.length, length))
+            if common == child.length:
+                node = child
+                continue
+
+            middle = _TrieNode(prefix & _mask(common), common)
+            node.children[bit] = middle
+            middle.children[_bit(child.prefix, common)] = child
+            if common == length:
+                middle.routes.append(route)
+            else:
+                leaf = _TrieNode(prefix, length)
+                leaf.routes.append(route)
+                middle.children[_bit(prefix, common)] = leaf
+            self._size += 1
+            return
+
+    def _remove(self, network, predicate):
+        prefix = int(network.network_address)
+        length = network.prefixlen
+        node = self._root
+        while node is not None and node.length < length:
+            node = node.children[_bit(prefix, node.length)]
+        if node is None or node.length != length or node.prefix != prefix:
+            return 0
+
+        kept = [route for route in node.routes if not predicate(route)]
+        removed = len(node.routes) - len(kept)
+        node.routes = kept
+        self._size -= removed
+        return removed
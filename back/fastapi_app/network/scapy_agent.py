@@ -0,0 +1,564 @@
+import errno
+import heapq
+import ipaddress
+import json
+import os
+import random
+import select
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+AGENT_START_TIMEOUT = float(os.environ.get('SCAPY_AGENT_START_TIMEOUT', '30'))
+# Запас времени сверх собственного таймаута операции на обмен с агентом
+AGENT_CALL_MARGIN = 10.0
+# Наибольшее число кадров потока, отправляемых за одно пробуждение генератора
+TRAFFIC_BURST = 64
+
+_HEADER = struct.Struct('>I')
+
+
+def _write_frame(stream, message):
+    data = json.dumps(message).encode()
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_exact(read, size):
+    chunks = []
+    while size:
+        chunk = read(size)
+        if not chunk:
+            raise EOFError("Scapy agent channel closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _read_frame(read):
+    (size,) = _HEADER.unpack(_read_exact(read, _HEADER.size))
+    return json.loads(_read_exact(read, size))
+
+
+class ScapyAgentError(Exception):
+    """Ошибка выполнения запроса агентом или обмена с ним"""
+
+
+class ScapyAgent:
+    """
+    Долгоживущий агент Scapy в сетевом пространстве имён узла Mininet.
+    Процесс агента запускается при первом запросе и принимает кадры
+    по stdin/stdout: 4 байта длины (big-endian) и JSON. Интерпретатор
+    и импорт Scapy оплачиваются один раз на узел, а не на каждый вызов.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.pid = node.pid
+        self._process = None
+        self._lock = threading.Lock()
+
+    def alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        process = self.node.popen([sys.executable, '-u', os.path.abspath(__file__)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._process = process
+        try:
+            hello = self._receive(AGENT_START_TIMEOUT)
+        except Exception:
+            self.stop()
+            raise
+        if not hello.get('ready'):
+            self.stop()
+            raise ScapyAgentError(f"Scapy agent on {self.node.name} failed to start: {hello.get('error')}")
+
+    def _receive(self, timeout):
+        deadline = time.monotonic() + timeout
+        stdout = self._process.stdout
+
+        def read(size):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([stdout], [], [], remaining)[0]:
+                raise ScapyAgentError(f"Scapy agent on {self.node.name} timed out")
+            return os.read(stdout.fileno(), size)
+
+        return _read_frame(read)
+
+    def call(self, method, timeout=AGENT_CALL_MARGIN, **params):
+        """Выполнение запроса; агент запускается при первом вызове и перезапускается, если завершился"""
+        with self._lock:
+            if not self.alive():
+                self._start()
+            try:
+                _write_frame(self._process.stdin, {"method": method, "params": params})
+                response = self._receive(timeout + AGENT_CALL_MARGIN)
+            except (OSError, EOFError, ScapyAgentError):
+                # Состояние канала неизвестно - следующий вызов начнёт с нового агента
+                self.stop()
+                raise
+        if 'error' in response:
+            raise ScapyAgentError(response['error'])
+        return response.get('result')
+
+    def send(self, packet, count=1):
+        """Отправка пакета уровня 3; packet - выражение Scapy (Packet.command())"""
+        return self.call('send', packet=packet, count=count)
+
+    def sendp(self, packet, iface=None, count=1):
+        """Отправка кадра уровня 2 через интерфейс узла"""
+        return self.call('sendp', packet=packet, iface=iface, count=count)
+
+    def sr(self, packet, timeout=2, retry=0):
+        return self.call('sr', timeout=timeout * (retry + 1), packet=packet, wait=timeout, retry=retry)
+
+    def traceroute(self, target, maxttl=20, timeout=2, l4=None):
+        """Трассировка; l4 - {"proto": "tcp"|"udp", "dport": порт} или None для ICMP"""
+        return self.call('traceroute', timeout=timeout, target=target, maxttl=maxttl, wait=timeout, l4=l4)
+
+    def sniff(self, iface=None, count=0, timeout=5, bpf_filter=None):
+        return self.call('sniff', timeout=timeout, iface=iface, count=count, wait=timeout, filter=bpf_filter)
+
+    def ping_sweep(self, targets, count=1, timeout=1, interval=0):
+        """ICMP-эхо ко всем адресам targets одной отправкой; RTT ответов по адресам"""
+        return self.call('ping_sweep', timeout=timeout + interval * count * len(targets),
+                         targets=targets, count=count, wait=timeout, interval=interval)
+
+    def generate(self, flows, duration):
+        """
+        Генерация трафика потоками flows в течение duration секунд. Поток -
+        {"id", "proto" (udp/tcp/icmp), "dst", "sport", "dport", "pps" или "bitrate",
+        "sizes": [[размер кадра, вес], ...], "iface" (необязательно)}
+        """
+        return self.call('generate', timeout=duration, flows=flows, duration=duration)
+
+    def interface_counters(self):
+        """Счётчики интерфейсов узла из /proc/net/dev"""
+        return self.call('interface_counters')
+
+    def sink_start(self, protocol, port, duration):
+        """Запуск приёмника нагрузочного теста в фоне агента; возвращает его id"""
+        return self.call('sink_start', protocol=protocol, port=port, duration=duration)
+
+    def sink_result(self, sink_id, timeout):
+        """Статистика приёмника; ожидание его завершения не дольше timeout секунд"""
+        return self.call('sink_result', timeout=timeout, sink_id=sink_id, wait=timeout)
+
+    def bulk_send(self, protocol, host, port, duration, bitrate=None, size=None):
+        """Передача данных приёмнику в течение duration секунд (UDP - с заданной скоростью)"""
+        return self.call('bulk_send', timeout=duration, protocol=protocol, host=host, port=port,
+                         duration=duration, bitrate=bitrate, size=size)
+
+    def stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+        try:
+            process.terminate()
+            process.wait(timeout=1)
+        except Exception:
+            process.kill()
+
+
+class ScapyAgentPool:
+    """Агенты Scapy узлов одной сети; агент узла создаётся лениво"""
+
+    def __init__(self):
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    def get(self, node):
+        with self._lock:
+            agent = self._agents.get(node.name)
+            if agent is None or agent.pid != node.pid:
+                if agent is not None:
+                    agent.stop()
+                agent = ScapyAgent(node)
+                self._agents[node.name] = agent
+            return agent
+
+    def stop(self, name):
+        with self._lock:
+            agent = self._agents.pop(name, None)
+        if agent is not None:
+            agent.stop()
+
+    def close(self):
+        with self._lock:
+            agents, self._agents = self._agents, {}
+        for agent in agents.values():
+            agent.stop()
+
+
+def _summary(packet):
+    if packet is None:
+        return None
+    info = {"summary": packet.summary(), "time": float(packet.time)}
+    if packet.haslayer('IP'):
+        info["src"] = packet['IP'].src
+        info["dst"] = packet['IP'].dst
+        info["ttl"] = packet['IP'].ttl
+    return info
+
+
+def _interface_counters():
+    counters = {}
+    with open('/proc/net/dev') as dev:
+        for line in dev.readlines()[2:]:
+            name, _, values = line.partition(':')
+            fields = [int(value) for value in values.split()]
+            counters[name.strip()] = {
+                "rx_bytes": fields[0], "rx_packets": fields[1], "rx_dropped": fields[3],
+                "tx_bytes": fields[8], "tx_packets": fields[9], "tx_dropped": fields[11]
+            }
+    return counters
+
+
+class _FlowPlan:
+    """Поток генератора: заранее собранные кадры, порядок размеров и счётчики"""
+
+    def __init__(self, flow, frames, weights):
+        self.id = flow.get('id')
+        self.iface = flow['iface']
+        self.frames = frames
+        self.sequence = random.Random(0).choices(range(len(frames)), weights=weights, k=1024)
+        mean_size = sum(len(frames[index]) for index in self.sequence) / len(self.sequence)
+        self.pps = float(flow['pps']) if flow.get('pps') else float(flow['bitrate']) / (8 * mean_size)
+        # Кадры отправляются пачками, чтобы пробуждаться примерно раз в миллисекунду
+        self.burst = max(1, min(TRAFFIC_BURST, int(self.pps / 1000)))
+        self.position = 0
+        self.sent = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def report(self, elapsed):
+        return {
+            "id": self.id,
+            "iface": self.iface,
+            "target_pps": round(self.pps, 1),
+            "sent_packets": self.sent,
+            "sent_bytes": self.bytes,
+            "send_errors": self.errors,
+            "achieved_pps": round(self.sent / elapsed, 1) if elapsed else 0.0,
+            "achieved_bps": round(self.bytes * 8 / elapsed, 1) if elapsed else 0.0
+        }
+
+
+def _flow_packet(scapy, flow):
+    """Пакет потока уровня 3 из полей proto, dst, sport, dport - без разбора выражений"""
+    dst = str(ipaddress.IPv4Address(flow['dst']))
+    protocol = flow.get('proto', 'udp')
+    if protocol == 'icmp':
+        return scapy.IP(dst=dst) / scapy.ICMP()
+    sport, dport = int(flow['sport']), int(flow['dport'])
+    if protocol == 'tcp':
+        return scapy.IP(dst=dst) / scapy.TCP(sport=sport, dport=dport, flags='A')
+    if protocol == 'udp':
+        return scapy.IP(dst=dst) / scapy.UDP(sport=sport, dport=dport)
+    raise Exception(f"Unsupported traffic protocol {protocol}")
+
+
+def _generate(scapy, flows, duration):
+    plans = []
+    for flow in flows:
+        packet = _flow_packet(scapy, flow)
+        flow['iface'] = flow.get('iface') or scapy.conf.route.route(packet.dst)[0]
+        header = len(scapy.raw(scapy.Ether() / packet))
+        frames, weights = [], []
+        for size, weight in flow.get('sizes') or [[512, 1]]:
+            padding = max(0, int(size) - header)
+            # Кадры собираются один раз: адреса, ARP и контрольные суммы
+            # вычисляются здесь, в цикле отправки используются готовые байты
+            frames.append(scapy.raw(scapy.Ether() / packet / scapy.Raw(b'\x00' * padding)))
+            weights.append(float(weight))
+        plans.append(_FlowPlan(flow, frames, weights))
+
+    sockets = {}
+    for plan in plans:
+        if plan.iface not in sockets:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+            sock.bind((plan.iface, 0))
+            sockets[plan.iface] = sock
+
+    counters_before = _interface_counters()
+    started = time.monotonic()
+    deadline = started + duration
+    queue = [(started, index) for index in range(len(plans))]
+    heapq.heapify(queue)
+    try:
+        while queue:
+            due, index = heapq.heappop(queue)
+            if due >= deadline:
+                continue
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            plan = plans[index]
+            send = sockets[plan.iface].send
+            for _ in range(plan.burst):
+                frame = plan.frames[plan.sequence[plan.position]]
+                plan.position = (plan.position + 1) % len(plan.sequence)
+                try:
+                    send(frame)
+                    plan.sent += 1
+                    plan.bytes += len(frame)
+                except OSError as e:
+                    if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                        raise
+                    plan.errors += 1
+            heapq.heappush(queue, (due + plan.burst / plan.pps, index))
+    finally:
+        for sock in sockets.values():
+            sock.close()
+    elapsed = time.monotonic() - started
+    counters_after = _interface_counters()
+
+    return {
+        "duration": round(elapsed, 3),
+        "flows": [plan.report(elapsed) for plan in plans],
+        "interfaces": {
+            iface: {"tx_dropped": counters_after[iface]["tx_dropped"] - counters_before[iface]["tx_dropped"]}
+            for iface in sockets if iface in counters_after and iface in counters_before
+        }
+    }
+
+
+# Заголовок датаграммы UDP-теста: номер и время отправки
+_PROBE_HEADER = struct.Struct('>Qd')
+TCP_CHUNK = 64 * 1024
+UDP_PAYLOAD = 1400
+_sinks = {}
+
+
+def _tcp_sink(server, stats, deadline):
+    server.settimeout(max(0.1, deadline - time.time()))
+    try:
+        conn, _ = server.accept()
+    except socket.timeout:
+        return
+    with conn:
+        while time.time() < deadline:
+            conn.settimeout(max(0.1, deadline - time.time()))
+            try:
+                data = conn.recv(TCP_CHUNK)
+            except socket.timeout:
+                break
+            if not data:
+                break
+            now = time.time()
+            stats["first"] = stats["first"] or now
+            stats["last"] = now
+            stats["bytes"] += len(data)
+
+
+def _udp_sink(server, stats, deadline):
+    transit = None
+    while time.time() < deadline:
+        server.settimeout(max(0.1, deadline - time.time()))
+        try:
+            data = server.recv(65535)
+        except socket.timeout:
+            break
+        now = time.time()
+        if len(data) < _PROBE_HEADER.size:
+            continue
+        sequence, sent = _PROBE_HEADER.unpack_from(data)
+        stats["first"] = stats["first"] or now
+        stats["last"] = now
+        stats["bytes"] += len(data)
+        stats["packets"] += 1
+        stats["max_sequence"] = max(stats["max_sequence"], sequence)
+        stats["delay_total"] += now - sent
+        # Джиттер по RFC 3550; часы узлов общие, поэтому задержка в одну сторону измерима
+        if transit is not None:
+            stats["jitter"] += (abs((now - sent) - transit) - stats["jitter"]) / 16
+        transit = now - sent
+
+
+def _sink_start(protocol, port, duration):
+    kind = socket.SOCK_STREAM if protocol == 'tcp' else socket.SOCK_DGRAM
+    server = socket.socket(socket.AF_INET, kind)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('0.0.0.0', port))
+    if protocol == 'tcp':
+        server.listen(1)
+    stats = {"protocol": protocol, "bytes": 0, "packets": 0, "max_sequence": -1,
+             "delay_total": 0.0, "jitter": 0.0, "first": None, "last": None}
+    target = _tcp_sink if protocol == 'tcp' else _udp_sink
+
+    def run():
+        try:
+            target(server, stats, time.time() + duration)
+        finally:
+            server.close()
+
+    sink_id = f"{protocol}-{port}-{time.monotonic()}"
+    thread = threading.Thread(target=run, daemon=True)
+    _sinks[sink_id] = (thread, stats)
+    thread.start()
+    return sink_id
+
+
+def _sink_result(sink_id, wait):
+    thread, stats = _sinks[sink_id]
+    thread.join(wait)
+    if thread.is_alive():
+        raise Exception("Sink is still receiving")
+    del _sinks[sink_id]
+    elapsed = (stats["last"] - stats["first"]) if stats["first"] else 0.0
+    result = {"bytes": stats["bytes"], "elapsed": round(elapsed, 6)}
+    if stats["protocol"] == 'udp':
+        expected = stats["max_sequence"] + 1
+        result.update({
+            "packets": stats["packets"],
+            "expected_packets": expected,
+            "jitter_ms": round(stats["jitter"] * 1000, 3),
+            "one_way_delay_ms": round(stats["delay_total"] / stats["packets"] * 1000, 3) if stats["packets"] else None
+        })
+    return result
+
+
+def _bulk_send(protocol, host, port, duration, bitrate=None, size=None):
+    started = time.time()
+    deadline = started + duration
+    sent_bytes = 0
+    packets = 0
+    if protocol == 'tcp':
+        chunk = b'\x00' * (size or TCP_CHUNK)
+        with socket.create_connection((host, port), timeout=5) as conn:
+            while time.time() < deadline:
+                conn.sendall(chunk)
+                sent_bytes += len(chunk)
+        return {"bytes": sent_bytes, "elapsed": round(time.time() - started, 6)}
+
+    payload = b'\x00' * max(0, (size or UDP_PAYLOAD) - _PROBE_HEADER.size)
+    interval = (len(payload) + _PROBE_HEADER.size) * 8 / bitrate if bitrate else 0.0
+    errors = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((host, port))
+        next_send = started
+        while True:
+            now = time.time()
+            if now >= deadline:
+                break
+            if next_send > now:
+                time.sleep(next_send - now)
+            try:
+                sock.send(_PROBE_HEADER.pack(packets, time.time()) + payload)
+                sent_bytes += len(payload) + _PROBE_HEADER.size
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN, errno.ECONNREFUSED):
+                    raise
+                errors += 1
+            packets += 1
+            next_send += interval
+    return {"bytes": sent_bytes, "packets": packets, "send_errors": errors,
+            "elapsed": round(time.time() - started, 6)}
+
+
+def _handlers():
+    from scapy import all as scapy
+
+    namespace = {name: getattr(scapy, name) for name in dir(scapy) if not name.startswith('_')}
+
+    def build(expression):
+        return eval(expression, namespace)
+
+    def send(packet, count=1):
+        scapy.send(build(packet), count=count, verbose=0)
+        return {"sent": count}
+
+    def sendp(packet, iface=None, count=1):
+        scapy.sendp(build(packet), iface=iface, count=count, verbose=0)
+        return {"sent": count}
+
+    def sr(packet, wait=2, retry=0):
+        answered, unanswered = scapy.sr(build(packet), timeout=wait, retry=retry, verbose=0)
+        return {
+            "answered": [{"sent": _summary(sent), "received": _summary(received),
+                          "rtt_ms": round(float(received.time - sent.sent_time) * 1000, 3)}
+                         for sent, received in answered],
+            "unanswered": len(unanswered)
+        }
+
+    def traceroute(target, maxttl=20, wait=2, l4=None):
+        kwargs = {"maxttl": maxttl, "timeout": wait, "verbose": 0}
+        if l4:
+            layer = scapy.TCP if l4.get('proto') == 'tcp' else scapy.UDP
+            kwargs["l4"] = layer(dport=l4.get('dport'))
+        answered, _ = scapy.traceroute(target, **kwargs)
+        hops = {}
+        for sent, received in answered:
+            ttl = sent.ttl
+            if ttl in hops:
+                continue
+            hops[ttl] = {
+                "ttl": ttl,
+                "ip": received.src,
+                "rtt_ms": round(float(received.time - sent.sent_time) * 1000, 3),
+                "reached": received.src == target
+            }
+        return [hops[ttl] for ttl in sorted(hops)]
+
+    def ping_sweep(targets, count=1, wait=1, interval=0):
+        # Raw-сокет ядра: маршрут и ARP разрешает ядро, без поочерёдных ARP-запросов Scapy
+        probes = scapy.IP(dst=targets) / scapy.ICMP(id=os.getpid() & 0xffff, seq=(1, count))
+        sock = scapy.L3RawSocket()
+        try:
+            answered, _ = scapy.sndrcv(sock, probes, timeout=wait, inter=interval, verbose=0)
+        finally:
+            sock.close()
+        rtts = {target: [] for target in targets}
+        for sent, received in answered:
+            rtts.setdefault(sent.dst, []).append(round(float(received.time - sent.sent_time) * 1000, 3))
+        return rtts
+
+    def sniff(iface=None, count=0, wait=5, filter=None):
+        packets = scapy.sniff(iface=iface, count=count, timeout=wait, filter=filter)
+        return [_summary(packet) for packet in packets]
+
+    def generate(flows, duration):
+        return _generate(scapy, flows, duration)
+
+    return {"send": send, "sendp": sendp, "sr": sr, "traceroute": traceroute, "sniff": sniff,
+            "ping_sweep": ping_sweep, "generate": generate, "interface_counters": _interface_counters,
+            "sink_start": _sink_start, "sink_result": _sink_result, "bulk_send": _bulk_send}
+
+
+def serve():
+    # Канал ответов - копия исходного stdout; вывод Scapy уходит в stderr
+    output = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    read = sys.stdin.buffer.read
+    try:
+        handlers = _handlers()
+    except Exception as e:
+        _write_frame(output, {"ready": False, "error": str(e)})
+        return
+    _write_frame(output, {"ready": True})
+
+    while True:
+        try:
+            request = _read_frame(read)
+        except EOFError:
+            return
+        handler = handlers.get(request.get('method'))
+        if handler is None:
+            _write_frame(output, {"error": f"Unknown method {request.get('method')}"})
+            continue
+        try:
+            _write_frame(output, {"result": handler(**request.get('params', {}))})
+        except Exception as e:
+            _write_frame(output, {"error": f"{type(e).__name__}: {e}"})
+
+
+if __name__ == '__main__':
+    serve()
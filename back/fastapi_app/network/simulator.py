@@ -0,0 +1,507 @@
+from collections import OrderedDict, deque, namedtuple
+from ipaddress import IPv4Address
+import heapq
+import os
+import threading
+import time
+from .forwarding_model import ForwardingModel
+from .trace_store import TraceRecorder
+
+# Задержка передачи кадра по одной связи, секунды модельного времени
+SIM_LINK_DELAY = float(os.environ.get('SIM_LINK_DELAY', '0.0001'))
+SIM_ARP_TIMEOUT = float(os.environ.get('SIM_ARP_TIMEOUT', '1'))
+# Предел событий одного прогона - защита от зацикливания кадров
+SIM_MAX_EVENTS = int(os.environ.get('SIM_MAX_EVENTS', '100000'))
+SIM_CACHE_SIZE = int(os.environ.get('SIM_CACHE_SIZE', '16'))
+
+DEFAULT_TTL = 64
+BROADCAST = 'ff:ff:ff:ff:ff:ff'
+
+ICMP_ECHO_REPLY = 0
+ICMP_UNREACHABLE = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+Frame = namedtuple('Frame', ('src', 'dst', 'kind', 'payload'))
+Arp = namedtuple('Arp', ('op', 'sender_mac', 'sender_ip', 'target_ip', 'trace'))
+Packet = namedtuple('Packet', ('src', 'dst', 'ttl', 'proto', 'icmp_type', 'dport', 'ident', 'trace'))
+# Итог прогона: уложился ли он в предел событий, доставка адресату (узел, время)
+# и ICMP-ответ источнику (тип, адрес отправителя, время)
+Outcome = namedtuple('Outcome', ('completed', 'delivered', 'response'))
+
+
+class EventScheduler:
+    """Дискретно-событийный планировщик: события упорядочены по модельному времени и порядку постановки"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._queue = []
+        self._seq = 0
+
+    def schedule(self, delay, callback, *args):
+        self._seq += 1
+        heapq.heappush(self._queue, (self.now + delay, self._seq, callback, args))
+
+    def run(self, max_events=SIM_MAX_EVENTS):
+        """Выполняет события до опустошения очереди; False, если превышен предел событий"""
+        for _ in range(max_events):
+            if not self._queue:
+                return True
+            self.now, _, callback, args = heapq.heappop(self._queue)
+            callback(*args)
+        if self._queue:
+            self._queue.clear()
+            return False
+        return True
+
+
+class NetworkSimulator:
+    """
+    Симуляция сети по модели пересылки без Mininet: ARP, обучение коммутаторов,
+    IP-пересылка с TTL и ICMP-ответы. Кольца коммутаторов разрываются остовным
+    деревом сегмента вместо STP. Таблицы ARP и MAC сохраняются между прогонами,
+    как в работающей сети; прыжки записываются только для трассируемых пакетов.
+    """
+
+    def __init__(self, model, link_delay=SIM_LINK_DELAY, arp_timeout=SIM_ARP_TIMEOUT):
+        self.model = model
+        self.link_delay = link_delay
+        self.arp_timeout = arp_timeout
+        self.on_hop = None
+        self.macs = {}
+        ports = sorted((name, interface) for name in model.ports for interface in model.ports[name])
+        for index, port in enumerate(ports, 1):
+            self.macs[port] = '02:00:' + ':'.join(f"{b:02x}" for b in index.to_bytes(4, 'big'))
+        self.arp = {name: {} for name in model.kinds}
+        self.mac_tables = {name: {} for name, kind in model.kinds.items() if kind == 'switch'}
+        self._blocked = self._spanning_tree()
+        self._pending = {}
+        self._closed = set()
+        self._ident = 0
+        self.scheduler = EventScheduler()
+        self._delivered = {}
+        self._responses = {}
+
+    def _spanning_tree(self):
+        """Порты между коммутаторами вне остовного дерева сегмента; кадры через них не передаются"""
+        blocked = set()
+        for switches in self.model.segment_switches.values():
+            root = min(switches)
+            seen = {root}
+            tree = set()
+            queue = deque([root])
+            while queue:
+                switch = queue.popleft()
+                for port, (peer, peer_port) in sorted(self.model.ports[switch].items()):
+                    if self.model.kinds[peer] == 'switch' and peer not in seen:
+                        seen.add(peer)
+                        queue.append(peer)
+                        tree.update([(switch, port), (peer, peer_port)])
+            for switch in switches:
+                for port, (peer, _) in self.model.ports[switch].items():
+                    if self.model.kinds[peer] == 'switch' and (switch, port) not in tree:
+                        blocked.add((switch, port))
+        return blocked
+
+    def next_ident(self):
+        self._ident += 1
+        return self._ident
+
+    def send(self, source, packet):
+        """Отправляет пакет от узла и моделирует сеть до затухания всех событий"""
+        self.scheduler = EventScheduler()
+        self._delivered = {}
+        self._responses = {}
+        self._closed = set()
+        self._originate(source, packet)
+        completed = self.scheduler.run()
+        self._pending = {}
+        return Outcome(completed, self._delivered.get(packet.ident), self._responses.get(packet.ident))
+
+    def _hop(self, trace, node, action, details):
+        if trace is not None and trace not in self._closed and self.on_hop is not None:
+            self.on_hop(trace, node, action, details, self.scheduler.now)
+
+    def _interface_ip(self, node, interface):
+        own = self.model.addresses[node].get(interface)
+        if own is not None:
+            return own.ip
+        primary = self.model.primary_ip(node)
+        return IPv4Address(primary) if primary else None
+
+    def _address_in(self, node, network):
+        for address in self.model.addresses[node].values():
+            if network is not None and address.ip in network:
+                return address.ip
+        primary = self.model.primary_ip(node)
+        return IPv4Address(primary) if primary else None
+
+    def _route(self, node, dst):
+        """Решение о пересылке на узле: (интерфейс, адрес следующего прыжка) или None"""
+        model = self.model
+        if model.kinds[node] == 'router':
+            entry = model.fibs[node].lookup(dst)
+            if entry is None:
+                return None
+            if entry.next_hop:
+                next_ip = IPv4Address(entry.next_hop)
+                interface = entry.interface
+                if interface is None:
+                    interface = next((i for i in sorted(model.ports[node])
+                                      if i in model.addresses[node] and next_ip in model.addresses[node][i].network), None)
+                return (interface, next_ip) if interface else None
+            return (entry.interface, dst) if entry.interface else None
+
+        for interface in sorted(model.ports[node]):
+            own = model.addresses[node].get(interface)
+            if own is not None and dst in own.network:
+                return interface, dst
+        gateway = model.host_gateway(node)
+        if gateway is None:
+            return None
+        gateway_ip = self._address_in(gateway.target, gateway.network)
+        return (gateway.interface, gateway_ip) if gateway_ip else None
+
+    def _originate(self, node, packet):
+        owner = self.model.ip_index.get(str(packet.dst))
+        if owner is not None and owner[0] == node:
+            return self._deliver(node, packet)
+        route = self._route(node, packet.dst)
+        if route is None:
+            self._hop(packet.trace, node, 'drop', f'Нет маршрута к адресату {packet.dst}')
+            return
+        self._resolve(node, route[0], route[1], packet)
+
+    def _resolve(self, node, interface, next_ip, packet):
+        """Отправка IP-пакета следующему прыжку; при отсутствии записи ARP пакет ждёт ответа"""
+        if (node, interface) not in self.macs:
+            self._hop(packet.trace, node, 'drop', f'Интерфейс {interface} не подключён')
+            return
+        mac = self.arp[node].get(next_ip)
+        if mac is not None:
+            self._send_frame(node, interface, Frame(self.macs[(node, interface)], mac, 'ip', packet))
+            return
+
+        key = (node, next_ip)
+        if key in self._pending:
+            self._pending[key].append((interface, packet))
+            return
+        self._pending[key] = [(interface, packet)]
+        own_mac = self.macs[(node, interface)]
+        sender_ip = self._interface_ip(node, interface)
+        self._hop(packet.trace, node, 'arp', f'ARP-запрос: кто имеет {next_ip}? Сообщить {sender_ip}')
+        request = Arp('request', own_mac, sender_ip, next_ip, packet.trace)
+        self._send_frame(node, interface, Frame(own_mac, BROADCAST, 'arp', request))
+        self.scheduler.schedule(self.arp_timeout, self._arp_timeout, node, next_ip)
+
+    def _arp_timeout(self, node, next_ip):
+        for _, packet in self._pending.pop((node, next_ip), None) or ():
+            self._hop(packet.trace, node, 'drop', f'Нет ответа ARP от {next_ip}')
+            if self.model.kinds[node] == 'router':
+                self._icmp_error(node, None, packet, ICMP_UNREACHABLE)
+
+    def _send_frame(self, node, interface, frame):
+        peer = self.model.ports[node].get(interface)
+        if peer is not None:
+            self.scheduler.schedule(self.link_delay, self._receive, peer[0], peer[1], frame)
+
+    def _receive(self, node, interface, frame):
+        if self.model.kinds[node] == 'switch':
+            self._switch(node, interface, frame)
+        elif frame.dst == BROADCAST or frame.dst == self.macs[(node, interface)]:
+            if frame.kind == 'arp':
+                self._receive_arp(node, interface, frame.payload)
+            else:
+                self._receive_ip(node, interface, frame.payload)
+
+    def _switch(self, node, port, frame):
+        """Обучение коммутатора по адресу отправителя и пересылка кадра в известный порт или во все"""
+        if (node, port) in self._blocked:
+            return
+        table = self.mac_tables[node]
+        table[frame.src] = port
+        trace = frame.payload.trace if frame.kind == 'ip' else None
+        out = table.get(frame.dst)
+        if out is not None:
+            if out != port:
+                self._hop(trace, node, 'forward', f'Перенаправление к {self.model.ports[node][out][0]} через {out}')
+                self._send_frame(node, out, frame)
+            return
+        self._hop(trace, node, 'flood', f'Адрес {frame.dst} неизвестен, рассылка во все порты')
+        for other in sorted(self.model.ports[node]):
+            if other != port and (node, other) not in self._blocked:
+                self._send_frame(node, other, frame)
+
+    def _receive_arp(self, node, interface, arp):
+        if arp.op == 'request':
+            owner = self.model.ip_index.get(str(arp.target_ip))
+            if owner is None or owner[0] != node:
+                return
+            self.arp[node][arp.sender_ip] = arp.sender_mac
+            own_mac = self.macs[(node, interface)]
+            self._hop(arp.trace, node, 'arp', f'ARP-ответ: {arp.target_ip} находится по адресу {own_mac}')
+            reply = Arp('reply', own_mac, arp.target_ip, arp.sender_ip, arp.trace)
+            self._send_frame(node, interface, Frame(own_mac, arp.sender_mac, 'arp', reply))
+            return
+
+        self.arp[node][arp.sender_ip] = arp.sender_mac
+        for out, packet in self._pending.pop((node, arp.sender_ip), None) or ():
+            self._send_frame(node, out, Frame(self.macs[(node, out)], arp.sender_mac, 'ip', packet))
+
+    def _receive_ip(self, node, interface, packet):
+        owner = self.model.ip_index.get(str(packet.dst))
+        if owner is not None and owner[0] == node:
+            self._deliver(node, packet)
+            return
+        if self.model.kinds[node] != 'router':
+            self._hop(packet.trace, node, 'drop', f'Узел не пересылает пакеты для {packet.dst}')
+            return
+        if packet.ttl <= 1:
+            self._hop(packet.trace, node, 'timeout', f'TTL истёк, ICMP time exceeded для {packet.src}')
+            self._icmp_error(node, interface, packet, ICMP_TIME_EXCEEDED)
+            return
+
+        packet = packet._replace(ttl=packet.ttl - 1)
+        route = self._route(node, packet.dst)
+        if route is None:
+            self._hop(packet.trace, node, 'drop', f'Нет маршрута к адресату {packet.dst}')
+            self._icmp_error(node, interface, packet, ICMP_UNREACHABLE)
+            return
+        self._hop(packet.trace, node, 'route', f'Маршрутизация {packet.dst} через {route[0]} (следующий прыжок {route[1]}, TTL={packet.ttl})')
+        self._resolve(node, route[0], route[1], packet)
+
+    def _icmp_error(self, node, interface, packet, icmp_type):
+        # На ICMP-ошибки ответ не отправляется, чтобы не порождать их лавину
+        if packet.proto == 'icmp' and packet.icmp_type not in (ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY):
+            return
+        source = self._interface_ip(node, interface)
+        if source is not None:
+            self._originate(node, Packet(source, packet.src, DEFAULT_TTL, 'icmp', icmp_type, None, packet.ident, None))
+
+    def _deliver(self, node, packet):
+        self._hop(packet.trace, node, 'receive', f'Пакет получен адресатом {packet.dst}')
+        # Копии трассируемого кадра, разосланные коммутаторами, дальше не записываются
+        self._closed.add(packet.trace)
+        now = self.scheduler.now
+        if packet.proto != 'icmp' or packet.icmp_type == ICMP_ECHO_REQUEST:
+            self._delivered.setdefault(packet.ident, (node, now))
+            if packet.proto == 'icmp':
+                reply = Packet(packet.dst, packet.src, DEFAULT_TTL, 'icmp', ICMP_ECHO_REPLY, None, packet.ident, None)
+                self._originate(node, reply)
+        else:
+            self._responses.setdefault(packet.ident, (packet.icmp_type, packet.src, now))
+
+
+class SimulatedTracer(TraceRecorder):
+    """
+    Трассировщик с интерфейсом PacketTracer, работающий по симуляции сети
+    вместо Mininet. Время прыжков - модельное, отсчитанное от начала прогона.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.simulator = NetworkSimulator(model)
+        self.simulator.on_hop = self._record_hop
+        self._started = 0.0
+        self._lock = threading.Lock()
+
+    def _record_hop(self, trace_id, node, action, details, now):
+        self.add_hop(trace_id, node, action, details, at=self._started + now)
+
+    def _node_address(self, name):
+        addresses = self.model.addresses.get(name) or {}
+        for interface in sorted(addresses, key=str):
+            return addresses[interface]
+        return None
+
+    def _send(self, source, packet):
+        with self._lock:
+            self._started = time.time()
+            return self.simulator.send(source, packet)
+
+    def _packet(self, source_ip, dest_ip, packet_config, ttl=DEFAULT_TTL, trace_id=None):
+        protocol = packet_config.get('protocol', 'icmp').lower()
+        ident = self.simulator.next_ident()
+        if protocol == 'icmp':
+            return Packet(source_ip, dest_ip, ttl, 'icmp', ICMP_ECHO_REQUEST, None, ident, trace_id)
+        if protocol in ('tcp', 'http'):
+            return Packet(source_ip, dest_ip, ttl, 'tcp', None, packet_config.get('dport', 80), ident, trace_id)
+        if protocol == 'udp':
+            return Packet(source_ip, dest_ip, ttl, 'udp', None, packet_config.get('dport', 53), ident, trace_id)
+        raise Exception(f"Unsupported protocol: {protocol}")
+
+    def _failure(self, outcome):
+        if not outcome.completed:
+            return f"Simulation stopped after {SIM_MAX_EVENTS} events"
+        if outcome.response is not None:
+            icmp_type, sender, _ = outcome.response
+            if icmp_type == ICMP_TIME_EXCEEDED:
+                return f"Time to live exceeded at {sender}"
+            if icmp_type == ICMP_UNREACHABLE:
+                return f"Destination unreachable (reported by {sender})"
+        return "Request timed out"
+
+    def start_trace(self, trace_id, source, destination, packet_config):
+        """Начинает трассировку пакета в симуляции"""
+        try:
+            if source not in self.model.kinds or destination not in self.model.kinds:
+                raise Exception(f"Source or destination node not found: {source if source not in self.model.kinds else ''} {destination if destination not in self.model.kinds else ''}")
+            source_address = self._node_address(source)
+            if source_address is None:
+                raise Exception(f"Source node {source} has no IP address")
+            dest_address = self._node_address(destination)
+            if dest_address is None:
+                raise Exception(f"Destination node {destination} has no IP address")
+
+            packet = self._packet(source_address.ip, dest_address.ip, packet_config, trace_id=trace_id)
+            self._create_trace(trace_id, source, destination, str(source_address), str(dest_address), f"Packet created from {source_address} to {dest_address}")
+            self.add_hop(trace_id, source, "send", f"Sending {packet_config.get('protocol', 'icmp').upper()} packet from {source_address} to {dest_address}")
+
+            outcome = self._send(source, packet)
+            if outcome.delivered is not None:
+                self.complete_trace(trace_id, success=True)
+            else:
+                self.complete_trace(trace_id, success=False, error=self._failure(outcome))
+        except Exception as e:
+            self.complete_trace(trace_id, success=False, error=str(e))
+
+    def ping(self, source_node_name, destination_ip, count=1):
+        """Пинг от источника к IP-адресу назначения в симуляции"""
+        if source_node_name not in self.model.kinds:
+            return {
+                "success": False,
+                "error": f"Source node {source_node_name} not found"
+            }
+        source_address = self._node_address(source_node_name)
+        if source_address is None:
+            return {
+                "success": False,
+                "error": f"Source node {source_node_name} has no IP address"
+            }
+
+        destination_ip = destination_ip.split('/')[0]
+        try:
+            destination = IPv4Address(destination_ip)
+        except ValueError:
+            return {
+                "success": False,
+                "error": f"Invalid destination IP {destination_ip}"
+            }
+
+        results = []
+        for i in range(count):
+            packet = self._packet(source_address.ip, destination, {"protocol": "icmp"})
+            outcome = self._send(source_node_name, packet)
+            response = outcome.response
+            if response is not None and response[0] == ICMP_ECHO_REPLY:
+                results.append({
+                    "seq": i + 1,
+                    "success": True,
+                    "time_ms": round(response[2] * 1000, 3),
+                    "destination": destination_ip
+                })
+            else:
+                results.append({
+                    "seq": i + 1,
+                    "success": False,
+                    "error": self._failure(outcome)
+                })
+
+        successes = sum(1 for r in results if r.get("success", False))
+
+        return {
+            "source": source_node_name,
+            "source_ip": str(source_address.ip),
+            "destination_ip": destination_ip,
+            "packets_sent": count,
+            "packets_received": successes,
+            "packet_loss": (count - successes) / count * 100 if count > 0 else 100,
+            "results": results
+        }
+
+    def traceroute(self, source_node_name, destination_ip, config=None):
+        """Трассировка маршрута зондами с растущим TTL в симуляции"""
+        if config is None:
+            config = {}
+
+        destination_ip = destination_ip.split('/')[0]
+        destination = self.model.owner_of(destination_ip)
+        if not destination:
+            return {
+                "success": False,
+                "error": f"No host with IP {destination_ip} found"
+            }
+        source_address = self._node_address(source_node_name)
+        if source_node_name not in self.model.kinds or source_address is None:
+            return {
+                "success": False,
+                "error": f"Source node {source_node_name} not found or has no IP address"
+            }
+
+        trace_id = f"traceroute-{time.time()}"
+        self._create_trace(trace_id, source_node_name, destination, str(source_address), destination_ip, f"Starting simulated traceroute from {source_address.ip} to {destination_ip}")
+
+        max_ttl = config.get('max_ttl', 20)
+        error = f"Destination {destination_ip} not reached within {max_ttl} hops"
+        for ttl in range(1, max_ttl + 1):
+            packet = self._packet(source_address.ip, IPv4Address(destination_ip), config, ttl=ttl)
+            outcome = self._send(source_node_name, packet)
+            response = outcome.response
+            if outcome.delivered is not None:
+                rtt = response[2] * 1000 if response is not None and response[0] == ICMP_ECHO_REPLY else None
+                node_name = outcome.delivered[0]
+                self.add_hop(trace_id, node_name, "hop",
+                    f"TTL={ttl} IP={destination_ip}" + (f" time={round(rtt, 3)}ms" if rtt is not None else ""))
+                self.add_hop(trace_id, node_name, "receive", f"Packet reached destination {destination_ip}")
+                error = None
+                break
+            if response is not None and response[0] == ICMP_TIME_EXCEEDED:
+                node_name = self.model.owner_of(str(response[1])) or f"unknown-{response[1]}"
+                self.add_hop(trace_id, node_name, "hop", f"TTL={ttl} IP={response[1]} time={round(response[2] * 1000, 3)}ms")
+                continue
+            if response is not None:
+                error = self._failure(outcome)
+                self.add_hop(trace_id, self.model.owner_of(str(response[1])) or f"unknown-{response[1]}", "drop", error)
+                break
+            self.add_hop(trace_id, f"hop-{ttl}", "timeout", f"No response (TTL={ttl})")
+
+        if error is None:
+            self.complete_trace(trace_id, success=True)
+        else:
+            self.complete_trace(trace_id, success=False, error=error)
+        result = self.get_trace_info(trace_id)
+
+        return {
+            "source": source_node_name,
+            "destination": destination,
+            "destination_ip": destination_ip,
+            "success": result.get("success", False),
+            "hops": result.get("hops", []),
+            "error": result.get("error")
+        }
+
+
+_tracers = OrderedDict()
+_tracers_lock = threading.Lock()
+
+
+def get_simulated_tracer(topology):
+    """
+    Трассировщик-симулятор сохранённой топологии. Держится в кэше по id
+    топологии и пересобирается, когда её конфигурация в БД изменилась.
+    """
+    stamp = topology.updated_at.timestamp() if topology.updated_at else 0
+    with _tracers_lock:
+        entry = _tracers.get(topology.id)
+        if entry is not None and entry[0] == stamp:
+            _tracers.move_to_end(topology.id)
+            return entry[1]
+
+    tracer = SimulatedTracer(ForwardingModel.from_config(topology.get_topology_config(), version=stamp))
+    with _tracers_lock:
+        _tracers[topology.id] = (stamp, tracer)
+        _tracers.move_to_end(topology.id)
+        while len(_tracers) > SIM_CACHE_SIZE:
+            _tracers.popitem(last=False)
+    return tracer
@@ -2,43 +2,320 @@ from mininet.net import Mininet
 from mininet.node import Controller, OVSSwitch, NOX
 from mininet.topo import Topo
 import time
-from ipaddress import IPv4Network, IPv4Address
-import random
 import os
 import subprocess
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+from .forwarding_model import ForwardingModel
+from .routing_table import RoutingTable
+from .ip_allocator import IPAllocator
+from .build_planner import BuildPlanner, independent_rounds
+from .ovs_batch import OVSBatch
+from .node_batch import NodeCommandBatch
+from .netlink import NetlinkConfigurator
+from .scapy_agent import ScapyAgentPool
+from .path_cache import PathCache
+from .topology_reconciler import TopologyReconciler
+from .readiness import NetworkReadiness, wait_until, ovsdb_ready
+
+# Сколько последних изменений сети хранится для точечной инвалидации кэшей
+CHANGE_LOG_SIZE = int(os.environ.get('CHANGE_LOG_SIZE', '256'))
 
 class NetworkTopology:
-    def __init__(self):
+    def __init__(self, name_prefix='', ip_base='10.0.0.0/24'):
         self.net = None
         self.topo = None
         self.nodes = {}
-        self.ip_pool = list(IPv4Network('10.0.0.0/24').hosts())
-        self.used_ips = set()
+        self.name_prefix = name_prefix
+        self.ip_base = ip_base
+        self._logical_names = {}
+        self.ip_allocator = IPAllocator(policy='random')
+        self.ip_allocator.add_pool(ip_base)
         self.switch_ip_map = {}
-        self.active_topology = None
-        
+        self.ip_index = {}
+        self._node_ips = {}
+        # Индекс адресов изменяется и из параллельных этапов построения сети
+        self._index_lock = threading.Lock()
+        self.routing_tables = {}
+        self.last_build_report = None
+        self.readiness = NetworkReadiness()
+        self.netlink = NetlinkConfigurator() if NetlinkConfigurator.available() else None
+        self.scapy_agents = ScapyAgentPool()
+        self._started_switches = set()
+        self.version = 0
+        self._forwarding_model = None
+        self._model_lock = threading.Lock()
+        self.path_cache = PathCache()
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)
+        self._active_signature = None
+        self._active_topology = None
+
+    @property
+    def active_topology(self):
+        """Модель активной топологии из базы данных"""
+        return self._active_topology
+
+    @active_topology.setter
+    def active_topology(self, topology):
+        self._active_topology = topology
+        signature = (getattr(topology, 'id', None), getattr(topology, 'updated_at', None)) if topology is not None else None
+        if signature != self._active_signature:
+            self._active_signature = signature
+            # Меняется только конфигурация из БД, узлы работающей сети прежние
+            self.notify_changed(nodes=())
+
     def is_running(self):
         """Проверка, инициализирована ли сеть и запущена ли"""
         return self.net is not None
+
+    def bridge_name(self, name):
+        """Имя коммутатора в Mininet и OVS с префиксом экземпляра эмулятора"""
+        return f"{self.name_prefix}{name}"
+
+    def node_name(self, node):
+        """Имя узла Mininet в топологии (без префикса экземпляра)"""
+        return self._logical_names.get(node.name, node.name)
+
+    def _add_mininet_switch(self, name):
+        # Интерфейсы коммутаторов находятся в корневом пространстве имён,
+        # поэтому имена мостов разных экземпляров не должны совпадать
+        switch = self.net.addSwitch(self.bridge_name(name))
+        if switch:
+            self._logical_names[switch.name] = name
+        return switch
+
+    @contextmanager
+    def command_batch(self, batch=None):
+        """
+        Пакет команд для узлов сети. Команды, добавленные в блоке, выполняются
+        при выходе из него - один вызов оболочки на узел. Если передан уже
+        существующий пакет, команды добавляются в него, а выполнение
+        откладывается до его flush.
+        """
+        if batch is not None:
+            yield batch
+            return
+        batch = NodeCommandBatch()
+        yield batch
+        batch.flush()
+
+    def set_link_up(self, node, interface_name, batch=None):
+        """Включение интерфейса узла: через netlink или командой `ip` в пакете"""
+        if self.netlink:
+            self.netlink.link_up(node, interface_name)
+            return
+        with self.command_batch(batch) as commands:
+            commands.ip(node, 'link', 'set', interface_name, 'up')
+
+    def add_node_address(self, node, interface_name, address, batch=None):
+        if self.netlink:
+            self.netlink.add_address(node, interface_name, address)
+            return
+        with self.command_batch(batch) as commands:
+            commands.ip(node, 'addr', 'add', address, 'dev', interface_name)
+
+    def del_node_address(self, node, interface_name, address, batch=None):
+        if self.netlink:
+            self.netlink.del_address(node, interface_name, address)
+            return
+        with self.command_batch(batch) as commands:
+            commands.ip(node, 'addr', 'del', address, 'dev', interface_name)
+
+    def _node_route(self, command, node, network, next_hop, interface, batch):
+        if self.netlink:
+            apply = self.netlink.add_route if command == 'add' else self.netlink.del_route
+            apply(node, network, next_hop, interface)
+            return
+        route_args = ['route', command, network]
+        if next_hop:
+            route_args += ['via', next_hop]
+        if interface:
+            route_args += ['dev', interface]
+        with self.command_batch(batch) as commands:
+            commands.ip(node, *route_args)
+
+    def set_node_sysctl(self, node, key, value, batch=None):
+        """Установка параметра sysctl в сетевом пространстве имён узла"""
+        if self.netlink:
+            self.netlink.set_sysctl(node, key, value)
+            return
+        with self.command_batch(batch) as commands:
+            commands.sysctl(node, key, value)
+
+    def get_interface_addresses(self, name, interface_name=None):
+        """
+        IPv4-адреса интерфейсов узла в виде списка словарей
+        {"interface", "address", "prefixlen"}
+        """
+        node = self.get_node(name)
+        if node is None:
+            return []
+        if self.netlink:
+            return self.netlink.addresses(node, interface_name)
+        command = f"ip -o -4 addr show dev {interface_name}" if interface_name else "ip -o -4 addr show"
+        addresses = []
+        for match in re.finditer(r'^\d+:\s+(\S+)\s+inet\s+(\d+\.\d+\.\d+\.\d+)/(\d+)', node.cmd(command), re.M):
+            addresses.append({
+                "interface": match.group(1),
+                "address": match.group(2),
+                "prefixlen": int(match.group(3))
+            })
+        return addresses
+
+    def notify_changed(self, update=None, nodes=None):
+        """
+        Отмечает изменение сети и увеличивает версию топологии.
+        Если передана функция update, скомпилированная модель пересылки
+        обновляется на месте, иначе она будет перестроена при следующем обращении.
+        nodes - изменённые узлы: из кэша маршрутов удаляются только пути через
+        их L2-сегменты (до и после изменения), без nodes кэш очищается.
+        nodes=() - изменилась только конфигурация из БД, узлы сети прежние.
+        """
+        with self._model_lock:
+            model = self._forwarding_model
+            affected = None
+            if nodes and model is not None and model.version == self.version:
+                affected = model.segment_nodes(nodes)
+            self.version += 1
+            self._changes.append((self.version, frozenset(nodes) if nodes is not None else None))
+            if model is not None and update is not None and model.version == self.version - 1:
+                try:
+                    update(model)
+                    model.version = self.version
+                    if affected is not None:
+                        affected |= model.segment_nodes(nodes)
+                    self.path_cache.advance(self.version, affected)
+                    return
+                except Exception as e:
+                    print(f"Error updating forwarding model incrementally: {str(e)}")
+                    affected = None
+            self._forwarding_model = None
+            self.path_cache.advance(self.version, affected)
+
+    def changes_since(self, version):
+        """
+        Узлы, изменённые после версии version; None, если изменения
+        неизвестны (без списка узлов или уже вытеснены из журнала)
+        """
+        with self._model_lock:
+            if version == self.version:
+                return set()
+            if version is None or version > self.version:
+                return None
+            entries = [nodes for entry_version, nodes in self._changes if entry_version > version]
+            if len(entries) != self.version - version or None in entries:
+                return None
+            return set().union(*entries)
+
+    def get_forwarding_model(self):
+        """Получение скомпилированной модели пересылки для текущей версии топологии"""
+        with self._model_lock:
+            model = self._forwarding_model
+            if model is None or model.version != self.version:
+                model = ForwardingModel.compile(self)
+                self._forwarding_model = model
+            return model
         
-    def get_next_ip(self):
+    def get_next_ip(self, owner=None, pool=None):
         """Получение следующего доступного IP-адреса"""
-        available_ips = [ip for ip in self.ip_pool if ip not in self.used_ips]
-        if not available_ips:
-            raise Exception("Нет доступных IP-адресов")
-        
-        ip = random.choice(available_ips)
-        self.used_ips.add(ip)
-        return f"{ip}/24"
+        return str(self.ip_allocator.allocate(pool, owner))
+
+    def reserve_ip(self, ip, owner=None):
+        """Резервирование явно назначенного IP-адреса, чтобы он не был выдан повторно"""
+        if ip and not self.ip_allocator.reserve(ip, owner):
+            print(f"Warning: IP {ip} is already in use")
+            return False
+        return True
+
+    def release_node_ips(self, name):
+        """Освобождение всех IP-адресов узла"""
+        self.unindex_node(name)
+        released = self.ip_allocator.release_owner(name)
+        if released:
+            print(f"Released IPs of {name}: {released}")
+        return released
+
+    def index_ip(self, name, ip, interface=None):
+        """
+        Регистрация адреса узла в индексе IP -> (узел, интерфейс).
+        Прежний адрес того же интерфейса удаляется из индекса.
+        """
+        if not ip:
+            return
+        address = str(ip).split('/')[0]
+        with self._index_lock:
+            addresses = self._node_ips.setdefault(name, {})
+            if interface is not None:
+                for previous in [a for a in addresses if a != address and self.ip_index.get(a) == (name, interface)]:
+                    del self.ip_index[previous]
+                    del addresses[previous]
+
+            owner = self.ip_index.get(address)
+            if owner is not None and owner[0] != name:
+                print(f"Warning: IP {address} of {owner[0]} is reassigned to {name}")
+                self._node_ips.get(owner[0], {}).pop(address, None)
+            self.ip_index[address] = (name, interface)
+            addresses[address] = str(ip)
+
+    def unindex_ip(self, name, ip):
+        """Удаление одного адреса узла из индекса"""
+        address = str(ip).split('/')[0]
+        with self._index_lock:
+            self._node_ips.get(name, {}).pop(address, None)
+            if self.ip_index.get(address, (None,))[0] == name:
+                del self.ip_index[address]
+
+    def unindex_node(self, name):
+        """Удаление всех адресов узла из индекса"""
+        with self._index_lock:
+            for address in self._node_ips.pop(name, {}):
+                if self.ip_index.get(address, (None,))[0] == name:
+                    del self.ip_index[address]
+
+    def get_node_addresses(self, name):
+        """Адреса узла из индекса в виде пар (интерфейс, IP в исходной записи)"""
+        return [(self.ip_index[address][1], ip) for address, ip in self._node_ips.get(name, {}).items()
+                if address in self.ip_index]
+
+    def _reset_addressing(self):
+        """Сброс адресов и таблиц маршрутизации узлов; управляющие IP коммутаторов сохраняются"""
+        self.ip_allocator.release_all()
+        self.routing_tables = {}
+        self.ip_index = {}
+        self._node_ips = {}
+        for switch_name, ip in self.switch_ip_map.items():
+            self.reserve_ip(ip, owner=switch_name)
+            self.index_ip(switch_name, ip)
+
+    def get_ip_owner(self, ip_address):
+        """Возвращает (имя узла, интерфейс) для IP-адреса или None"""
+        if not ip_address:
+            return None
+        return self.ip_index.get(ip_address.split('/')[0])
 
     def assign_ip_to_switch(self, switch_name, ip=None):
         """Присваивание IP-адреса к коммутатору (управление IP)"""
+        self.release_node_ips(switch_name)
         if not ip:
-            ip = self.get_next_ip()
+            ip = self.get_next_ip(owner=switch_name)
+        else:
+            self.reserve_ip(ip, owner=switch_name)
         
         self.switch_ip_map[switch_name] = ip
+        self.index_ip(switch_name, ip)
+        self.notify_changed(lambda model: model.index_ip(ip, switch_name), nodes=[switch_name])
         return ip
 
+    def get_routing_table(self, router_name):
+        """Получение таблицы маршрутизации маршрутизатора (создаётся при первом обращении)"""
+        table = self.routing_tables.get(router_name)
+        if table is None:
+            table = RoutingTable()
+            self.routing_tables[router_name] = table
+        return table
+
     def get_switch_ip(self, switch_name):
         """Получение управляющего IP-адреса коммутатора"""
         return self.switch_ip_map.get(switch_name)
@@ -93,7 +370,7 @@ class NetworkTopology:
             subprocess.Popen(['ovs-vswitchd', '--pidfile', '--detach'])
             
             print("Waiting for OVS services to start...")
-            time.sleep(3)
+            wait_until(ovsdb_ready, 10, description="OVSDB socket")
             
             result = subprocess.run(['ovs-vsctl', 'show'], 
                                    stdout=subprocess.PIPE, 
@@ -129,9 +406,12 @@ class NetworkTopology:
                 print(f"Warning: Error stopping existing network: {str(e)}")
 
         print("Creating new topology")
+        self.readiness.reset()
         self.topo = Topo()
         self.nodes = {}
-        self.used_ips = set()
+        self._logical_names = {}
+        self._started_switches = set()
+        self._reset_addressing()
 
         print("Creating Mininet instance")
         try:
@@ -142,7 +422,7 @@ class NetworkTopology:
                     controller=None,
                     autoSetMacs=True,
                     waitConnected=False,
-                    ipBase='10.0.0.0/24',
+                    ipBase=self.ip_base,
                     cleanup=True
                 )
                 print(f"Mininet instance created: {self.net}")
@@ -175,91 +455,63 @@ class NetworkTopology:
                 traceback.print_exc()
                 raise
                 
-            time.sleep(2)
+            wait_until(ovsdb_ready, 5, description="OVSDB socket")
             print("Mininet started successfully")
 
-            print("Adding hosts...")
+            for host_config in config.get('hosts', []):
+                self.reserve_ip(host_config.get('ip'), owner=host_config['name'])
+            for switch_config in config.get('switches', []):
+                self.reserve_ip(switch_config.get('ip'), owner=switch_config['name'])
+            for router_config in config.get('routers', []):
+                self.reserve_ip(router_config.get('ip'), owner=router_config['name'])
+                for intf_config in router_config.get('interfaces') or []:
+                    self.reserve_ip(intf_config.get('ip'), owner=router_config['name'])
+
+            planner = BuildPlanner()
+
+            # Mininet не потокобезопасен: addHost/addSwitch меняют счётчик адресов
+            # (nextIP для MAC и IP по умолчанию) и общие списки сети, поэтому узлы
+            # создаются по одному; параллельно выполняются связи и настройка узлов
+            hosts_stage = planner.stage("hosts", parallel=False)
             added_hosts = set()
             for host_config in config.get('hosts', []):
                 name = host_config['name']
                 if name not in added_hosts:
-                    try:
-                        ip = host_config.get('ip') or self.get_next_ip()
-                        host = self.net.addHost(name, ip=ip)
-                        self.nodes[name] = host
-                        added_hosts.add(name)
-                        print(f"Added host: {name} with IP {ip}")
-                    except Exception as e:
-                        print(f"Error adding host {name}: {str(e)}")
-                        raise
+                    added_hosts.add(name)
+                    hosts_stage.add(name, self._build_host, name, host_config.get('ip'))
 
-            print("Adding switches...")
+            switches_stage = planner.stage("switches", parallel=False)
             for switch_config in config.get('switches', []):
-                try:
-                    switch = self.net.addSwitch(switch_config['name'])
-                    self.nodes[switch_config['name']] = switch
-                    print(f"Added switch: {switch_config['name']}")
-                except Exception as e:
-                    print(f"Error adding switch {switch_config['name']}: {str(e)}")
-                    raise
-                
-            print("Adding router nodes...")
+                switches_stage.add(switch_config['name'], self._build_switch, switch_config['name'])
+
+            routers_stage = planner.stage("routers", parallel=False)
             for router_config in config.get('routers', []):
-                try:
-                    router = self.add_router(router_config['name'])
-                    self.nodes[router_config['name']] = router
-                    print(f"Added router node: {router_config['name']}")
-                except Exception as e:
-                    print(f"Error adding router node {router_config['name']}: {str(e)}")
-                    raise
+                routers_stage.add(router_config['name'], self._build_router, router_config['name'])
 
-            print("Adding links...")
-            for link in config.get('links', []):
-                try:
-                    n1 = self.nodes.get(link['node1'])
-                    n2 = self.nodes.get(link['node2'])
-                    if n1 and n2:
-                        self.net.addLink(n1, n2)
-                        print(f"Added link: {link['node1']} <-> {link['node2']}")
-                except Exception as e:
-                    print(f"Error adding link {link['node1']} <-> {link['node2']}: {str(e)}")
-                    raise
-                    
-            print("Configuring routers...")
+            links = [(link['node1'], link['node2']) for link in config.get('links', [])]
+            for index, links_round in enumerate(independent_rounds(links)):
+                links_stage = planner.stage(f"links #{index + 1}")
+                for node1, node2 in links_round:
+                    links_stage.add(f"{node1} <-> {node2}", self._build_link, node1, node2)
+
+            router_config_stage = planner.stage("router configuration", critical=False)
             for router_config in config.get('routers', []):
-                try:
-                    router_name = router_config['name']
-                    print(f"Configuring router: {router_name}")
-                    
-                    if 'interfaces' in router_config:
-                        for intf_config in router_config['interfaces']:
-                            if 'name' in intf_config and 'ip' in intf_config:
-                                try:
-                                    self.configure_router_interface(
-                                        router_name,
-                                        intf_config['name'],
-                                        intf_config['ip'],
-                                        intf_config.get('subnet_mask', 24)
-                                    )
-                                except Exception as e:
-                                    print(f"Error configuring router interface: {str(e)}")
-                    
-                    if 'routes' in router_config:
-                        for route_config in router_config['routes']:
-                            if 'network' in route_config:
-                                try:
-                                    self.add_route(
-                                        router_name,
-                                        route_config['network'],
-                                        route_config.get('next_hop'),
-                                        route_config.get('interface')
-                                    )
-                                except Exception as e:
-                                    print(f"Error adding route to router: {str(e)}")
-                                
-                    print(f"Router {router_name} configured successfully")
-                except Exception as e:
-                    print(f"Error configuring router {router_config['name']}: {str(e)}")
+                router_config_stage.add(router_config['name'], self._configure_router_from_config, router_config)
+
+            start_stage = planner.stage("start switches")
+            for switch_config in config.get('switches', []):
+                start_stage.add(switch_config['name'], self._start_switch, switch_config['name'])
+
+            ovs_batch = OVSBatch()
+            for switch_config in config.get('switches', []):
+                ovs_batch.configure_switch(self.bridge_name(switch_config['name']))
+            planner.stage("switch configuration", critical=False).add("ovs-vsctl", ovs_batch.commit_settings)
+            flows_stage = planner.stage("switch flows", critical=False)
+            for bridge in ovs_batch.flow_bridges():
+                flows_stage.add(bridge, ovs_batch.commit_flows, bridge)
+
+            self.last_build_report = planner.run()
+            print(f"Build report: {self.last_build_report}")
 
             if not hasattr(self.net, 'switches'):
                 print("WARNING: Network object missing 'switches' attribute")
@@ -283,23 +535,9 @@ class NetworkTopology:
                     print("Added built=True property to network")
                 except Exception as e:
                     print(f"Error adding built property: {e}")
-            
-            print("Configuring switches...")
-            for switch in self.net.switches:
-                try:
-                    self.configure_switch(switch.name)
-                except Exception as e:
-                    print(f"Error configuring switch {switch}: {str(e)}")
-                    raise
-                
-            for node_name, node in self.nodes.items():
-                if node_name.startswith('r'):
-                    try:
-                        node.cmd('sysctl -w net.ipv4.ip_forward=1')
-                        print(f"Enabled IP forwarding on router {node_name}")
-                    except Exception as e:
-                        print(f"Error enabling IP forwarding on router {node_name}: {str(e)}")
 
+            self.notify_changed()
+            self.readiness.start(self)
             print("Network creation completed successfully")
             return True
 
@@ -312,20 +550,124 @@ class NetworkTopology:
                     print(f"Error stopping network during cleanup: {str(stop_error)}")
                 self.net = None
             self.nodes = {}
+            self.readiness.reset("failed")
+            self.notify_changed()
             raise
 
+    def reconcile_network(self, config):
+        """
+        Приведение работающей сети к конфигурации: применяются только
+        добавленные и удалённые узлы, связи, адреса и маршруты.
+        Если сеть не запущена, она строится целиком.
+        """
+        if not self.net:
+            self.create_network(config)
+            return self.last_build_report
+
+        reconciler = TopologyReconciler(self)
+        diff = reconciler.diff(config)
+        if diff.is_empty():
+            print("Network already matches the configuration")
+            self.last_build_report = {"mode": "incremental", "changes": diff.summary(), "stages": [], "total_ms": 0.0}
+            return self.last_build_report
+
+        print(f"Reconciling network: {diff.summary()}")
+        self.readiness.reset()
+        try:
+            self.last_build_report = reconciler.apply(diff)
+        finally:
+            self.readiness.start(self)
+        print(f"Reconcile report: {self.last_build_report}")
+        return self.last_build_report
+
+    def _build_host(self, name, ip=None):
+        """Создание хоста при построении сети"""
+        ip = ip or self.get_next_ip(owner=name)
+        host = self.net.addHost(name, ip=ip)
+        self.nodes[name] = host
+        self.index_ip(name, ip)
+        print(f"Added host: {name} with IP {ip}")
+
+    def _build_switch(self, name):
+        """Создание коммутатора при построении сети"""
+        self.nodes[name] = self._add_mininet_switch(name)
+        print(f"Added switch: {name}")
+
+    def _build_router(self, name):
+        """Создание маршрутизатора при построении сети"""
+        self.nodes[name] = self.add_router(name)
+        print(f"Added router node: {name}")
+
+    def _build_link(self, node1, node2):
+        """Создание связи при построении сети"""
+        n1 = self.nodes.get(node1)
+        n2 = self.nodes.get(node2)
+        if n1 and n2:
+            link = self.net.addLink(n1, n2)
+            self._attach_link(link)
+            print(f"Added link: {node1} <-> {node2}")
+
+    def _start_switch(self, name):
+        """Запуск коммутатора: создание моста OVS с уже подключёнными портами"""
+        switch = self.nodes[name]
+        switch.start(self.net.controllers)
+        self._started_switches.add(name)
+
+    def _attach_link(self, link):
+        """Подключение новых интерфейсов связи к уже запущенным коммутаторам"""
+        for intf in (link.intf1, link.intf2):
+            if self.node_name(intf.node) in self._started_switches:
+                intf.node.attach(intf)
+
+    def _configure_router_from_config(self, router_config):
+        """Настройка интерфейсов, маршрутов и пересылки маршрутизатора по конфигурации"""
+        router_name = router_config['name']
+        print(f"Configuring router: {router_name}")
+
+        batch = NodeCommandBatch()
+        for intf_config in router_config.get('interfaces') or []:
+            if 'name' in intf_config and 'ip' in intf_config:
+                try:
+                    self.configure_router_interface(
+                        router_name,
+                        intf_config['name'],
+                        intf_config['ip'],
+                        intf_config.get('subnet_mask', 24),
+                        batch=batch
+                    )
+                except Exception as e:
+                    print(f"Error configuring router interface: {str(e)}")
+
+        for route_config in router_config.get('routes') or []:
+            if 'network' in route_config:
+                try:
+                    self.add_route(
+                        router_name,
+                        route_config['network'],
+                        route_config.get('next_hop'),
+                        route_config.get('interface'),
+                        batch=batch
+                    )
+                except Exception as e:
+                    print(f"Error adding route to router: {str(e)}")
+
+        router = self.nodes.get(router_name)
+        if router is not None:
+            self.set_node_sysctl(router, 'net.ipv4.ip_forward', 1, batch)
+        batch.flush()
+        print(f"Router {router_name} configured successfully")
+
     def stop_network(self):
         """Остановка текущей сети"""
         if self.net:
             try:
                 print("Инициируем остановку сети...")
                 try:
+                    ovs_batch = OVSBatch()
                     for switch in self.net.switches:
-                        try:
-                            print(f"Removing flows from switch {switch.name}")
-                            os.system(f'ovs-ofctl del-flows {switch.name}')
-                        except Exception as e:
-                            print(f"Error removing flows from switch {switch.name}: {str(e)}")
+                        ovs_batch.del_bridge(switch.name)
+                    print(f"Removing {len(self.net.switches)} switch bridges with their flows")
+                    ovs_batch.commit_settings()
                 except Exception as sw_error:
                     print(f"Error cleaning up switches: {str(sw_error)}")
                 
@@ -334,6 +676,9 @@ class NetworkTopology:
                 print("Network stopped successfully")
             except Exception as e:
                 print(f"Error during network shutdown: {str(e)}")
+                if self.name_prefix:
+                    # Общая очистка Mininet затронула бы сети других экземпляров
+                    return
                 try:
                     print("Trying fallback cleanup...")
                     os.system('mn -c')
@@ -342,19 +687,26 @@ class NetworkTopology:
                 except Exception as fallback_error:
                     print(f"Fallback cleanup also failed: {str(fallback_error)}")
             finally:
+                if self.netlink:
+                    self.netlink.close()
+                self.scapy_agents.close()
                 self.net = None
                 self.topo = None
                 self.nodes = {}
-                self.used_ips = set()
+                self._logical_names = {}
+                self._started_switches = set()
+                self._reset_addressing()
+                self.readiness.reset("stopped")
+                self.notify_changed()
                 print("Internal network state reset")
 
     def configure_switch(self, switch):
         """Настройка коммутатора"""
         try:
             print(f"Configuring switch {switch}")
-            os.system(f'ovs-vsctl set-fail-mode {switch} standalone')
-            os.system(f'ovs-vsctl set bridge {switch} stp_enable=true')
-            os.system(f'ovs-ofctl add-flow {switch} action=normal')
+            ovs_batch = OVSBatch()
+            ovs_batch.configure_switch(self.bridge_name(switch))
+            ovs_batch.commit()
             print(f"Switch {switch} configured successfully")
         except Exception as e:
             print(f"Error configuring switch {switch}: {str(e)}")
@@ -382,8 +734,10 @@ class NetworkTopology:
         try:
             print(f"Adding host {name} to network")
             if not ip:
-                ip = self.get_next_ip()
+                ip = self.get_next_ip(owner=name)
                 print(f"Generated IP {ip} for host {name}")
+            else:
+                self.reserve_ip(ip, owner=name)
 
             host = self.net.addHost(name, ip=ip)
             if not host:
@@ -435,6 +789,8 @@ class NetworkTopology:
                 print(f"Error checking/setting IP: {str(e)}")
                 assigned_ip = "unknown (error)"
             
+            self.index_ip(name, ip)
+            self.notify_changed(lambda model: model.attach_node(name, host), nodes=[name])
             print(f"Host {name} added successfully with IP {assigned_ip}")
             return host
         except Exception as e:
@@ -464,10 +820,10 @@ class NetworkTopology:
                 print(f"ERROR: Network object missing addSwitch method. Available methods: {dir(self.net)[:20]}")
                 raise Exception("Network object is invalid - missing addSwitch method")
             
-            switch = self.net.addSwitch(name)
+            switch = self._add_mininet_switch(name)
             if not switch:
                 print(f"Warning: addSwitch returned None for {name}")
-                found_switch = next((s for s in self.net.switches if s.name == name), None)
+                found_switch = next((s for s in self.net.switches if s.name == self.bridge_name(name)), None)
                 if found_switch:
                     print(f"Switch {name} was actually created despite None return")
                     switch = found_switch
@@ -477,10 +833,12 @@ class NetworkTopology:
             self.nodes[name] = switch
             
             try:
+                self._start_switch(name)
                 self.configure_switch(name)
             except Exception as config_error:
                 print(f"Warning: Switch created but configuration failed: {str(config_error)}")
             
+            self.notify_changed(lambda model: model.attach_node(name, switch), nodes=[name])
             print(f"Switch {name} added successfully")
             return switch
         except Exception as e:
@@ -522,7 +880,9 @@ class NetworkTopology:
             
             try:
                 link = self.net.addLink(n1, n2)
+                self._attach_link(link)
                 print(f"Link created successfully between {node1} and {node2}")
+                self.notify_changed(lambda model: model.add_mininet_link(link), nodes=[node1, node2])
                 return link
             except Exception as link_error:
                 print(f"ERROR: Mininet addLink method failed: {str(link_error)}")
@@ -535,6 +895,81 @@ class NetworkTopology:
             print(f"Error creating link: {str(e)}")
             raise
 
+    def remove_node(self, name):
+        """Удаление узла из сети вместе с его связями, адресами и маршрутами"""
+        node = self.nodes.get(name)
+        if node is not None and self.net:
+            for intf in node.intfList():
+                if getattr(intf, 'link', None):
+                    try:
+                        self.net.delLink(intf.link)
+                    except Exception as e:
+                        print(f"Error removing link from {name}: {str(e)}")
+            self.net.delNode(node)
+            self._logical_names.pop(node.name, None)
+        if self.netlink:
+            self.netlink.forget(name)
+        self.scapy_agents.stop(name)
+        self.nodes.pop(name, None)
+        self._started_switches.discard(name)
+        self.routing_tables.pop(name, None)
+        self.switch_ip_map.pop(name, None)
+        self.release_node_ips(name)
+        self.notify_changed(nodes=[name])
+        print(f"Node {name} removed from network")
+
+    def remove_link(self, link):
+        """Удаление связи Mininet"""
+        self.net.delLink(link)
+        self.notify_changed(nodes=[self.node_name(link.intf1.node), self.node_name(link.intf2.node)])
+        print(f"Link {self.node_name(link.intf1.node)} <-> {self.node_name(link.intf2.node)} removed")
+
+    def set_host_ip(self, name, ip):
+        """Смена IP-адреса хоста"""
+        host = self.get_node(name)
+        if not host:
+            raise Exception(f"Host {name} not found")
+
+        ip_parts = ip.split('/')
+        netmask = ip_parts[1] if len(ip_parts) > 1 else '24'
+        host.setIP(ip_parts[0], f"/{netmask}")
+        self.release_node_ips(name)
+        self.reserve_ip(ip, owner=name)
+        self.index_ip(name, ip)
+        self.notify_changed(nodes=[name])
+
+    def remove_router_address(self, router_name, ip_address, batch=None):
+        """Удаление IP-адреса с интерфейса маршрутизатора"""
+        router = self.get_node(router_name)
+        owner = self.get_ip_owner(ip_address)
+        if not router or owner is None or owner[0] != router_name:
+            return False
+
+        interface_name = owner[1]
+        if interface_name:
+            self.del_node_address(router, interface_name, ip_address, batch)
+            table = self.routing_tables.get(router_name)
+            if table is not None:
+                table.remove_connected(interface_name)
+        self.ip_allocator.release(ip_address)
+        self.unindex_ip(router_name, ip_address)
+        self.notify_changed(nodes=[router_name])
+        return True
+
+    def remove_route(self, router_name, network, next_hop=None, interface=None, batch=None):
+        """Удаление статического маршрута маршрутизатора"""
+        router = self.get_node(router_name)
+        if not router:
+            raise Exception(f"Router {router_name} not found")
+
+        table = self.routing_tables.get(router_name)
+        if table is not None:
+            table.remove_static(network, next_hop)
+
+        self._node_route('del', router, network, next_hop, interface, batch)
+        self.notify_changed(nodes=[router_name])
+        return True
+
     def get_node(self, name):
         """Получить узел по имени"""
         return self.nodes.get(name)
@@ -551,7 +986,7 @@ class NetworkTopology:
             return {"error": "No active topology"}
 
         hosts = [host.name for host in self.net.hosts]
-        switches = [switch.name for switch in self.net.switches]
+        switches = [self.node_name(switch) for switch in self.net.switches]
 
         routers = [host.name for host in self.net.hosts if host.name.startswith('r')]
 
@@ -561,59 +996,17 @@ class NetworkTopology:
             "hosts": hosts,
             "switches": switches,
             "routers": routers,
-            "links": [(link.intf1.node.name, link.intf2.node.name) 
+            "links": [(self.node_name(link.intf1.node), self.node_name(link.intf2.node)) 
                      for link in self.net.links]
         }
 
     def get_node_by_ip(self, ip_address: str):
         """Найти узел по его IP-адресу"""
-        if not ip_address:
+        owner = self.get_ip_owner(ip_address)
+        if owner is None:
+            print(f"No node found with IP {ip_address}")
             return None
-            
-        if '/' in ip_address:
-            ip_address = ip_address.split('/')[0]
-        
-        print(f"Looking for node with IP {ip_address}")
-        
-        if self.net and hasattr(self.net, 'hosts'):
-            for host in self.net.hosts:
-                try:
-                    if hasattr(host, 'IP') and callable(host.IP):
-                        node_ip = host.IP()
-                        if node_ip:
-                            node_ip_clean = node_ip.split('/')[0] if '/' in node_ip else node_ip
-                            if node_ip_clean == ip_address:
-                                print(f"Found node {host.name} with IP {node_ip} in Mininet")
-                                return host
-                except Exception as e:
-                    print(f"Error getting IP for host {host.name}: {str(e)}")
-                
-        for switch_name, ip in self.switch_ip_map.items():
-            switch_ip = ip.split('/')[0] if '/' in ip else ip
-            if switch_ip == ip_address:
-                print(f"Found switch {switch_name} with IP {ip} in switch_ip_map")
-                return self.get_node(switch_name)
-        
-        if hasattr(self, 'active_topology') and self.active_topology:
-            for db_host in self.active_topology.hosts:
-                if 'ip' in db_host and db_host['ip']:
-                    db_ip = db_host['ip'].split('/')[0] if '/' in db_host['ip'] else db_host['ip']
-                    if db_ip == ip_address:
-                        print(f"Found host {db_host['name']} with IP {db_host['ip']} in database")
-                        return self.get_node(db_host['name'])
-            
-            if hasattr(self.active_topology, 'routers'):
-                for db_router in self.active_topology.routers:
-                    if 'interfaces' in db_router:
-                        for interface in db_router['interfaces']:
-                            if 'ip' in interface and interface['ip']:
-                                interface_ip = interface['ip'].split('/')[0] if '/' in interface['ip'] else interface['ip']
-                                if interface_ip == ip_address:
-                                    print(f"Found router {db_router['name']} with interface IP {interface['ip']} in database")
-                                    return self.get_node(db_router['name'])
-        
-        print(f"No node found with IP {ip_address}")
-        return None
+        return self.get_node(owner[0])
 
     def add_router(self, name):
         """Добавление маршрутизатора в сеть"""
@@ -637,24 +1030,20 @@ class NetworkTopology:
                 traceback.print_exc()
                 raise Exception(f"Failed to create router: {str(add_error)}")
             
-            try:
-                result = router.cmd('sysctl -w net.ipv4.ip_forward=1')
-                print(f"IP forwarding result: {result}")
-            except Exception as ip_error:
-                print(f"Warning: Failed to enable IP forwarding: {str(ip_error)}")
-
             self.nodes[name] = router
+            self.get_routing_table(name)
             
             print(f"Router interfaces: {[intf.name for intf in router.intfList()]}")
-            for intf in router.intfList():
-                if intf.name != 'lo':
-                    print(f"Setting up interface {intf.name} on router {name}")
-                    try:
-                        result = router.cmd(f'ip link set {intf.name} up')
-                        print(f"Interface up result: {result}")
-                    except Exception as intf_error:
-                        print(f"Warning: Error setting interface {intf.name} up: {str(intf_error)}")
+            try:
+                with self.command_batch() as commands:
+                    self.set_node_sysctl(router, 'net.ipv4.ip_forward', 1, commands)
+                    for intf in router.intfList():
+                        if intf.name != 'lo':
+                            self.set_link_up(router, intf.name, commands)
+            except Exception as setup_error:
+                print(f"Warning: Error enabling forwarding and interfaces on router {name}: {str(setup_error)}")
             
+            self.notify_changed(lambda model: model.attach_node(name, router), nodes=[name])
             print(f"Router {name} added successfully")
             return router
         except Exception as e:
@@ -664,8 +1053,11 @@ class NetworkTopology:
             traceback.print_exc()
             raise
 
-    def configure_router_interface(self, router_name, interface_name, ip_address, subnet_mask=24):
-        """Настройка интерфейса на маршрутизаторе с IP-адресом"""
+    def configure_router_interface(self, router_name, interface_name, ip_address, subnet_mask=24, batch=None):
+        """
+        Настройка интерфейса на маршрутизаторе с IP-адресом.
+        Если передан пакет команд, команды узла ставятся в него и выполняются при его flush.
+        """
         print(f"Настройка интерфейса {interface_name} на маршрутизаторе {router_name}")
         
         router = self.get_node(router_name)
@@ -689,28 +1081,24 @@ class NetworkTopology:
             
             if '/' not in ip_address:
                 ip_address = f"{ip_address}/{subnet_mask}"
+            self.reserve_ip(ip_address, owner=router_name)
             
-            try:
-                print(f"Setting interface {interface_name} up")
-                up_result = router.cmd(f'ip link set {interface_name} up')
-                print(f"Interface up result: {up_result}")
-            except Exception as up_error:
-                print(f"Warning: Error setting interface up: {str(up_error)}")
-
-            try:
-                print(f"Adding IP {ip_address} to interface {interface_name}")
-                ip_result = router.cmd(f'ip addr add {ip_address} dev {interface_name}')
-                print(f"IP add result: {ip_result}")
-                
-                check_result = router.cmd(f"ip -o -4 addr show dev {interface_name}")
-                print(f"IP verification result: {check_result}")
-                
-                if ip_address.split('/')[0] not in check_result:
+            def verify(check):
+                print(f"IP verification result: {check.output}")
+                if ip_address.split('/')[0] not in check.output:
                     print(f"Warning: IP {ip_address} may not have been set correctly on {interface_name}")
-            except Exception as ip_error:
-                print(f"Error adding IP to interface: {str(ip_error)}")
-                raise
+
+            with self.command_batch(batch) as commands:
+                print(f"Setting interface {interface_name} up and adding IP {ip_address}")
+                self.set_link_up(router, interface_name, commands)
+                self.add_node_address(router, interface_name, ip_address, commands)
+                if self.netlink is None:
+                    # Ошибки netlink возвращаются сразу, текстовый вывод `ip` приходится проверять
+                    commands.ip(router, '-o', '-4', 'addr', 'show', 'dev', interface_name, callback=verify)
             
+            self.get_routing_table(router_name).add_connected(ip_address, interface_name)
+            self.index_ip(router_name, ip_address, interface_name)
+            self.notify_changed(lambda model: model.set_address(router_name, interface_name, ip_address), nodes=[router_name])
             print(f"Interface {interface_name} on router {router_name} configured with IP {ip_address}")
             return True
         except Exception as e:
@@ -720,8 +1108,11 @@ class NetworkTopology:
             traceback.print_exc()
             raise
 
-    def add_route(self, router_name, network, next_hop=None, interface=None):
-        """Добавление маршрута в таблицу маршрутизации маршрутизатора"""
+    def add_route(self, router_name, network, next_hop=None, interface=None, batch=None):
+        """
+        Добавление маршрута в таблицу маршрутизации маршрутизатора.
+        Если передан пакет команд, команда ставится в него и выполняется при его flush.
+        """
         print(f"Добавление маршрута к {network} на маршрутизаторе {router_name}")
         
         router = self.get_node(router_name)
@@ -730,13 +1121,11 @@ class NetworkTopology:
             raise Exception(f"Router {router_name} not found")
         
         try:
-            route_cmd = f'ip route add {network}'
-            if next_hop:
-                route_cmd += f' via {next_hop}'
-            if interface:
-                route_cmd += f' dev {interface}'
+            table = self.get_routing_table(router_name)
+            table.add_static(network, next_hop, interface)
             
-            router.cmd(route_cmd)
+            self._node_route('add', router, network, next_hop, interface, batch)
+            self.notify_changed(lambda model: model.add_route(router_name, network, next_hop, interface), nodes=[router_name])
             
             print(f"Route to {network} added on router {router_name}")
             return True
@@ -0,0 +1,293 @@
+from collections import Counter
+from ipaddress import IPv4Network
+from .build_planner import BuildPlanner, independent_rounds
+from .forwarding_model import node_kind, parse_interface
+from .ovs_batch import OVSBatch
+
+
+def _link_key(node1, node2):
+    return (node1, node2) if node1 <= node2 else (node2, node1)
+
+
+def _route_key(network, next_hop=None, interface=None):
+    """Нормализованный ключ статического маршрута"""
+    network = str(IPv4Network(network, strict=False))
+    next_hop = next_hop.split('/')[0] if next_hop else None
+    return (network, next_hop, interface or None)
+
+
+class TopologyDiff:
+    """Изменения, которые нужно применить к работающей сети"""
+
+    def __init__(self):
+        self.remove_links = []
+        self.remove_nodes = []
+        self.add_hosts = {}
+        self.add_switches = []
+        self.add_routers = []
+        self.add_links = []
+        self.host_addresses = {}
+        self.router_changes = {}
+
+    def router(self, name):
+        """Изменения адресов и маршрутов маршрутизатора"""
+        return self.router_changes.setdefault(name, {
+            "remove_addresses": [],
+            "add_addresses": [],
+            "remove_routes": [],
+            "add_routes": []
+        })
+
+    def is_empty(self):
+        return not any((self.remove_links, self.remove_nodes, self.add_hosts, self.add_switches,
+                        self.add_routers, self.add_links, self.host_addresses, self.router_changes))
+
+    def touched_nodes(self, manager):
+        """Узлы, затронутые изменениями, - для точечной инвалидации кэшей"""
+        nodes = set(self.remove_nodes) | set(self.add_hosts) | set(self.add_switches) | set(self.add_routers)
+        nodes |= set(self.host_addresses) | set(self.router_changes)
+        for link in self.remove_links:
+            nodes.update((manager.node_name(link.intf1.node), manager.node_name(link.intf2.node)))
+        for key in self.add_links:
+            nodes.update(key)
+        return nodes
+
+    def summary(self):
+        return {
+            "removed_links": len(self.remove_links),
+            "removed_nodes": list(self.remove_nodes),
+            "added_hosts": list(self.add_hosts),
+            "added_switches": list(self.add_switches),
+            "added_routers": list(self.add_routers),
+            "added_links": len(self.add_links),
+            "readdressed_hosts": list(self.host_addresses),
+            "reconfigured_routers": list(self.router_changes)
+        }
+
+
+class TopologyReconciler:
+    """
+    Сравнивает желаемую конфигурацию топологии с работающей сетью
+    и применяет только разницу: узлы, связи, адреса и маршруты.
+    """
+
+    def __init__(self, topology_manager):
+        self.topology_manager = topology_manager
+
+    def _live_kinds(self):
+        manager = self.topology_manager
+        switches = {manager.node_name(switch) for switch in manager.net.switches}
+        kinds = {}
+        for name in manager.nodes:
+            if name in switches:
+                kinds[name] = 'switch'
+            elif name in manager.routing_tables or node_kind(name) == 'router':
+                kinds[name] = 'router'
+            else:
+                kinds[name] = 'host'
+        return kinds
+
+    def _router_addresses(self, name):
+        addresses = set()
+        for interface, ip in self.topology_manager.get_node_addresses(name):
+            address = parse_interface(ip)
+            if interface is not None and address is not None:
+                addresses.add(address)
+        return addresses
+
+    def _router_routes(self, name):
+        table = self.topology_manager.routing_tables.get(name)
+        if table is None:
+            return set()
+        return {_route_key(str(route.network), route.next_hop, route.interface)
+                for route in table.routes() if route.kind == 'static'}
+
+    def diff(self, config):
+        """Вычисление разницы между конфигурацией и работающей сетью"""
+        manager = self.topology_manager
+        diff = TopologyDiff()
+
+        desired = {}
+        host_ips = {}
+        for host in config.get('hosts', []):
+            if host['name'] not in desired:
+                desired[host['name']] = 'host'
+                host_ips[host['name']] = host.get('ip')
+        for switch in config.get('switches', []):
+            desired.setdefault(switch['name'], 'switch')
+        routers = {}
+        for router in config.get('routers', []):
+            if desired.setdefault(router['name'], 'router') == 'router':
+                routers[router['name']] = router
+
+        live = self._live_kinds()
+        for name, kind in live.items():
+            if desired.get(name) != kind:
+                diff.remove_nodes.append(name)
+        for name, kind in desired.items():
+            if live.get(name) == kind:
+                continue
+            if kind == 'host':
+                diff.add_hosts[name] = host_ips.get(name)
+            elif kind == 'switch':
+                diff.add_switches.append(name)
+            else:
+                diff.add_routers.append(name)
+
+        wanted_links = Counter()
+        for link in config.get('links', []):
+            if link['node1'] in desired and link['node2'] in desired:
+                wanted_links[_link_key(link['node1'], link['node2'])] += 1
+
+        removed = set(diff.remove_nodes)
+        live_links = {}
+        for link in manager.net.links:
+            node1, node2 = manager.node_name(link.intf1.node), manager.node_name(link.intf2.node)
+            if node1 in removed or node2 in removed:
+                continue
+            live_links.setdefault(_link_key(node1, node2), []).append(link)
+
+        for key, links in live_links.items():
+            excess = len(links) - wanted_links.get(key, 0)
+            if excess > 0:
+                diff.remove_links.extend(links[-excess:])
+        for key, count in wanted_links.items():
+            diff.add_links.extend([key] * (count - len(live_links.get(key, []))))
+
+        for name, ip in host_ips.items():
+            if name in diff.add_hosts or desired.get(name) != 'host' or not ip:
+                continue
+            current = [parse_interface(address) for _, address in manager.get_node_addresses(name)]
+            if parse_interface(ip) not in current:
+                diff.host_addresses[name] = ip
+
+        for name, router in routers.items():
+            wanted_addresses = {}
+            for intf in router.get('interfaces') or []:
+                if intf.get('name') and intf.get('ip'):
+                    ip = intf['ip'] if '/' in intf['ip'] else f"{intf['ip']}/{intf.get('subnet_mask', 24)}"
+                    address = parse_interface(ip)
+                    if address is not None:
+                        wanted_addresses[address] = (intf['name'], intf['ip'], intf.get('subnet_mask', 24))
+            wanted_routes = {}
+            for route in router.get('routes') or []:
+                if route.get('network'):
+                    try:
+                        wanted_routes[_route_key(route['network'], route.get('next_hop'), route.get('interface'))] = route
+                    except ValueError:
+                        print(f"Skipping invalid route {route} on router {name}")
+
+            new_router = name in diff.add_routers
+            current_addresses = set() if new_router else self._router_addresses(name)
+            current_routes = set() if new_router else self._router_routes(name)
+
+            changes = {
+                "remove_addresses": [str(address) for address in current_addresses - set(wanted_addresses)],
+                "add_addresses": [wanted_addresses[address] for address in wanted_addresses if address not in current_addresses],
+                "remove_routes": [key for key in current_routes if key not in wanted_routes],
+                "add_routes": [wanted_routes[key] for key in wanted_routes if key not in current_routes]
+            }
+            if any(changes.values()):
+                diff.router(name).update(changes)
+
+        return diff
+
+    def apply(self, diff):
+        """Применение разницы к работающей сети; возвращает отчёт о времени этапов"""
+        manager = self.topology_manager
+        planner = BuildPlanner()
+        touched = diff.touched_nodes(manager)
+
+        if diff.remove_links:
+            planner.stage("remove links").add("links", self._remove_links, diff.remove_links)
+        if diff.remove_nodes:
+            planner.stage("remove nodes").add("nodes", self._remove_nodes, diff.remove_nodes)
+
+        for name, ip in diff.add_hosts.items():
+            manager.reserve_ip(ip, owner=name)
+        for name, changes in diff.router_changes.items():
+            for _, ip, _ in changes["add_addresses"]:
+                manager.reserve_ip(ip, owner=name)
+        for name, ip in list(diff.add_hosts.items()):
+            if not ip:
+                diff.add_hosts[name] = manager.get_next_ip(owner=name)
+
+        # Объекты Mininet создаются по одному, как и при построении сети
+        hosts_stage = planner.stage("hosts", parallel=False)
+        for name, ip in diff.add_hosts.items():
+            hosts_stage.add(name, manager._build_host, name, ip)
+        switches_stage = planner.stage("switches", parallel=False)
+        for name in diff.add_switches:
+            switches_stage.add(name, manager._build_switch, name)
+        routers_stage = planner.stage("routers", parallel=False)
+        for name in diff.add_routers:
+            routers_stage.add(name, manager._build_router, name)
+
+        for index, links_round in enumerate(independent_rounds(diff.add_links)):
+            links_stage = planner.stage(f"links #{index + 1}")
+            for node1, node2 in links_round:
+                links_stage.add(f"{node1} <-> {node2}", manager._build_link, node1, node2)
+
+        addresses_stage = planner.stage("addresses", critical=False)
+        for name, ip in list(diff.add_hosts.items()) + list(diff.host_addresses.items()):
+            addresses_stage.add(name, self._set_host_address, name, ip)
+        for name, changes in diff.router_changes.items():
+            addresses_stage.add(name, self._configure_router, name, changes)
+
+        start_stage = planner.stage("start switches")
+        for name in diff.add_switches:
+            start_stage.add(name, manager._start_switch, name)
+
+        ovs_batch = OVSBatch()
+        for name in diff.add_switches:
+            ovs_batch.configure_switch(manager.bridge_name(name))
+        if diff.add_switches:
+            planner.stage("switch configuration", critical=False).add("ovs-vsctl", ovs_batch.commit_settings)
+        flows_stage = planner.stage("switch flows", critical=False)
+        for bridge in ovs_batch.flow_bridges():
+            flows_stage.add(bridge, ovs_batch.commit_flows, bridge)
+
+        try:
+            report = planner.run()
+        finally:
+            manager.notify_changed(nodes=touched)
+        report["mode"] = "incremental"
+        report["changes"] = diff.summary()
+        return report
+
+    def _remove_links(self, links):
+        for link in links:
+            self.topology_manager.remove_link(link)
+
+    def _remove_nodes(self, names):
+        for name in names:
+            self.topology_manager.remove_node(name)
+
+    def _set_host_address(self, name, ip):
+        host = self.topology_manager.get_node(name)
+        if host is not None and host.intfList():
+            self.topology_manager.set_host_ip(name, ip)
+        else:
+            self.topology_manager.index_ip(name, ip)
+
+    def _configure_router(self, name, changes):
+        manager = self.topology_manager
+        with manager.command_batch() as batch:
+            for ip in changes["remove_addresses"]:
+                manager.remove_router_address(name, ip, batch=batch)
+            for network, next_hop, interface in changes["remove_routes"]:
+                manager.remove_route(name, network, next_hop, interface, batch=batch)
+            for interface_name, ip, subnet_mask in changes["add_addresses"]:
+                try:
+                    manager.configure_router_interface(name, interface_name, ip, subnet_mask, batch=batch)
+                except Exception as e:
+                    print(f"Error configuring router interface: {str(e)}")
+            for route in changes["add_routes"]:
+                try:
+                    manager.add_route(name, route['network'], route.get('next_hop'), route.get('interface'),
+                                      batch=batch)
+                except Exception as e:
+                    print(f"Error adding route to router: {str(e)}")
+            router = manager.get_node(name)
+            if router is not None:
+                manager.set_node_sysctl(router, 'net.ipv4.ip_forward', 1, batch)
@@ -1,545 +1,726 @@
-from ipaddress import IPv4Network, IPv4Address, IPv4Interface
+from ipaddress import IPv4Network, IPv4Interface
+from collections import deque, namedtuple
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple, Set, Optional
 import logging
+import os
+import threading
+from .address_index import AddressSpaceIndex
+from .forwarding_model import parse_interface
+from .ip_allocator import IPAllocator, AddressPoolExhausted
+from .readiness import stp_enabled_bridges
 
 logger = logging.getLogger(__name__)
 
+# Сколько петель коммутаторов каждого вида (блокируемых STP и нет) выводится отдельными сообщениями
+MAX_REPORTED_LOOPS = int(os.environ.get('MAX_REPORTED_LOOPS', '50'))
+
+# Сведения об узле, от которых зависят проверки. Группа "links" - связи узла
+# (интерфейс, сосед, тип соседа, интерфейс соседа) и включён ли STP на коммутаторе,
+# группа "addresses" - адреса из Mininet и БД.
+NodeFacts = namedtuple('NodeFacts', ('kind', 'links', 'ip', 'addresses', 'stp', 'db_ip', 'db_interfaces'))
+
+FACT_GROUPS = {
+    "links": ('kind', 'links', 'stp'),
+    "addresses": ('kind', 'ip', 'addresses', 'db_ip', 'db_interfaces'),
+}
+
+
+def _split_ip(ip, default_mask=24):
+    """Разбирает 'a.b.c.d[/mask]' в (адрес, маска)"""
+    ip = str(ip)
+    if '/' in ip:
+        address, mask = ip.split('/', 1)
+        return address, mask
+    return ip, default_mask
+
+
+@lru_cache(maxsize=65536)
+def _network(ip, mask):
+    """Подсеть адреса ip/mask; разобранные адреса переиспользуются между проверками"""
+    return IPv4Network(f"{ip}/{mask}", strict=False)
+
+
+@lru_cache(maxsize=65536)
+def _interface(ip):
+    return IPv4Interface(ip)
+
+
+def _config_addresses(hosts, routers):
+    """Адреса узлов из конфигурации: {имя: (адрес, интерфейсы маршрутизатора)}"""
+    facts = {}
+    for db_host in hosts:
+        facts.setdefault(db_host['name'], (db_host.get('ip') or None, ()))
+    for db_router in routers:
+        interfaces = tuple(
+            (intf['name'], intf['ip'], intf.get('subnet_mask', 24))
+            for intf in db_router.get('interfaces') or []
+            if 'name' in intf and intf.get('ip')
+        )
+        facts.setdefault(db_router['name'], (db_router.get('ip') or None, interfaces))
+    return facts
+
+
+def _host_address(facts):
+    """Адрес хоста (ip, маска): с интерфейса Mininet, иначе из БД"""
+    if facts.ip and facts.ip[0] and facts.ip[0] != '0.0.0.0':
+        return facts.ip
+    if facts.db_ip:
+        return _split_ip(facts.db_ip)
+    return None
+
+
 class TopologyValidator:
     """
     Проверяет сетевые топологии на корректность в соответствии с принципами сетей.
     Использует объекты топологии mininet и scapy для проверки.
+
+    Проверка инкрементальная: сведения об узлах (связи и адреса, в том числе
+    прочитанные командами на маршрутизаторах) и результаты проверок кэшируются
+    по версии топологии. После изменения сети сведения перечитываются только
+    для изменённых узлов, а повторно выполняются лишь проверки, чьи входы
+    (связи или адреса) действительно изменились.
     """
 
+    # Проверки в порядке вывода: имя, группы сведений, от которых она зависит,
+    # и область - узлы одного типа (проверяется каждый узел отдельно) или вся топология
+    CHECKS = (
+        ("host_addresses", ("addresses",), "host"),
+        ("router_addresses", ("addresses",), "router"),
+        ("address_conflicts", ("addresses",), None),
+        ("connectivity", ("links",), "host"),
+        ("loops", ("links",), None),
+        ("subnets", ("addresses", "links"), None),
+        ("subnet_overlaps", ("addresses",), None),
+        ("router_subnets", ("addresses",), "router"),
+    )
+
     def __init__(self, topology_manager):
         """
         Инициализирует валидатор со ссылкой на менеджер топологии.
-        
+
         Аргументы:
             topology_manager: Менеджер топологии, содержащий сеть для проверки
         """
         self.topology_manager = topology_manager
-        
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._version = None
+        self._facts = {}
+        self._node_results = {name: {} for name, _, scope in self.CHECKS if scope}
+        self._topology_results = {}
+        self._result = None
+        self.last_run = {}
+
     def validate_topology(self) -> Dict[str, Any]:
         """
         Проверяет текущую топологию на корректность.
-        
+
         Возвращает:
             Словарь, содержащий результаты проверки с ошибками и предупреждениями
         """
         if not self.topology_manager.is_running():
+            with self._lock:
+                self._reset()
             return {
                 "valid": False,
                 "errors": ["Сеть не запущена. Пожалуйста, сначала активируйте топологию."],
                 "warnings": []
             }
-            
+
         try:
-            result = {
-                "valid": True,
-                "errors": [],
-                "warnings": []
-            }
-            
-            self._validate_ip_addressing(result)
-            self._validate_connectivity(result)
-            self._validate_loops(result)
-            self._validate_subnets(result)
-            self._validate_routers(result)
-            
-            result["valid"] = len(result["errors"]) == 0
-            
-            return result
+            with self._lock:
+                version = self.topology_manager.version
+                if self._result is None or version != self._version:
+                    self._refresh(version)
+                return {
+                    "valid": self._result["valid"],
+                    "errors": list(self._result["errors"]),
+                    "warnings": list(self._result["warnings"])
+                }
         except Exception as e:
             logger.exception("Error during topology validation")
+            with self._lock:
+                self._reset()
             return {
                 "valid": False,
                 "errors": [f"Ошибка проверки: {str(e)}"],
                 "warnings": []
             }
-    
-    def _validate_ip_addressing(self, result: Dict[str, Any]):
+
+    def validate_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Проверяет IP-адресацию в сети:
-        - Хосты должны иметь действительные IP-адреса
-        - Не должно быть дублирующихся IP-адресов
-        - IP-адреса должны иметь правильный формат
-        
+        Статическая проверка конфигурации топологии до активации: те же проверки,
+        что и для работающей сети, но по сведениям из конфигурации - без объектов
+        Mininet и команд на узлах. Кэш проверок работающей сети не затрагивается.
+
         Аргументы:
-            result: Словарь результатов проверки для обновления
+            config: Конфигурация с разделами hosts, switches, routers и links
+
+        Возвращает:
+            Словарь с результатами проверки в формате validate_topology
         """
-        if not self.topology_manager.net:
-            result["errors"].append("Сеть не инициализирована")
-            return
-            
-        all_hosts = self.topology_manager.net.hosts
-        routers = [node for node in all_hosts if node.name.startswith('r')]
-        
-        hosts = [node for node in all_hosts if not node.name.startswith('r')]
-        
-        print(f"Processing {len(hosts)} hosts and {len(routers)} routers")
-        ip_addresses = {}
-        
-        active_topology = None
-        if hasattr(self.topology_manager, 'active_topology'):
-            active_topology = self.topology_manager.active_topology
-        
-        for host in hosts:
-            host_ip = None
-            for intf in host.intfList():
-                print(f"Host {host.name} interface: {intf.name}, ip: {intf.ip}")
-                if intf.name != 'lo' and intf.ip:
-                    host_ip = intf.ip
-                    break
-            
-            if (not host_ip or host_ip == '0.0.0.0') and active_topology:
-                for db_host in active_topology.hosts:
-                    if db_host['name'] == host.name and 'ip' in db_host and db_host['ip']:
-                        host_ip = db_host['ip'].split('/')[0] if '/' in db_host['ip'] else db_host['ip']
-                        print(f"Found IP {host_ip} for host {host.name} in database")
-                        break
-            
-            if not host_ip or host_ip == '0.0.0.0':
-                print(f"Host {host.name} has no valid IP: {host_ip}, interfaces: {[intf.name for intf in host.intfList()]}")
-                result["errors"].append(f"Хост {host.name} не имеет действительного IP-адреса")
-                continue
-                
-            try:
-                IPv4Address(host_ip)
-                
-                if host_ip in ip_addresses:
-                    result["errors"].append(
-                        f"Дублирующийся IP-адрес {host_ip} на хостах {host.name} и {ip_addresses[host_ip]}"
-                    )
-                else:
-                    ip_addresses[host_ip] = host.name
-            except ValueError:
-                result["errors"].append(f"Неверный формат IP-адреса {host_ip} на хосте {host.name}")
-        
-        for router in routers:
-            router_has_valid_ip = False
-            
-            for intf in router.intfList():
-                print(f"Router {router.name} interface: {intf.name}, ip: {intf.ip}")
-                if intf.name == 'lo' or not intf.link:
+        errors, facts = self._config_facts(config)
+        warnings = []
+        # Подсеть без маршрутизатора до активации - лишь предупреждение:
+        # лабораториям из одной подсети маршрутизатор не нужен. Пересекающиеся
+        # подсети интерфейсов маршрутизаторов, напротив, отклоняют конфигурацию
+        options = {
+            "subnets": {"gateway_required": False},
+            "subnet_overlaps": {"router_overlaps_are_errors": True},
+            "router_subnets": {"overlaps_are_errors": True},
+        }
+        for check, _, scope in self.CHECKS:
+            validate = getattr(self, f"_validate_{check}")
+            if scope is None:
+                partial = [validate(facts, **options.get(check, {}))]
+            else:
+                partial = [validate(name, node, **options.get(check, {}))
+                           for name, node in facts.items() if node.kind == scope]
+            for check_errors, check_warnings in partial:
+                errors.extend(check_errors)
+                warnings.extend(check_warnings)
+        return {"valid": len(errors) == 0, "errors": errors, "warnings": warnings}
+
+    def _config_facts(self, config) -> Tuple[List[str], Dict[str, NodeFacts]]:
+        """
+        Сведения об узлах из конфигурации и ошибки её структуры. Интерфейсы
+        именуются как при построении сети ({узел}-eth{n} в порядке связей,
+        у коммутаторов с 1), хостам без адреса выделяются адреса из пула
+        экземпляра, STP на коммутаторах включён, как его настраивает эмулятор.
+        """
+        errors = []
+        kinds = {}
+        sections = {}
+        for section, kind in (('hosts', 'host'), ('switches', 'switch'), ('routers', 'router')):
+            sections[section] = []
+            for node in config.get(section) or []:
+                name = node.get('name') if isinstance(node, dict) else None
+                if not name:
+                    errors.append(f"Узел в разделе {section} не имеет имени")
+                    continue
+                if name in kinds:
+                    errors.append(f"Имя узла {name} используется несколько раз")
                     continue
-                
+                # Маршрутизаторы в списке хостов распознаются по имени, как в работающей сети
+                kinds[name] = 'router' if kind == 'host' and name.startswith('r') else kind
+                sections[section].append(node)
+
+        links = {name: [] for name in kinds}
+        next_port = {name: 1 if kind == 'switch' else 0 for name, kind in kinds.items()}
+        for link in config.get('links') or []:
+            node1, node2 = link.get('node1'), link.get('node2')
+            missing = [node for node in (node1, node2) if node not in kinds]
+            if missing:
+                errors.append(f"Связь {node1} - {node2} ссылается на несуществующий узел {', '.join(str(node) for node in missing)}")
+                continue
+            if node1 == node2:
+                continue
+            intf1 = f"{node1}-eth{next_port[node1]}"
+            intf2 = f"{node2}-eth{next_port[node2]}"
+            next_port[node1] += 1
+            next_port[node2] += 1
+            links[node1].append((intf1, node2, kinds[node2], intf2))
+            links[node2].append((intf2, node1, kinds[node1], intf1))
+
+        # Пул нужен только для хостов без адреса - тогда в нём резервируются все явные адреса
+        allocator = None
+        if any(not db_host.get('ip') for db_host in sections['hosts']):
+            allocator = IPAllocator()
+            allocator.add_pool(getattr(self.topology_manager, 'ip_base', None) or '10.0.0.0/24')
+            for section in ('hosts', 'switches', 'routers'):
+                for node in sections[section]:
+                    for ip in [node.get('ip')] + [intf.get('ip') for intf in node.get('interfaces') or []]:
+                        if parse_interface(ip) is not None:
+                            allocator.reserve(ip, owner=node['name'])
+
+        hosts = []
+        for db_host in sections['hosts']:
+            if allocator is not None and not db_host.get('ip'):
                 try:
-                    router.cmd(f'ip link set {intf.name} up')
-                    
-                    ip_result = router.cmd(f"ip -o -4 addr show dev {intf.name} | awk '{{print $4}}'").strip()
-                    print(f"IP command result for {router.name} interface {intf.name}: '{ip_result}'")
-                    
-                    if ip_result and ip_result != '':
-                        if '/' in ip_result:
-                            router_ip = ip_result.split('/')[0]
-                        else:
-                            router_ip = ip_result
-                            
-                        if router_ip and router_ip != '0.0.0.0':
-                            router_has_valid_ip = True
-                            print(f"Found valid IP {router_ip} on {router.name} interface {intf.name}")
-                            
-                            try:
-                                IPv4Address(router_ip)
-                                
-                                if router_ip in ip_addresses:
-                                    result["errors"].append(
-                                        f"Дублирующийся IP-адрес {router_ip} на маршрутизаторе {router.name} и {ip_addresses[router_ip]}"
-                                    )
-                                else:
-                                    ip_addresses[router_ip] = f"{router.name}:{intf.name}"
-                            except ValueError:
-                                result["errors"].append(f"Неверный формат IP-адреса {router_ip} на интерфейсе {intf.name} маршрутизатора {router.name}")
-                except Exception as e:
-                    print(f"Error checking IP for {router.name} interface {intf.name}: {str(e)}")
-            
-            if not router_has_valid_ip and active_topology and hasattr(active_topology, 'routers'):
-                for db_router in active_topology.routers:
-                    if db_router['name'] == router.name:
-                        if 'ip' in db_router and db_router['ip']:
-                            router_ip = db_router['ip'].split('/')[0] if '/' in db_router['ip'] else db_router['ip']
-                            router_has_valid_ip = True
-                            print(f"Found IP {router_ip} for router {router.name} in database")
-                        
-                        if 'interfaces' in db_router and db_router['interfaces']:
-                            for intf in db_router['interfaces']:
-                                if 'ip' in intf and intf['ip']:
-                                    router_ip = intf['ip'].split('/')[0] if '/' in intf['ip'] else intf['ip']
-                                    router_has_valid_ip = True
-                                    print(f"Found interface IP {router_ip} for router {router.name} in database")
-                        break
-            
-            if not router_has_valid_ip:
-                print(f"Router {router.name} has no valid IPs, interfaces: {[intf.name for intf in router.intfList()]}")
-                result["errors"].append(f"Роутер {router.name} не имеет ни одного действительного IP-адреса")
-    
-    def _validate_connectivity(self, result: Dict[str, Any]):
+                    db_host = {**db_host, 'ip': str(allocator.allocate(owner=db_host['name']))}
+                except AddressPoolExhausted as e:
+                    errors.append(f"Хосту {db_host['name']} не может быть выделен IP-адрес: {str(e)}")
+            hosts.append(db_host)
+        db = _config_addresses(hosts, sections['routers'])
+
+        facts = {}
+        for name, kind in kinds.items():
+            db_ip, db_interfaces = db.get(name, (None, ()))
+            stp = True if kind == 'switch' else None
+            facts[name] = NodeFacts(kind, tuple(links[name]), None, (), stp, db_ip, db_interfaces)
+        return errors, facts
+
+    def _refresh(self, version):
+        """Обновление сведений об изменённых узлах и повторный запуск затронутых проверок"""
+        manager = self.topology_manager
+        changed = manager.changes_since(self._version) if self._result is not None else None
+
+        nodes = self._live_nodes()
+        stale = set(nodes) if changed is None else (changed & set(nodes)) | (set(nodes) - set(self._facts))
+        live = self._live_facts(nodes, stale)
+        db = self._db_facts()
+
+        facts = {}
+        dirty = {group: set() for group in FACT_GROUPS}
+        for name, (node, kind) in nodes.items():
+            links, ip, addresses, stp = live[name] if name in live else self._facts[name][1:5]
+            db_ip, db_interfaces = db.get(name, (None, ()))
+            facts[name] = NodeFacts(kind, links, ip, addresses, stp, db_ip, db_interfaces)
+            previous = self._facts.get(name)
+            for group, fields in FACT_GROUPS.items():
+                if previous is None or any(getattr(previous, f) != getattr(facts[name], f) for f in fields):
+                    dirty[group].add(name)
+        for name in set(self._facts) - set(facts):
+            for group in FACT_GROUPS:
+                dirty[group].add(name)
+        self._facts = facts
+
+        rerun = {}
+        for check, depends, scope in self.CHECKS:
+            touched = set().union(*(dirty[group] for group in depends))
+            if scope is None:
+                if touched or check not in self._topology_results:
+                    self._topology_results[check] = getattr(self, f"_validate_{check}")(facts)
+                    rerun[check] = "topology"
+                continue
+            results = self._node_results[check]
+            rerun[check] = 0
+            for name in touched:
+                results.pop(name, None)
+                if name in facts and facts[name].kind == scope:
+                    results[name] = getattr(self, f"_validate_{check}")(name, facts[name])
+                    rerun[check] += 1
+
+        errors = []
+        warnings = []
+        for check, _, scope in self.CHECKS:
+            if scope is None:
+                partial = [self._topology_results[check]]
+            else:
+                results = self._node_results[check]
+                partial = [results[name] for name in facts if name in results]
+            for check_errors, check_warnings in partial:
+                errors.extend(check_errors)
+                warnings.extend(check_warnings)
+
+        self._version = version
+        self._result = {"valid": len(errors) == 0, "errors": errors, "warnings": warnings}
+        self.last_run = {"version": version, "refreshed_nodes": len(stale), "rerun": rerun}
+
+    def _live_nodes(self) -> Dict[str, Tuple[Any, str]]:
+        """Узлы работающей сети: {имя в топологии: (узел Mininet, тип)}"""
+        manager = self.topology_manager
+        nodes = {}
+        for node in manager.net.hosts:
+            nodes[manager.node_name(node)] = (node, 'router' if node.name.startswith('r') else 'host')
+        for node in manager.net.switches:
+            nodes[manager.node_name(node)] = (node, 'switch')
+        return nodes
+
+    def _live_facts(self, nodes, names) -> Dict[str, Tuple]:
         """
-        Проверяет правильность подключений в сети:
-        - Каждый хост должен быть подключен хотя бы к одному коммутатору или маршрутизатору
-        - Не должно быть прямых подключений хост-к-хосту
-        - Коммутаторы не должны напрямую соединяться с другими подсетями (должны проходить через маршрутизаторы)
-        
-        Аргументы:
-            result: Словарь результатов проверки для обновления
+        Связи и адреса узлов names из Mininet:
+        {имя: (связи, адрес хоста, адреса маршрутизатора, STP коммутатора)}
         """
-        if not self.topology_manager.net:
-            return
-            
-        all_nodes = self.topology_manager.net.hosts
-        routers = [node for node in all_nodes if node.name.startswith('r')]
-        hosts = [node for node in all_nodes if not node.name.startswith('r')]
-        switches = self.topology_manager.net.switches
-        
-        for host in hosts:
-            connected_to_switch_or_router = False
-            direct_host_connections = []
-            
-            for intf in host.intfList():
-                if intf.name == 'lo' or not intf.link:
+        kinds = {id(node): (name, kind) for name, (node, kind) in nodes.items()}
+        routers = [nodes[name][0] for name in names if nodes[name][1] == 'router']
+        router_addresses = self._router_addresses(routers)
+        # Состояние STP читается из OVS одной командой; если OVS недоступен,
+        # STP считается включённым, как его настраивает эмулятор
+        stp_bridges = stp_enabled_bridges() if any(nodes[name][1] == 'switch' for name in names) else None
+
+        facts = {}
+        for name in names:
+            node, kind = nodes[name]
+            links = []
+            ip = None
+            for intf in node.intfList():
+                if intf.name == 'lo':
+                    continue
+                if ip is None and kind == 'host' and intf.ip:
+                    ip = (intf.ip, getattr(intf, 'prefixLen', None) or 24)
+                if not intf.link:
                     continue
-                    
                 other_intf = intf.link.intf1 if intf.link.intf2 == intf else intf.link.intf2
-                other_node = other_intf.node
-                
-                if other_node in switches or other_node in routers:
-                    connected_to_switch_or_router = True
-                elif other_node in hosts:
-                    direct_host_connections.append(other_node.name)
-            
-            if not connected_to_switch_or_router:
-                result["errors"].append(f"Хост {host.name} не подключен ни к одному коммутатору или маршрутизатору")
-                
-            if direct_host_connections:
-                result["errors"].append(
-                    f"Хост {host.name} напрямую подключен к другим хостам: {', '.join(direct_host_connections)}"
+                peer_name, peer_kind = kinds.get(id(other_intf.node), (other_intf.node.name, None))
+                links.append((intf.name, peer_name, peer_kind, other_intf.name))
+            addresses = ()
+            if kind == 'router':
+                addresses = tuple(
+                    (intf_name, router_addresses[node.name].get(intf_name, ''))
+                    for intf_name, _, _, _ in links
                 )
-    
-    def _validate_loops(self, result: Dict[str, Any]):
+            stp = None
+            if kind == 'switch':
+                stp = node.name in stp_bridges if stp_bridges is not None else True
+            facts[name] = (tuple(links), ip, addresses, stp)
+        return facts
+
+    def _db_facts(self) -> Dict[str, Tuple]:
+        """Адреса узлов из конфигурации в БД: {имя: (адрес, интерфейсы маршрутизатора)}"""
+        active_topology = getattr(self.topology_manager, 'active_topology', None)
+        if not active_topology:
+            return {}
+        return _config_addresses(active_topology.hosts or [], getattr(active_topology, 'routers', None) or [])
+
+    def _router_addresses(self, routers) -> Dict[str, Dict[str, str]]:
         """
-        Проверяет отсутствие петель в топологии коммутаторов
-        (если STP не реализован, что в настоящее время не поддерживается)
-        
-        Аргументы:
-            result: Словарь результатов проверки для обновления
+        Включает подключённые интерфейсы маршрутизаторов и возвращает их
+        IPv4-адреса в виде {маршрутизатор: {интерфейс: "ip/маска"}}
+        """
+        with self.topology_manager.command_batch() as batch:
+            for router in routers:
+                for intf in router.intfList():
+                    if intf.name != 'lo' and intf.link:
+                        self.topology_manager.set_link_up(router, intf.name, batch)
+
+        addresses = {}
+        for router in routers:
+            addresses[router.name] = {}
+            try:
+                for addr in self.topology_manager.get_interface_addresses(router.name):
+                    addresses[router.name].setdefault(addr["interface"], f"{addr['address']}/{addr['prefixlen']}")
+            except Exception as e:
+                print(f"Error reading addresses of router {router.name}: {str(e)}")
+        return addresses
+
+    def _validate_host_addresses(self, name: str, facts: NodeFacts) -> Tuple[List[str], List[str]]:
+        """
+        Хост должен иметь действительный IP-адрес правильного формата
+        (с интерфейса Mininet или из БД)
         """
-        if not self.topology_manager.net:
-            return
-            
-        switches = self.topology_manager.net.switches
-        
-        switch_connections = {switch.name: set() for switch in switches}
-        
-        for switch in switches:
-            for intf in switch.intfList():
-                if intf.name == 'lo' or not intf.link:
+        address = _host_address(facts)
+        if not address or not address[0] or address[0] == '0.0.0.0':
+            return [f"Хост {name} не имеет действительного IP-адреса"], []
+        try:
+            _interface(address[0])
+        except ValueError:
+            return [f"Неверный формат IP-адреса {address[0]} на хосте {name}"], []
+        return [], []
+
+    def _validate_router_addresses(self, name: str, facts: NodeFacts) -> Tuple[List[str], List[str]]:
+        """Маршрутизатор должен иметь хотя бы один IP-адрес в сети или в БД"""
+        for _, ip_result in facts.addresses:
+            if ip_result and _split_ip(ip_result)[0] != '0.0.0.0':
+                return [], []
+        if facts.db_ip or facts.db_interfaces:
+            return [], []
+        return [f"Роутер {name} не имеет ни одного действительного IP-адреса"], []
+
+    def _validate_address_conflicts(self, facts: Dict[str, NodeFacts]) -> Tuple[List[str], List[str]]:
+        """
+        Не должно быть дублирующихся IP-адресов, адреса маршрутизаторов
+        должны иметь правильный формат. Дубликаты ищутся по индексу адресов
+        и выводятся все сразу - каждый повтор в паре с первым владельцем адреса.
+        """
+        errors = []
+        index = AddressSpaceIndex()
+
+        for name, node in facts.items():
+            if node.kind != 'host':
+                continue
+            address = _host_address(node)
+            if not address or not address[0] or address[0] == '0.0.0.0':
+                continue
+            try:
+                index.add(_interface(address[0]), ('host', name, name))
+            except ValueError:
+                continue
+
+        for name, node in facts.items():
+            if node.kind != 'router':
+                continue
+            live = set()
+            for intf_name, ip_result in node.addresses:
+                router_ip = _split_ip(ip_result)[0] if ip_result else None
+                if not router_ip or router_ip == '0.0.0.0':
                     continue
-                
-                other_intf = intf.link.intf1 if intf.link.intf2 == intf else intf.link.intf2
-                other_node = other_intf.node
-                
-                if other_node in switches:
-                    switch_connections[switch.name].add(other_node.name)
-        
-        visited = set()
-        path = set()
-        
-        def has_cycle(node, parent=None):
-            """Поиск в глубину для обнаружения циклов"""
-            visited.add(node)
-            path.add(node)
-            
-            for neighbor in switch_connections[node]:
-                if neighbor == parent:
+                live.add(intf_name)
+                try:
+                    index.add(_interface(router_ip), ('router', name, f"{name}:{intf_name}"))
+                except ValueError:
+                    errors.append(f"Неверный формат IP-адреса {router_ip} на интерфейсе {intf_name} маршрутизатора {name}")
+            # Интерфейсы, ещё не настроенные в сети, учитываются по адресам из БД
+            for intf_name, ip_str, _ in node.db_interfaces:
+                if intf_name in live:
                     continue
-                
-                if neighbor in path:
-                    return True
-                
-                if neighbor not in visited:
-                    if has_cycle(neighbor, node):
-                        return True
-            
-            path.remove(node)
-            return False
-        
-        cycles_found = False
-        for switch_name in switch_connections:
-            if switch_name not in visited:
-                if has_cycle(switch_name):
-                    cycles_found = True
-                    break
-        
-        if cycles_found:
-            result["errors"].append(
-                "Топология содержит петли коммутаторов, которые могут вызвать широковещательные штормы. Добавьте STP для управления петлями или удалите их."
-            )
+                try:
+                    index.add(_interface(_split_ip(ip_str)[0]), ('router', name, f"{name}:{intf_name}"))
+                except ValueError:
+                    continue
+
+        for address, owners in index.duplicates():
+            first = owners[0][2]
+            for kind, name, _ in owners[1:]:
+                if kind == 'host':
+                    errors.append(f"Дублирующийся IP-адрес {address} на хостах {name} и {first}")
+                else:
+                    errors.append(f"Дублирующийся IP-адрес {address} на маршрутизаторе {name} и {first}")
+        return errors, []
+
+    def _validate_connectivity(self, name: str, facts: NodeFacts) -> Tuple[List[str], List[str]]:
+        """
+        Проверяет правильность подключений хоста:
+        - Хост должен быть подключен хотя бы к одному коммутатору или маршрутизатору
+        - Не должно быть прямых подключений хост-к-хосту
+        """
+        errors = []
+        connected_to_switch_or_router = any(kind in ('switch', 'router') for _, _, kind, _ in facts.links)
+        direct_host_connections = [peer for _, peer, kind, _ in facts.links if kind == 'host']
+
+        if not connected_to_switch_or_router:
+            errors.append(f"Хост {name} не подключен ни к одному коммутатору или маршрутизатору")
+        if direct_host_connections:
+            errors.append(f"Хост {name} напрямую подключен к другим хостам: {', '.join(direct_host_connections)}")
+        return errors, []
+
+    def _validate_loops(self, facts: Dict[str, NodeFacts]) -> Tuple[List[str], List[str]]:
+        """
+        Проверяет петли в топологии коммутаторов. Компоненты с петлями находятся
+        системой непересекающихся множеств за один проход по связям. В них
+        строится остовное дерево обходом в ширину от коммутатора с наименьшим
+        именем (корневой мост STP при равных приоритетах); каждая связь вне
+        дерева избыточна и замыкает одну петлю базиса циклов. Петля блокируется
+        STP, если он включён на всех её коммутаторах, иначе это ошибка.
+        """
+        # Связи между коммутаторами без повторов: ((коммутатор, интерфейс), (коммутатор, интерфейс))
+        links = {}
+        for name, node in facts.items():
+            if node.kind != 'switch':
+                continue
+            for intf, peer, kind, peer_intf in node.links:
+                if kind == 'switch':
+                    ends = sorted(((name, intf), (peer, peer_intf)))
+                    links.setdefault(tuple(ends), None)
+
+        parent = {}
+        size = {}
+
+        def find(node):
+            parent.setdefault(node, node)
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        looped = set()
+        for (a, _), (b, _) in links:
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b:
+                looped.add(root_a)
+                continue
+            if size.get(root_a, 1) > size.get(root_b, 1):
+                root_a, root_b = root_b, root_a
+            parent[root_a] = root_b
+            size[root_b] = size.get(root_a, 1) + size.get(root_b, 1)
+        if not looped:
+            return [], []
+        looped = {find(root) for root in looped}
+
+        adjacency = {}
+        for key in links:
+            (a, _), (b, _) = key
+            if find(a) in looped:
+                adjacency.setdefault(a, []).append((b, key))
+                adjacency.setdefault(b, []).append((a, key))
+
+        roots = {}
+        for name in adjacency:
+            component = find(name)
+            if component not in roots or name < roots[component]:
+                roots[component] = name
+
+        tree_parent = {}
+        depth = {}
+        tree = set()
+        for root in sorted(roots.values()):
+            tree_parent[root] = None
+            depth[root] = 0
+            queue = deque([root])
+            while queue:
+                node = queue.popleft()
+                for peer, key in adjacency[node]:
+                    if peer not in depth:
+                        depth[peer] = depth[node] + 1
+                        tree_parent[peer] = node
+                        tree.add(key)
+                        queue.append(peer)
+
+        def cycle(a, b):
+            """Петля, замыкаемая связью a - b: путь по дереву через общего предка"""
+            left, right = [a], [b]
+            while left[-1] != right[-1]:
+                if depth[left[-1]] >= depth[right[-1]]:
+                    left.append(tree_parent[left[-1]])
+                else:
+                    right.append(tree_parent[right[-1]])
+            return left + right[-2::-1] + [a]
+
+        errors = []
+        warnings = []
+        unblocked = blocked = 0
+        for key in links:
+            (a, a_intf), (b, b_intf) = key
+            if key in tree or find(a) not in looped:
+                continue
+            path = cycle(a, b)
+            disabled = sorted({switch for switch in path if facts[switch].stp is False})
+            if disabled:
+                unblocked += 1
+                if unblocked <= MAX_REPORTED_LOOPS:
+                    errors.append(
+                        f"Петля коммутаторов {' -> '.join(path)}: избыточная связь {a}:{a_intf} - {b}:{b_intf} "
+                        f"не будет заблокирована, STP отключён на {', '.join(disabled)}. "
+                        f"Возможен широковещательный шторм: включите STP или удалите связь."
+                    )
+            else:
+                blocked += 1
+                if blocked <= MAX_REPORTED_LOOPS:
+                    warnings.append(
+                        f"Петля коммутаторов {' -> '.join(path)}: избыточная связь {a}:{a_intf} - {b}:{b_intf} "
+                        f"будет заблокирована STP"
+                    )
+
+        if unblocked > MAX_REPORTED_LOOPS:
+            errors.append(f"И ещё {unblocked - MAX_REPORTED_LOOPS} петель коммутаторов без STP (всего {unblocked})")
+        if blocked > MAX_REPORTED_LOOPS:
+            warnings.append(f"И ещё {blocked - MAX_REPORTED_LOOPS} петель коммутаторов, блокируемых STP (всего {blocked})")
+        return errors, warnings
+
+    def _router_interfaces(self, name: str, facts: NodeFacts, errors: Optional[List[str]] = None) -> List[Tuple[str, str, IPv4Network]]:
+        """Адреса маршрутизатора (интерфейс, ip, подсеть): из сети, а для прочих интерфейсов - из БД"""
+        interfaces = []
+        names = set()
+        for intf_name, ip_result in facts.addresses:
+            if not ip_result:
+                continue
+            router_ip, mask = _split_ip(ip_result)
+            if not router_ip or router_ip == '0.0.0.0':
+                continue
+            try:
+                interfaces.append((intf_name, router_ip, _network(router_ip, mask)))
+                names.add(intf_name)
+            except ValueError:
+                if errors is not None:
+                    errors.append(f"Неверная подсеть для интерфейса {intf_name} маршрутизатора {name}: {router_ip}/{mask}")
+
+        for intf_name, ip_str, subnet_mask in facts.db_interfaces:
+            if intf_name in names:
+                continue
+            router_ip, mask = _split_ip(ip_str, subnet_mask)
+            try:
+                interfaces.append((intf_name, router_ip, _network(router_ip, mask)))
+                names.add(intf_name)
+            except ValueError:
+                if errors is not None:
+                    errors.append(f"Неверная подсеть для интерфейса {intf_name} маршрутизатора {name} из БД: {router_ip}/{mask}")
+        return interfaces
 
-    def _validate_subnets(self, result: Dict[str, Any]):
+    def _validate_subnets(self, facts: Dict[str, NodeFacts], gateway_required: bool = True) -> Tuple[List[str], List[str]]:
         """
         Проверяет конфигурацию подсетей:
         - Хосты, подключенные к одному коммутатору, должны быть в одной подсети
-        - Проверяет, что подсети не перекрываются некорректно
         - Каждая подсеть должна быть доступна через маршрутизатор
-        
-        Аргументы:
-            result: Словарь результатов проверки для обновления
+          (если gateway_required ложно, подсеть без него - предупреждение)
         """
-        if not self.topology_manager.net:
-            return
-            
-        switch_subnets = {}
-        
-        all_nodes = self.topology_manager.net.hosts
-        routers = [node for node in all_nodes if node.name.startswith('r')]
-        hosts = [node for node in all_nodes if not node.name.startswith('r')]
-        switches = self.topology_manager.net.switches
-        
-        active_topology = None
-        if hasattr(self.topology_manager, 'active_topology'):
-            active_topology = self.topology_manager.active_topology
-        
+        errors = []
+        warnings = []
+
         host_subnets = {}
-        for host in hosts:
-            host_ip = None
-            host_mask = None
-            
-            for intf in host.intfList():
-                if intf.name != 'lo' and intf.ip:
-                    host_ip = intf.ip
-                    host_mask = intf.prefixLen if hasattr(intf, 'prefixLen') else 24
-                    break
-            
-            if (not host_ip or host_ip == '0.0.0.0') and active_topology:
-                for db_host in active_topology.hosts:
-                    if db_host['name'] == host.name and 'ip' in db_host and db_host['ip']:
-                        db_ip = db_host['ip']
-                        if '/' in db_ip:
-                            host_ip, mask_str = db_ip.split('/')
-                            host_mask = int(mask_str)
-                        else:
-                            host_ip = db_ip
-                            host_mask = 24
-                        print(f"Found IP {host_ip}{host_mask} for host {host.name} in database")
-                        break
-            
-            if not host_ip or host_ip == '0.0.0.0':
+        for name, node in facts.items():
+            if node.kind != 'host':
+                continue
+            address = _host_address(node)
+            if not address or not address[0] or address[0] == '0.0.0.0':
                 continue
-                
             try:
-                subnet = IPv4Network(f"{host_ip}{host_mask}", strict=False)
-                host_subnets[host.name] = subnet
+                host_subnets[name] = _network(address[0], address[1])
             except ValueError:
-                result["errors"].append(f"Неверная подсеть для хоста {host.name}: {host_ip}{host_mask}")
-        
-        router_subnets = {}
-        all_router_interfaces = set()
-        for router in routers:
-            router_subnets[router.name] = []
-            
-            for intf in router.intfList():
-                if intf.name == 'lo' or not intf.link:
-                    continue
-                    
-                try:
-                    router.cmd(f'ip link set {intf.name} up')
-                    
-                    ip_result = router.cmd(f"ip -o -4 addr show dev {intf.name} | awk '{{print $4}}'").strip()
-                    if not ip_result or ip_result == '':
-                        continue
-                        
-                    if '/' in ip_result:
-                        router_ip, mask_str = ip_result.split('/')
-                        mask = int(mask_str)
-                    else:
-                        router_ip = ip_result
-                        mask = 24
-                        
-                    if router_ip and router_ip != '0.0.0.0':
-                        try:
-                            subnet = IPv4Network(f"{router_ip}/{mask}", strict=False)
-                            router_subnets[router.name].append((subnet, intf.name))
-                            all_router_interfaces.add((router.name, router_ip, str(subnet), intf.name))
-                            print(f"Found subnet {subnet} on {router.name} interface {intf.name}")
-                        except ValueError:
-                            result["errors"].append(f"Неверная подсеть для интерфейса {intf.name} маршрутизатора {router.name}: {router_ip}/{mask}")
-                except Exception as e:
-                    print(f"Error checking subnet for {router.name} interface {intf.name}: {str(e)}")
-            
-            if active_topology and hasattr(active_topology, 'routers'):
-                for db_router in active_topology.routers:
-                    if db_router['name'] == router.name and 'interfaces' in db_router and db_router['interfaces']:
-                        for intf in db_router['interfaces']:
-                            if 'name' in intf and 'ip' in intf and intf['ip']:
-                                intf_name = intf['name']
-                                ip_str = intf['ip']
-                                
-                                if '/' in ip_str:
-                                    router_ip, mask_str = ip_str.split('/')
-                                    mask = int(mask_str)
-                                else:
-                                    router_ip = ip_str
-                                    mask = intf.get('subnet_mask', 24)
-                                
-                                try:
-                                    subnet = IPv4Network(f"{router_ip}/{mask}", strict=False)
-                                    intf_exists = False
-                                    for existing_router, existing_ip, existing_subnet, existing_name in all_router_interfaces:
-                                        if existing_router == router.name and existing_name == intf_name:
-                                            intf_exists = True
-                                            break
-                                    
-                                    if not intf_exists:
-                                        router_subnets[router.name].append((subnet, intf_name))
-                                        all_router_interfaces.add((router.name, router_ip, str(subnet), intf_name))
-                                        print(f"Found subnet {subnet} on {router.name} interface {intf_name} in database")
-                                except ValueError:
-                                    result["errors"].append(f"Неверная подсеть для интерфейса {intf_name} маршрутизатора {router.name} из БД: {router_ip}/{mask}")
-        
-        for host in hosts:
-            if host.name not in host_subnets:
-                continue
-                
-            host_subnet = host_subnets[host.name]
-            
-            for intf in host.intfList():
-                if intf.name == 'lo' or not intf.link:
-                    continue
-                
-                other_intf = intf.link.intf1 if intf.link.intf2 == intf else intf.link.intf2
-                other_node = other_intf.node
-                
-                if other_node in switches:
-                    switch_name = other_node.name
-                    if switch_name not in switch_subnets:
-                        switch_subnets[switch_name] = set()
-                    
-                    switch_subnets[switch_name].add(host_subnet)
-        
+                errors.append(f"Неверная подсеть для хоста {name}: {address[0]}/{address[1]}")
+
+        gateways = AddressSpaceIndex()
+        for name, node in facts.items():
+            if node.kind == 'router':
+                for intf_name, _, subnet in self._router_interfaces(name, node, errors):
+                    gateways.add(subnet, f"{name}:{intf_name}")
+
+        switch_subnets = {}
+        for name, subnet in host_subnets.items():
+            for _, peer, kind, _ in facts[name].links:
+                if kind == 'switch':
+                    switch_subnets.setdefault(peer, {})[subnet] = True
+
         for switch_name, subnets in switch_subnets.items():
             if len(subnets) > 1:
-                result["warnings"].append(
-                    f"Коммутатор {switch_name} имеет хосты в разных подсетях: {[str(s) for s in subnets]}"
-                )
-        
-        all_subnets = set()
+                warnings.append(f"Коммутатор {switch_name} имеет хосты в разных подсетях: {[str(s) for s in subnets]}")
+
+        all_subnets = {}
         for subnets in switch_subnets.values():
             all_subnets.update(subnets)
-            
+
         for subnet in all_subnets:
-            subnet_has_router = False
-            subnet_str = str(subnet)
-            connected_interfaces = []
-            
-            for router_name, router_ip, router_subnet_str, intf_name in all_router_interfaces:
-                router_subnet = IPv4Network(router_subnet_str)
-                if subnet == router_subnet or subnet.overlaps(router_subnet):
-                    subnet_has_router = True
-                    connected_interfaces.append(f"{router_name}:{intf_name}({router_ip})")
-            
-            if not subnet_has_router:
-                result["errors"].append(
+            if not gateways.overlaps(subnet):
+                (errors if gateway_required else warnings).append(
                     f"Подсеть {subnet} не подключена ни к одному маршрутизатору и не будет доступна из других подсетей"
                 )
-            else:
-                print(f"Subnet {subnet} connected via router interfaces: {', '.join(connected_interfaces)}")
-    
-    def _validate_routers(self, result: Dict[str, Any]):
+        return errors, warnings
+
+    def _validate_subnet_overlaps(self, facts: Dict[str, NodeFacts], router_overlaps_are_errors: bool = False) -> Tuple[List[str], List[str]]:
         """
-        Проверяет конфигурацию маршрутизаторов:
-        - Маршрутизаторы должны иметь как минимум 2 интерфейса с IP в разных подсетях
-        - У маршрутизаторов должна быть включена переадресация
-        - Проверка маршрутов по умолчанию
-        
-        Аргументы:
-            result: Словарь результатов проверки для обновления
+        Подсети интерфейсов (хостов и маршрутизаторов) не должны быть вложены
+        друг в друга с разной маской: такие адреса не видят друг друга напрямую.
+        Все пары вложенных подсетей находятся одним проходом по индексу.
+        Если router_overlaps_are_errors, вложение подсетей интерфейсов
+        маршрутизаторов (одного или разных) - ошибка, несовпадение масок хостов
+        остаётся предупреждением.
         """
-        if not self.topology_manager.net:
-            return
-            
-        all_nodes = self.topology_manager.net.hosts
-        routers = [node for node in all_nodes if node.name.startswith('r')]
-        
-        active_topology = None
-        if hasattr(self.topology_manager, 'active_topology'):
-            active_topology = self.topology_manager.active_topology
-        
-        print(f"Validating {len(routers)} routers")
-        
-        for router in routers:
-            ips_by_subnet = {}
-            
-            for intf in router.intfList():
-                if intf.name == 'lo' or not intf.link:
-                    continue
-                
-                try:
-                    router.cmd(f'ip link set {intf.name} up')
-                    
-                    ip_result = router.cmd(f"ip -o -4 addr show dev {intf.name} | awk '{{print $4}}'").strip()
-                    print(f"Router {router.name} interface {intf.name} IP result: '{ip_result}'")
-                    
-                    if not ip_result or ip_result == '':
+        index = AddressSpaceIndex()
+        router_owners = set()
+        for name, node in facts.items():
+            if node.kind == 'host':
+                address = _host_address(node)
+                if address and address[0] and address[0] != '0.0.0.0':
+                    try:
+                        index.add(_network(address[0], address[1]), name)
+                    except ValueError:
                         continue
-                        
-                    if '/' in ip_result:
-                        router_ip, mask_str = ip_result.split('/')
-                        mask = int(mask_str)
-                    else:
-                        router_ip = ip_result
-                        mask = 24
-                        
-                    if router_ip and router_ip != '0.0.0.0':
-                        try:
-                            subnet = IPv4Network(f"{router_ip}{mask}", strict=False)
-                            subnet_str = str(subnet)
-                            
-                            if subnet_str not in ips_by_subnet:
-                                ips_by_subnet[subnet_str] = []
-                            
-                            ips_by_subnet[subnet_str].append((router_ip, intf.name))
-                            print(f"Found subnet {subnet} with IP {router_ip} on {router.name} interface {intf.name}")
-                        except ValueError:
-                            continue
-                except Exception as e:
-                    print(f"Error checking subnet for {router.name} interface {intf.name}: {str(e)}")
-            
-            if active_topology and hasattr(active_topology, 'routers'):
-                for db_router in active_topology.routers:
-                    if db_router['name'] == router.name and 'interfaces' in db_router and db_router['interfaces']:
-                        for intf in db_router['interfaces']:
-                            if 'name' in intf and 'ip' in intf and intf['ip']:
-                                intf_name = intf['name']
-                                ip_str = intf['ip']
-                                
-                                if '/' in ip_str:
-                                    router_ip, mask_str = ip_str.split('/')
-                                    mask = int(mask_str)
-                                else:
-                                    router_ip = ip_str
-                                    mask = intf.get('subnet_mask', 24)
-                                
-                                try:
-                                    subnet = IPv4Network(f"{router_ip}{mask}", strict=False)
-                                    subnet_str = str(subnet)
-                                    
-                                    if subnet_str not in ips_by_subnet:
-                                        ips_by_subnet[subnet_str] = []
-                                    
-                                    interface_exists = False
-                                    for existing_ip, existing_name in ips_by_subnet[subnet_str]:
-                                        if existing_name == intf_name:
-                                            interface_exists = True
-                                            break
-                                    
-                                    if not interface_exists:
-                                        ips_by_subnet[subnet_str].append((router_ip, intf_name))
-                                        print(f"Found subnet {subnet} with IP {router_ip} on {router.name} interface {intf_name} from database")
-                                except ValueError:
-                                    continue
-            
-            for subnet, ips in ips_by_subnet.items():
-                if len(ips) > 1:
-                    result["warnings"].append(
-                        f"Роутер {router.name} имеет несколько одинаковых IP-адресов в одной подсети {subnet}: {[ip[0] for ip in ips]}"
-                    ) 
\ No newline at end of file
+            elif node.kind == 'router':
+                for intf_name, _, subnet in self._router_interfaces(name, node):
+                    index.add(subnet, f"{name}:{intf_name}")
+                    router_owners.add(f"{name}:{intf_name}")
+
+        errors = []
+        warnings = []
+        for outer, inner in index.containments():
+            outer_owners, inner_owners = index.owners(outer), index.owners(inner)
+            outer_routers = [owner for owner in outer_owners if owner in router_owners]
+            inner_routers = [owner for owner in inner_owners if owner in router_owners]
+            if router_overlaps_are_errors and outer_routers and inner_routers:
+                errors.append(
+                    f"Интерфейсы маршрутизаторов в пересекающихся подсетях: {outer} ({', '.join(outer_routers)}) "
+                    f"и {inner} ({', '.join(inner_routers)})"
+                )
+                continue
+            warnings.append(
+                f"Подсеть {outer} ({', '.join(outer_owners)}) пересекается с вложенной подсетью "
+                f"{inner} ({', '.join(inner_owners)}): маски интерфейсов не совпадают"
+            )
+        return errors, warnings
+
+    def _validate_router_subnets(self, name: str, facts: NodeFacts, overlaps_are_errors: bool = False) -> Tuple[List[str], List[str]]:
+        """
+        Маршрутизатор не должен иметь несколько адресов в одной подсети
+        (если overlaps_are_errors - это ошибка, иначе предупреждение)
+        """
+        ips_by_subnet = {}
+        for _, router_ip, subnet in self._router_interfaces(name, facts):
+            ips_by_subnet.setdefault(str(subnet), []).append(router_ip)
+
+        messages = []
+        for subnet, ips in ips_by_subnet.items():
+            if len(ips) > 1:
+                messages.append(f"Роутер {name} имеет несколько одинаковых IP-адресов в одной подсети {subnet}: {ips}")
+        return (messages, []) if overlaps_are_errors else ([], messages)
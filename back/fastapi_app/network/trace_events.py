@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+
+class TraceEventHub:
+    """
+    Уведомления подписчиков об изменении трассировок. Трассировки пишутся
+    из потоков пула, а подписчики - обработчики потоковых запросов в цикле
+    событий, поэтому оповещение передаётся в цикл через call_soon_threadsafe.
+    Сами прыжки подписчик читает из трассировки по своему курсору.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, trace_id):
+        """Подписка из корутины; возвращает asyncio.Event, взводимый при изменениях"""
+        event = asyncio.Event()
+        subscriber = (asyncio.get_running_loop(), event)
+        with self._lock:
+            self._subscribers.setdefault(trace_id, set()).add(subscriber)
+        return event
+
+    def unsubscribe(self, trace_id, event):
+        with self._lock:
+            subscribers = self._subscribers.get(trace_id)
+            if not subscribers:
+                return
+            subscribers.difference_update([s for s in subscribers if s[1] is event])
+            if not subscribers:
+                del self._subscribers[trace_id]
+
+    def publish(self, trace_id):
+        with self._lock:
+            subscribers = list(self._subscribers.get(trace_id, ()))
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл событий уже закрыт - подписчик отключился
+                pass
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+TRACE_WORKERS = int(os.environ.get('TRACE_WORKERS', '4'))
+TRACE_QUEUE_SIZE = int(os.environ.get('TRACE_QUEUE_SIZE', '64'))
+# Сколько секунд хранится статус завершённого задания
+TRACE_JOB_RETENTION = float(os.environ.get('TRACE_JOB_RETENTION', '600'))
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+
+class TraceQueueFull(Exception):
+    """Очередь заданий трассировки заполнена"""
+
+
+class TraceJob:
+    """Задание трассировки: состояние, владелец и времена постановки, запуска и завершения"""
+
+    def __init__(self, job_id, owner=None, on_cancel=None):
+        self.id = job_id
+        self.owner = owner
+        self.state = "queued"
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._on_cancel = on_cancel
+
+    @property
+    def finished_state(self):
+        return self.state in FINISHED_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+
+class TraceJobScheduler:
+    """
+    Планировщик заданий трассировки. Задания выполняются долгоживущим пулом
+    из TRACE_WORKERS потоков; ожидать запуска могут не более TRACE_QUEUE_SIZE
+    заданий, при переполнении постановка отклоняется (TraceQueueFull).
+    Задание в очереди отменяется без запуска, выполняющееся - через on_cancel.
+    """
+
+    def __init__(self, workers=TRACE_WORKERS, queue_size=TRACE_QUEUE_SIZE, retention=TRACE_JOB_RETENTION):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='trace-job')
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, func, *args, owner=None, on_cancel=None):
+        """Постановка задания в очередь; возвращается сразу, не дожидаясь выполнения"""
+        with self._lock:
+            self._prune()
+            if self._active >= self.workers + self.queue_size:
+                raise TraceQueueFull(f"Trace queue is full ({self.queue_size} jobs waiting), try again later")
+            job = TraceJob(job_id, owner, on_cancel)
+            self._jobs[job_id] = job
+            self._active += 1
+        job.future = self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        with self._lock:
+            if job.state != "queued":
+                # Отменено, когда поток пула уже забрал задание
+                self._active -= 1
+                return
+            job.state = "running"
+            job.started = time.time()
+        try:
+            func(*args)
+            state, error = "completed", None
+        except Exception as e:
+            state, error = "failed", str(e)
+        finally:
+            with self._lock:
+                self._active -= 1
+        with self._lock:
+            if job.state == "running":
+                job.state = state
+                job.error = error
+            job.finished = job.finished or time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Отмена задания; False, если задания нет или оно уже завершено"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished_state:
+                return False
+            was_running = job.state == "running"
+            job.state = "cancelled"
+            job.finished = time.time()
+            if not was_running and job.future is not None and job.future.cancel():
+                self._active -= 1
+        if was_running and job._on_cancel:
+            job._on_cancel()
+        return True
+
+    def _prune(self):
+        deadline = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_state and job.finished and job.finished < deadline]:
+            del self._jobs[job_id]
+
+    def get_stats(self):
+        with self._lock:
+            states = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "active": self._active,
+                "jobs": states
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
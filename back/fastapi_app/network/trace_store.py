@@ -0,0 +1,180 @@
+from collections import OrderedDict, namedtuple
+import os
+import threading
+import time
+from .trace_events import TraceEventHub
+
+TRACE_STORE_SIZE = int(os.environ.get('TRACE_STORE_SIZE', '500'))
+# Сколько секунд хранится завершённая трассировка после последнего изменения
+TRACE_TTL = float(os.environ.get('TRACE_TTL', '1800'))
+
+
+class Hop(namedtuple('Hop', ('node', 'time', 'action', 'details'))):
+    """Компактная запись прыжка; в ответах API превращается в словарь"""
+    __slots__ = ()
+
+    def to_dict(self):
+        return self._asdict()
+
+
+class TraceStore:
+    """
+    Ограниченное хранилище трассировок. Записи упорядочены по последнему
+    изменению; завершённые трассировки удаляются через TRACE_TTL секунд,
+    а при превышении TRACE_STORE_SIZE вытесняются самые давние - сначала
+    завершённые, выполняющиеся только если других не осталось.
+    Интерфейс повторяет словарь, которым хранилище было раньше.
+    """
+
+    def __init__(self, max_size=TRACE_STORE_SIZE, ttl=TRACE_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._traces = OrderedDict()
+        self._updated = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, trace_id):
+        with self._lock:
+            return trace_id in self._traces
+
+    def __len__(self):
+        with self._lock:
+            return len(self._traces)
+
+    def __getitem__(self, trace_id):
+        with self._lock:
+            return self._traces[trace_id]
+
+    def __setitem__(self, trace_id, trace):
+        with self._lock:
+            self._traces[trace_id] = trace
+            self._mark(trace_id)
+            self._evict()
+
+    def get(self, trace_id, default=None):
+        with self._lock:
+            return self._traces.get(trace_id, default)
+
+    def values(self):
+        with self._lock:
+            return list(self._traces.values())
+
+    def pop(self, trace_id, default=None):
+        with self._lock:
+            self._updated.pop(trace_id, None)
+            return self._traces.pop(trace_id, default)
+
+    def touch(self, trace_id):
+        """Отметка об изменении трассировки (продлевает срок хранения)"""
+        with self._lock:
+            if trace_id in self._traces:
+                self._mark(trace_id)
+
+    def _mark(self, trace_id):
+        self._traces.move_to_end(trace_id)
+        self._updated[trace_id] = time.monotonic()
+
+    def _drop(self, trace_id):
+        del self._traces[trace_id]
+        self._updated.pop(trace_id, None)
+
+    def _evict(self):
+        deadline = time.monotonic() - self.ttl
+        completed = [trace_id for trace_id, trace in self._traces.items()
+                     if trace.get("state") == "completed"]
+        for trace_id in completed:
+            if self._updated[trace_id] < deadline:
+                self._drop(trace_id)
+        overflow = len(self._traces) - self.max_size
+        for trace_id in completed:
+            if overflow <= 0:
+                return
+            if trace_id in self._traces:
+                self._drop(trace_id)
+                overflow -= 1
+        while overflow > 0:
+            self._drop(next(iter(self._traces)))
+            overflow -= 1
+
+
+class TraceRecorder:
+    """
+    Учёт трассировок: создание, запись прыжков, завершение и чтение.
+    Общая основа трассировщиков живой сети и симулятора; подписчики
+    оповещаются о каждом изменении через events.
+    """
+
+    def __init__(self):
+        self.traces = TraceStore()
+        self.events = TraceEventHub()
+
+    def _create_trace(self, trace_id, source, destination, source_ip, dest_ip, details, at=None):
+        self.traces[trace_id] = {
+            "source": source,
+            "destination": destination,
+            "source_ip": source_ip,
+            "destination_ip": dest_ip,
+            "current_node": source,
+            "hops": [Hop(source, at if at is not None else time.time(), "start", details)],
+            "state": "in_progress",
+            "error": None
+        }
+        self.events.publish(trace_id)
+
+    def add_hop(self, trace_id, node, action, details="", at=None):
+        """Записывает прыжок в пути пакета; at - время прыжка, если оно известно заранее"""
+        trace = self.traces.get(trace_id)
+        # Остановленная трассировка может ещё выполняться в пуле - её прыжки не записываются
+        if trace is not None and trace["state"] != "completed":
+            self._append_hop(trace_id, trace, node, action, details, at)
+            self.events.publish(trace_id)
+
+    def _append_hop(self, trace_id, trace, node, action, details, at=None):
+        trace["hops"].append(Hop(node, at if at is not None else time.time(), action, details))
+        trace["current_node"] = node
+        self.traces.touch(trace_id)
+            
+    def complete_trace(self, trace_id, success=True, error=None):
+        """Отмечает трассировку как завершенную"""
+        trace = self.traces.get(trace_id)
+        if trace is not None and trace["state"] != "completed":
+            trace["state"] = "completed"
+            
+            reached_destination = trace["current_node"] == trace["destination"]
+            trace["success"] = success and reached_destination and not error
+            
+            if error:
+                trace["error"] = error
+            
+            self._append_hop(
+                trace_id,
+                trace,
+                trace["current_node"],
+                "end",
+                "Success" if trace["success"] else f"Failed: {error or 'Did not reach destination'}"
+            )
+            self.events.publish(trace_id)
+            
+    def hops_since(self, trace_id, cursor=0):
+        """Прыжки трассировки начиная с позиции cursor и признак её завершения"""
+        trace = self.traces.get(trace_id)
+        if trace is None:
+            return None, False
+        hops = list(trace["hops"])
+        # Состояние меняется до записи прыжка "end", поэтому завершённой считается трассировка с ним
+        completed = trace["state"] == "completed" and bool(hops) and hops[-1].action == "end"
+        return [hop.to_dict() for hop in hops[cursor:]], completed
+
+    def get_trace_info(self, trace_id):
+        """Получает информацию о трассировке (копия с прыжками в виде словарей)"""
+        trace = self.traces.get(trace_id)
+        if trace is None:
+            return None
+        return {**trace, "hops": [hop.to_dict() for hop in list(trace["hops"])]}
+
+    def stop_trace(self, trace_id):
+        """Остановка трассировки"""
+        if trace_id in self.traces:
+            self.complete_trace(trace_id, success=False, error="Trace stopped by user")
+            return True
+        return False
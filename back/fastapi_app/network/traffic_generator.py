@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address
+import os
+import random
+
+MAX_TRAFFIC_DURATION = float(os.environ.get('MAX_TRAFFIC_DURATION', '60'))
+TRAFFIC_PROTOCOLS = ('udp', 'tcp', 'icmp')
+
+
+class TrafficGenerator:
+    """
+    Нагрузочный трафик между узлами сети. Потоки группируются по узлу-источнику
+    и запускаются агентами Scapy источников параллельно; кадры собираются
+    агентом один раз и отправляются через raw-сокет пачками с заданной
+    скоростью. Потери оцениваются по приросту счётчиков приёма получателей.
+    """
+
+    def __init__(self, topology_manager):
+        self.topology_manager = topology_manager
+
+    def _resolve_destination(self, flow):
+        manager = self.topology_manager
+        if flow.get('destination_node'):
+            node = manager.get_node(flow['destination_node'])
+            if node is None:
+                raise Exception(f"Destination node {flow['destination_node']} not found")
+            addresses = manager.get_node_addresses(flow['destination_node'])
+            ip = addresses[0][1].split('/')[0] if addresses else (node.IP() if hasattr(node, 'IP') else None)
+            if not ip:
+                raise Exception(f"Destination node {flow['destination_node']} has no IP address")
+            return ip, node
+        if not flow.get('destination_ip'):
+            raise Exception("Flow needs destination_node or destination_ip")
+        try:
+            ip = str(IPv4Address(str(flow['destination_ip'])))
+        except ValueError:
+            raise Exception(f"Invalid destination IP {flow['destination_ip']}")
+        return ip, manager.get_node_by_ip(ip)
+
+    def _packet(self, flow, ip):
+        """Поля пакета потока; агент собирает пакет из классов Scapy"""
+        protocol = (flow.get('protocol') or 'udp').lower()
+        if protocol not in TRAFFIC_PROTOCOLS:
+            raise Exception(f"Unsupported traffic protocol {protocol}")
+        if protocol == 'icmp':
+            return {"proto": protocol, "dst": ip}
+        sport = int(flow.get('source_port') or random.randint(1024, 65535))
+        dport = int(flow.get('destination_port') or 5001)
+        return {"proto": protocol, "dst": ip, "sport": sport, "dport": dport}
+
+    def _rx_packets(self, nodes):
+        counters = {}
+        for name, node in nodes.items():
+            try:
+                interfaces = self.topology_manager.scapy_agents.get(node).interface_counters()
+                counters[name] = sum(stats["rx_packets"] for intf, stats in interfaces.items() if intf != 'lo')
+            except Exception as e:
+                print(f"Error reading counters of {name}: {str(e)}")
+        return counters
+
+    def run(self, flows, duration):
+        """
+        Запуск потоков на duration секунд. Поток - словарь с source_node,
+        destination_node или destination_ip, protocol, destination_port,
+        pps или bitrate (бит/с) и packet_sizes ([[размер, вес], ...]).
+        """
+        if not flows:
+            raise Exception("No traffic flows specified")
+        if duration <= 0 or duration > MAX_TRAFFIC_DURATION:
+            raise Exception(f"Duration must be within (0, {MAX_TRAFFIC_DURATION}] seconds")
+
+        manager = self.topology_manager
+        by_source = {}
+        destinations = {}
+        flow_info = {}
+        for index, flow in enumerate(flows):
+            source = manager.get_node(flow.get('source_node'))
+            if source is None:
+                raise Exception(f"Source node {flow.get('source_node')} not found")
+            if not flow.get('pps') and not flow.get('bitrate'):
+                raise Exception(f"Flow {index} needs pps or bitrate")
+            ip, dest_node = self._resolve_destination(flow)
+            dest_name = manager.node_name(dest_node) if dest_node is not None else None
+            if dest_node is not None:
+                destinations[dest_name] = dest_node
+            flow_info[index] = {"source": flow['source_node'], "destination": dest_name, "destination_ip": ip}
+            by_source.setdefault(flow['source_node'], (source, []))[1].append({
+                "id": index,
+                **self._packet(flow, ip),
+                "pps": flow.get('pps'),
+                "bitrate": flow.get('bitrate'),
+                "sizes": flow.get('packet_sizes') or [[512, 1]]
+            })
+
+        rx_before = self._rx_packets(destinations)
+        with ThreadPoolExecutor(max_workers=len(by_source)) as executor:
+            futures = {
+                name: executor.submit(manager.scapy_agents.get(node).generate, source_flows, duration)
+                for name, (node, source_flows) in by_source.items()
+            }
+            results = {name: future.result() for name, future in futures.items()}
+        rx_after = self._rx_packets(destinations)
+
+        report_flows = []
+        interfaces = {}
+        sent_to = {}
+        for name, result in results.items():
+            for flow in result["flows"]:
+                info = flow_info[flow["id"]]
+                report_flows.append({**info, **flow})
+                if info["destination"]:
+                    sent_to[info["destination"]] = sent_to.get(info["destination"], 0) + flow["sent_packets"]
+            for iface, stats in result["interfaces"].items():
+                interfaces[f"{name}:{iface}"] = stats
+        report_flows.sort(key=lambda flow: flow["id"])
+
+        receivers = {}
+        for name, sent in sent_to.items():
+            if name not in rx_before or name not in rx_after:
+                continue
+            # Счётчики учитывают и посторонний трафик узла (ARP, STP), поэтому потери - оценка
+            received = rx_after[name] - rx_before[name]
+            receivers[name] = {
+                "sent_packets": sent,
+                "received_packets": received,
+                "lost_packets": max(0, sent - received),
+                "loss_percent": round(max(0, sent - received) * 100.0 / sent, 2) if sent else 0.0
+            }
+
+        total_sent = sum(flow["sent_packets"] for flow in report_flows)
+        total_bytes = sum(flow["sent_bytes"] for flow in report_flows)
+        elapsed = max((result["duration"] for result in results.values()), default=duration)
+        return {
+            "duration": elapsed,
+            "sent_packets": total_sent,
+            "sent_bytes": total_bytes,
+            "achieved_pps": round(total_sent / elapsed, 1) if elapsed else 0.0,
+            "achieved_bps": round(total_bytes * 8 / elapsed, 1) if elapsed else 0.0,
+            "tx_dropped": sum(stats["tx_dropped"] for stats in interfaces.values()),
+            "flows": report_flows,
+            "interfaces": interfaces,
+            "receivers": receivers
+        }
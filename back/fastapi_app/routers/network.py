@@ -1,21 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional
-from ..network.topology import NetworkTopology as TopologyManager
 from ..network.packet_manager import PacketManager
+from ..network.emulator_manager import EmulatorManager, EmulatorInstance, InstanceLimitReached
+from ..network.trace_jobs import TraceJobScheduler, TraceQueueFull
+from ..network.reachability import reachability_matrix
+from ..network.simulator import get_simulated_tracer
 from django.db import transaction
 from django_app.models import NetworkTopology as DjangoNetworkTopology
 from django_app.models import NetworkNode, PacketTrace
 from django.contrib.auth.models import User
 import asyncio
-from ..network.packet_tracer import PacketTracer
-from ..network.topology_validator import TopologyValidator
+from ..network.readiness import READY_TIMEOUT
 from asgiref.sync import sync_to_async
-import subprocess
 import time
 from ..dependencies import get_current_active_user
 import os
-import re
+import json
 import random
 from concurrent.futures import ThreadPoolExecutor
 
@@ -76,6 +78,45 @@ class PingRequest(BaseModel):
     destination_ip: str
     count: Optional[int] = 1
 
+class RttRequest(BaseModel):
+    source_node: str
+    destination_ip: str
+    count: Optional[int] = 10
+    interval: Optional[float] = Field(0.2, description="Interval between probes in seconds")
+
+class PingBatchRequest(BaseModel):
+    source_node: str
+    destinations: Optional[List[str]] = Field(None, description="Destination IPs or node names")
+    cidr: Optional[str] = Field(None, description="Network to sweep, e.g. 10.0.0.0/24")
+    count: Optional[int] = 1
+    timeout: Optional[float] = Field(1, description="Reply timeout in seconds")
+
+class ThroughputRequest(BaseModel):
+    source_node: str
+    destination_node: str
+    protocol: Optional[str] = Field("tcp", description="tcp or udp")
+    duration: float = Field(5, description="Duration in seconds")
+    bitrate: Optional[float] = Field(None, description="UDP sending rate in bits per second")
+    port: Optional[int] = 5201
+
+class TrafficFlowConfig(BaseModel):
+    source_node: str
+    destination_node: Optional[str] = None
+    destination_ip: Optional[str] = None
+    protocol: Optional[str] = Field("udp", description="udp, tcp or icmp")
+    destination_port: Optional[int] = 5001
+    pps: Optional[float] = Field(None, description="Target rate in packets per second")
+    bitrate: Optional[float] = Field(None, description="Target rate in bits per second")
+    packet_sizes: Optional[List[List[float]]] = Field(
+        None,
+        description="Frame size distribution as [size, weight] pairs",
+        example=[[64, 0.5], [1500, 0.5]]
+    )
+
+class TrafficRequest(BaseModel):
+    flows: List[TrafficFlowConfig]
+    duration: float = Field(5, description="Duration in seconds")
+
 class TcpRequest(BaseModel):
     source_node: str
     destination_ip: str
@@ -161,10 +202,16 @@ router = APIRouter(
     tags=["network"],
 )
 
-topology_manager = TopologyManager()
+# Интервал комментариев-keepalive в потоке трассировки, секунды
+TRACE_STREAM_KEEPALIVE = float(os.environ.get('TRACE_STREAM_KEEPALIVE', '15'))
+
+emulator_manager = EmulatorManager()
 packet_manager = PacketManager()
-packet_tracer = PacketTracer(topology_manager)
-topology_validator = TopologyValidator(topology_manager)
+trace_scheduler = TraceJobScheduler()
+
+async def get_user_emulator(current_user: User = Depends(get_current_active_user)) -> EmulatorInstance:
+    """Изолированный экземпляр эмулятора текущего пользователя"""
+    return emulator_manager.get(current_user.id)
 
 @sync_to_async
 def get_all_topologies_for_user(user: User):
@@ -254,7 +301,7 @@ def create_topology_with_nodes(config: TopologyConfig, user: User):
         return topology
 
 @router.post("/topology/create")
-async def create_topology(config: TopologyConfig, current_user: User = Depends(get_current_active_user)):
+async def create_topology(config: TopologyConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Создание новой сетевой топологии и сохранение её в базе данных"""
     try:
         if not hasattr(config, 'routers'):
@@ -262,15 +309,27 @@ async def create_topology(config: TopologyConfig, current_user: User = Depends(g
         elif config.routers is None:
             config.routers = []
         
+        validation = await ensure_valid_config(emulator, {
+            'hosts': config.hosts,
+            'switches': config.switches,
+            'links': config.links,
+            'routers': config.routers,
+        })
+        
         # Explicitly deactivate all topologies to avoid multiple active ones
         await deactivate_all_topologies_for_user(current_user)
             
         topology = await create_topology_with_nodes(config, current_user)
-        await async_create_network(topology)
+        await async_create_network(emulator, topology)
         return {
             "message": "Topology created successfully",
-            "topology_id": topology.id
+            "topology_id": topology.id,
+            "warnings": validation["warnings"]
         }
+    except HTTPException:
+        raise
+    except InstanceLimitReached as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -294,69 +353,8 @@ async def get_topology(topology_id: int, current_user: User = Depends(get_curren
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def kill_controller():
-    """Завершение работы контроллера"""
-    try:
-        subprocess.run(['pkill', 'ovs-testcontroller'], stderr=subprocess.PIPE)
-        subprocess.run(['pkill', 'ovs-controller'], stderr=subprocess.PIPE)
-        subprocess.run(['pkill', '-f', ':6653'], stderr=subprocess.PIPE)
-        time.sleep(2)
-    except Exception as e:
-        print(f"Error killing controller: {e}")
-
-def cleanup_mininet():
-    """Очистка любого существующего состояния Mininet"""
-    try:
-        print("Начало комплексной очистки Mininet...")
-        
-        try:
-            subprocess.run(['pkill', '-f', 'mininet'], stderr=subprocess.PIPE)
-        except Exception as e:
-            print(f"Error killing mininet processes: {e}")
-            
-        try:
-            subprocess.run(['mn', '-c'], stderr=subprocess.PIPE)
-        except Exception as e:
-            print(f"Error running mn -c: {e}")
-            
-        try:
-            result = subprocess.run(['ovs-vsctl', 'list-br'], stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-            if result.returncode == 0 and result.stdout:
-                bridges = result.stdout.strip().split('\n')
-                for bridge in bridges:
-                    if bridge:
-                        print(f"Removing bridge: {bridge}")
-                        subprocess.run(['ovs-vsctl', '--if-exists', 'del-br', bridge], stderr=subprocess.PIPE)
-        except Exception as e:
-            print(f"Error removing OVS bridges: {e}")
-        
-        try:
-            subprocess.run(['pkill', '-f', 'ovs'], stderr=subprocess.PIPE)
-        except Exception as e:
-            print(f"Error killing OVS processes: {e}")
-            
-        try:
-            subprocess.run(['pkill', '-f', 'controller'], stderr=subprocess.PIPE)
-        except Exception as e:
-            print(f"Error killing controller processes: {e}")
-        
-        try:
-            os.system("ip link | grep veth | cut -d':' -f2 | cut -d'@' -f1 | xargs -I{} ip link delete {} 2>/dev/null || true")
-        except Exception as e:
-            print(f"Error cleaning leftover veth interfaces: {e}")
-            
-        print("Mininet cleanup completed")
-        time.sleep(1)
-    except Exception as e:
-        print(f"Error during cleanup_mininet: {e}")
-
-async def async_cleanup_mininet():
-    """Асинхронная обёртка для cleanup_mininet"""
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, cleanup_mininet)
-
-async def async_create_network(topology):
-    """Асинхронное создание сети"""
+def topology_to_config(topology):
+    """Конфигурация сети из модели топологии в БД"""
     config = {
         'hosts': topology.hosts,
         'switches': topology.switches,
@@ -367,13 +365,48 @@ async def async_create_network(topology):
         config['routers'] = topology.routers
     else:
         config['routers'] = []
+    return config
+
+async def ensure_valid_config(emulator, config):
+    """
+    Статическая проверка конфигурации до построения сети: некорректная
+    топология отклоняется, не занимая ресурсы эмулятора
+    """
+    loop = asyncio.get_event_loop()
+    validation = await loop.run_in_executor(None, emulator.topology_validator.validate_config, config)
+    if not validation["valid"]:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Topology configuration is invalid",
+                "errors": validation["errors"],
+                "warnings": validation["warnings"]
+            }
+        )
+    return validation
+
+async def async_create_network(emulator, topology):
+    """Асинхронное создание сети в экземпляре эмулятора"""
+    config = topology_to_config(topology)
     
     loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, lambda: topology_manager.create_network(config))
+    await loop.run_in_executor(None, lambda: emulator_manager.create_network(emulator, config))
+
+async def async_reconcile_network(emulator, topology):
+    """Асинхронное применение изменений топологии к работающей сети экземпляра"""
+    config = topology_to_config(topology)
+    
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, lambda: emulator_manager.reconcile_network(emulator, config))
+
+async def async_stop_network(emulator):
+    """Асинхронная остановка сети экземпляра эмулятора"""
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, emulator_manager.stop, emulator.key)
 
-async def ensure_active_topology(current_user: User = None):
+async def ensure_active_topology(emulator, current_user: User = None):
     """
-    Убедиться, что в базе данных есть активная топология и Mininet
+    Убедиться, что в базе данных есть активная топология и сеть экземпляра запущена
     Возвращает модель базы данных активной топологии
     """
     try:
@@ -383,10 +416,10 @@ async def ensure_active_topology(current_user: User = None):
             active_topology.routers = []
             await sync_to_async(active_topology.save)()
         
-        if not topology_manager.is_running():
-            await async_create_network(active_topology)
+        if not emulator.topology.is_running():
+            await async_create_network(emulator, active_topology)
         
-        topology_manager.active_topology = active_topology
+        emulator.topology.active_topology = active_topology
         
         return active_topology
     except DjangoNetworkTopology.DoesNotExist:
@@ -394,25 +427,38 @@ async def ensure_active_topology(current_user: User = None):
             status_code=400, 
             detail="No active topology. Please create or activate a topology first."
         )
+    except InstanceLimitReached as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 @router.post("/topology/{topology_id}/activate")
-async def activate_topology(topology_id: int, current_user: User = Depends(get_current_active_user)):
+async def activate_topology(topology_id: int, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Активация сохранённой топологии и запуск эмулированной сети"""
+    topology_manager = emulator.topology
     try:
-        await deactivate_all_topologies_for_user(current_user)
-        
         topology = await get_topology_by_id_for_user(topology_id, current_user)
+        validation = await ensure_valid_config(emulator, topology_to_config(topology))
+        
+        await deactivate_all_topologies_for_user(current_user)
         
         topology.is_active = True
         await sync_to_async(topology.save)()
         
-        await async_cleanup_mininet()
-        
-        await async_create_network(topology)
+        if topology_manager.is_running():
+            try:
+                await async_reconcile_network(emulator, topology)
+            except Exception as reconcile_error:
+                print(f"Incremental activation failed, rebuilding network: {str(reconcile_error)}")
+                await async_stop_network(emulator)
+                await async_create_network(emulator, topology)
+        else:
+            await async_create_network(emulator, topology)
         
         topology_manager.active_topology = topology
         
-        print(f"Topology {topology.name} (ID: {topology_id}) activated successfully")
+        loop = asyncio.get_event_loop()
+        ready = await loop.run_in_executor(None, topology_manager.readiness.wait, READY_TIMEOUT)
+        
+        print(f"Topology {topology.name} (ID: {topology_id}) activated successfully, ready={ready}")
         
         if topology_manager.net:
             print("Verifying host IPs:")
@@ -449,25 +495,33 @@ async def activate_topology(topology_id: int, current_user: User = Depends(get_c
         return {
             "success": True,
             "message": f"Topology {topology.name} activated successfully",
-            "topology_id": topology_id
+            "topology_id": topology_id,
+            "build": topology_manager.last_build_report,
+            "ready": ready,
+            "readiness": topology_manager.readiness.get_status(),
+            "warnings": validation["warnings"]
         }
+    except HTTPException:
+        raise
     except DjangoNetworkTopology.DoesNotExist:
         raise HTTPException(
             status_code=404,
             detail=f"Topology with id {topology_id} not found"
         )
+    except InstanceLimitReached as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error activating topology: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/topology/{topology_id}")
-async def delete_topology(topology_id: int, current_user: User = Depends(get_current_active_user)):
+async def delete_topology(topology_id: int, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Удаление сохранённой топологии"""
     try:
         topology = await get_topology_by_id_for_user(topology_id, current_user)
         
         if topology.is_active:
-            await cleanup_mininet()
+            await async_stop_network(emulator)
         
         await sync_to_async(topology.delete)()
         
@@ -497,11 +551,22 @@ def get_active_packet_traces():
         'id', 'source_node', 'destination_node', 'state', 'current_node', 'route'
     ))
 
+def run_trace_job(emulator, trace_id, source_node, destination_node, packet_config):
+    """Выполнение трассировки в пуле планировщика"""
+    with emulator.use():
+        emulator.packet_tracer.start_trace(trace_id, source_node, destination_node, packet_config)
+
+def get_user_trace_job(trace_id, current_user):
+    job = trace_scheduler.get(trace_id)
+    return job if job is not None and job.owner == current_user.id else None
+
 @router.post("/packet/trace/start")
-async def start_packet_trace(trace_request: PacketTraceRequest, current_user: User = Depends(get_current_active_user)):
+async def start_packet_trace(trace_request: PacketTraceRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Запуск трассировки пакета через сеть"""
+    topology_manager = emulator.topology
+    packet_tracer = emulator.packet_tracer
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         if not hasattr(topology_manager, 'active_topology') or not topology_manager.active_topology:
             topology_manager.active_topology = active_topology
@@ -563,11 +628,16 @@ async def start_packet_trace(trace_request: PacketTraceRequest, current_user: Us
         
         trace_id = f"trace-{time.time()}"
         
-        from concurrent.futures import ThreadPoolExecutor
-        with ThreadPoolExecutor() as executor:
-            executor.submit(packet_tracer.start_trace, trace_id, trace_request.source_node, trace_request.destination_node, packet_config)
+        job = trace_scheduler.submit(
+            trace_id, run_trace_job, emulator, trace_id,
+            trace_request.source_node, trace_request.destination_node, packet_config,
+            owner=current_user.id,
+            on_cancel=lambda: packet_tracer.stop_trace(trace_id)
+        )
         
-        return {"trace_id": trace_id}
+        return {"trace_id": trace_id, "job": job.to_dict()}
+    except TraceQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(
@@ -575,11 +645,28 @@ async def start_packet_trace(trace_request: PacketTraceRequest, current_user: Us
             detail=f"Failed to start packet trace: {str(e)}"
         )
 
+@router.get("/packet/trace/cache")
+async def get_trace_cache_stats(current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """Метрики кэша маршрутов трассировки (попадания, промахи, инвалидации)"""
+    return emulator.topology.path_cache.get_stats()
+
 @router.get("/packet/trace/{trace_id}")
-async def get_packet_trace(trace_id: str):
+async def get_packet_trace(trace_id: str, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Получение текущего состояния пакета"""
+    packet_tracer = emulator.packet_tracer
     try:
+        job = get_user_trace_job(trace_id, current_user)
         trace_info = packet_tracer.get_trace_info(trace_id)
+        if job and not trace_info:
+            return {
+                "id": trace_id,
+                "state": job.state,
+                "hops": [],
+                "completed": job.finished_state,
+                "success": False,
+                "error": job.error,
+                "job": job.to_dict()
+            }
         if trace_info:
             success = (
                 trace_info["state"] == "completed" 
@@ -607,7 +694,8 @@ async def get_packet_trace(trace_id: str):
                 ],
                 "completed": trace_info["state"] == "completed",
                 "success": success,
-                "error": trace_info.get("error")
+                "error": trace_info.get("error"),
+                "job": job.to_dict() if job else None
             }
         
         try:
@@ -653,10 +741,72 @@ async def get_packet_trace(trace_id: str):
         print(f"Error retrieving trace {trace_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_sse(event, data, event_id=None):
+    """Сообщение Server-Sent Events"""
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return message + f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/packet/trace/{trace_id}/stream")
+async def stream_packet_trace(trace_id: str, cursor: int = 0, last_event_id: Optional[str] = Header(None), current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """
+    Поток прыжков трассировки (Server-Sent Events): событие hop на каждый
+    записанный прыжок (id - его номер) и итоговое событие complete.
+    Переподключение продолжается с cursor или с Last-Event-ID + 1.
+    """
+    packet_tracer = emulator.packet_tracer
+    job = get_user_trace_job(trace_id, current_user)
+    if job is None and trace_id not in packet_tracer.traces:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    if last_event_id and last_event_id.isdigit():
+        cursor = max(cursor, int(last_event_id) + 1)
+    cursor = max(0, cursor)
+
+    async def events():
+        changed = packet_tracer.events.subscribe(trace_id)
+        position = cursor
+        try:
+            while True:
+                changed.clear()
+                hops, completed = packet_tracer.hops_since(trace_id, position)
+                for hop in hops or []:
+                    yield format_sse("hop", {"index": position, **hop}, position)
+                    position += 1
+                # Задание, снятое или упавшее до создания трассировки (или вытесненная трассировка), завершает поток
+                if completed or (hops is None and (job is None or job.finished_state)):
+                    trace_info = packet_tracer.get_trace_info(trace_id) or {}
+                    yield format_sse("complete", {
+                        "id": trace_id,
+                        "state": trace_info.get("state", job.state if job else "completed"),
+                        "current_node": trace_info.get("current_node"),
+                        "success": bool(trace_info.get("success")),
+                        "error": trace_info.get("error") or (job.error if job else None),
+                        "hops": position,
+                        "job": job.to_dict() if job else None
+                    })
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), TRACE_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            packet_tracer.events.unsubscribe(trace_id, changed)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.delete("/packet/trace/{trace_id}")
-async def stop_packet_trace(trace_id: str):
+async def stop_packet_trace(trace_id: str, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Остановка пакетной трассировки"""
+    packet_tracer = emulator.packet_tracer
     try:
+        if get_user_trace_job(trace_id, current_user):
+            # Задание в очереди снимается без запуска, выполняющееся останавливается трассировщиком
+            trace_scheduler.cancel(trace_id)
+            return {"message": "Packet trace stopped"}
+
         if trace_id in packet_tracer.traces:
             packet_tracer.stop_trace(trace_id)
             return {"message": "Packet trace stopped"}
@@ -681,8 +831,9 @@ async def stop_packet_trace(trace_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/packet/send")
-async def send_packet(packet_config: PacketConfig):
+async def send_packet(packet_config: PacketConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Отправка пакета от узла"""
+    topology_manager = emulator.topology
     node = topology_manager.get_node(packet_config.source_node)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
@@ -692,18 +843,21 @@ async def send_packet(packet_config: PacketConfig):
         raise HTTPException(status_code=400, detail="Invalid packet configuration")
     
     try:
-        packet_manager.send_packet(node, packet, packet_config.interface)
+        packet_manager.send_packet(node, packet, packet_config.interface,
+                                   agent=topology_manager.scapy_agents.get(node))
         return {"message": "Packet sent successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/packet/ping")
-async def ping_host(request: PingRequest):
+async def ping_host(request: PingRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Пинг узла от узла-источника"""
+    topology_manager = emulator.topology
+    packet_tracer = emulator.packet_tracer
     try:
         count = request.count if request.count and request.count > 0 else 1
         
-        active_topology = await ensure_active_topology(None)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         if not hasattr(topology_manager, 'active_topology') or not topology_manager.active_topology:
             topology_manager.active_topology = active_topology
@@ -787,8 +941,9 @@ async def ping_host(request: PingRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/packet/tcp")
-async def tcp_connect(request: TcpRequest):
+async def tcp_connect(request: TcpRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Попытка установить TCP-соединение от узла-источника к узлу-назначению"""
+    topology_manager = emulator.topology
     source = topology_manager.get_node(request.source_node)
     if not source:
         raise HTTPException(status_code=404, detail="Source node not found")
@@ -804,8 +959,9 @@ async def tcp_connect(request: TcpRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/packet/udp")
-async def udp_send(request: UdpRequest):
+async def udp_send(request: UdpRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Отправка UDP-сообщения от узла-источника к узлу-назначению"""
+    topology_manager = emulator.topology
     source = topology_manager.get_node(request.source_node)
     if not source:
         raise HTTPException(status_code=404, detail="Source node not found")
@@ -821,9 +977,107 @@ async def udp_send(request: UdpRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/packet/rtt")
+async def measure_rtt(request: RttRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """Измерение RTT реальными ICMP-запросами между узлами"""
+    try:
+        await ensure_active_topology(emulator, current_user)
+        
+        loop = asyncio.get_event_loop()
+        with emulator.use():
+            return await loop.run_in_executor(None, lambda: emulator.measurement.rtt(
+                request.source_node, request.destination_ip, request.count or 10, request.interval or 0.2))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error measuring RTT: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/packet/ping/batch")
+async def ping_batch(request: PingBatchRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """
+    Пинг от одного узла к списку адресов или всей сети (Server-Sent Events):
+    событие destination на каждый адрес по мере опроса и итоговое summary
+    """
+    try:
+        await ensure_active_topology(emulator, current_user)
+        targets = emulator.measurement.sweep_targets(request.destinations, request.cidr)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error preparing ping batch: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        loop = asyncio.get_event_loop()
+        sweep = emulator.measurement.ping_sweep(request.source_node, targets, request.count or 1, request.timeout or 1)
+        index = 0
+        reachable = 0
+        with emulator.use():
+            while True:
+                try:
+                    summaries = await loop.run_in_executor(None, next, sweep, None)
+                except Exception as e:
+                    print(f"Error in ping batch: {str(e)}")
+                    yield format_sse("error", {"detail": str(e)})
+                    return
+                if summaries is None:
+                    break
+                for summary in summaries:
+                    reachable += summary["reachable"]
+                    yield format_sse("destination", summary, index)
+                    index += 1
+        yield format_sse("summary", {
+            "source": request.source_node,
+            "destinations": len(targets),
+            "reachable": reachable,
+            "unreachable": len(targets) - reachable
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/packet/throughput")
+async def measure_throughput(request: ThroughputRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """Измерение пропускной способности TCP/UDP между узлами"""
+    try:
+        await ensure_active_topology(emulator, current_user)
+        
+        loop = asyncio.get_event_loop()
+        with emulator.use():
+            return await loop.run_in_executor(None, lambda: emulator.measurement.throughput(
+                request.source_node, request.destination_node, request.protocol or 'tcp',
+                request.duration, request.bitrate, request.port or 5201))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error measuring throughput: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/packet/traffic")
+async def generate_traffic(request: TrafficRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """Генерация нагрузочного трафика потоками между узлами"""
+    try:
+        await ensure_active_topology(emulator, current_user)
+        
+        flows = [flow.model_dump() for flow in request.flows]
+        loop = asyncio.get_event_loop()
+        with emulator.use():
+            return await loop.run_in_executor(
+                None, lambda: emulator.traffic_generator.run(flows, request.duration))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error generating traffic: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/packet/http")
-async def http_request(request: HttpRequest):
+async def http_request(request: HttpRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Отправка HTTP GET-запроса от узла-источника к узлу-назначению"""
+    topology_manager = emulator.topology
     source = topology_manager.get_node(request.source_node)
     if not source:
         raise HTTPException(status_code=404, detail="Source node not found")
@@ -843,10 +1097,11 @@ def get_topology_by_name(name: str):
         return None
 
 @router.post("/node/host")
-async def add_host(config: NewHostConfig, current_user: User = Depends(get_current_active_user)):
+async def add_host(config: NewHostConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Добавление нового узла в активную топологию"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         print(f"Adding host with config: {config}")
         
@@ -906,10 +1161,11 @@ async def add_host(config: NewHostConfig, current_user: User = Depends(get_curre
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/node/switch")
-async def add_switch(config: NewSwitchConfig, current_user: User = Depends(get_current_active_user)):
+async def add_switch(config: NewSwitchConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Добавление нового коммутатора в активную топологию"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         print(f"Adding switch with config: {config}")
         
@@ -992,10 +1248,11 @@ async def add_switch(config: NewSwitchConfig, current_user: User = Depends(get_c
         )
 
 @router.post("/node/router")
-async def add_router(config: NewRouterConfig, current_user: User = Depends(get_current_active_user)):
+async def add_router(config: NewRouterConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Добавление нового маршрутизатора в активную топологию"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         print(f"Adding router with config: {config}")
         
@@ -1030,29 +1287,32 @@ async def add_router(config: NewRouterConfig, current_user: User = Depends(get_c
         
         ip_address = config.ip
         
-        if config.interfaces:
-            for intf in config.interfaces:
-                try:
-                    topology_manager.configure_router_interface(
-                        config.name,
-                        intf['name'],
-                        intf['ip'],
-                        intf.get('subnet_mask', 24)
-                    )
-                except Exception as e:
-                    print(f"Error configuring router interface: {str(e)}")
-        
-        if config.routes:
-            for route in config.routes:
-                try:
-                    topology_manager.add_route(
-                        config.name,
-                        route['network'],
-                        route.get('next_hop'),
-                        route.get('interface')
-                    )
-                except Exception as e:
-                    print(f"Error adding route to router: {str(e)}")
+        with topology_manager.command_batch() as batch:
+            if config.interfaces:
+                for intf in config.interfaces:
+                    try:
+                        topology_manager.configure_router_interface(
+                            config.name,
+                            intf['name'],
+                            intf['ip'],
+                            intf.get('subnet_mask', 24),
+                            batch=batch
+                        )
+                    except Exception as e:
+                        print(f"Error configuring router interface: {str(e)}")
+            
+            if config.routes:
+                for route in config.routes:
+                    try:
+                        topology_manager.add_route(
+                            config.name,
+                            route['network'],
+                            route.get('next_hop'),
+                            route.get('interface'),
+                            batch=batch
+                        )
+                    except Exception as e:
+                        print(f"Error adding route to router: {str(e)}")
         
         try:
             if not hasattr(active_topology, 'routers'):
@@ -1096,10 +1356,11 @@ async def add_router(config: NewRouterConfig, current_user: User = Depends(get_c
         )
 
 @router.delete("/node/router/{router_name}")
-async def delete_router(router_name: str, current_user: User = Depends(get_current_active_user)):
+async def delete_router(router_name: str, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Удаление маршрутизатора из активной топологии"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         if not hasattr(active_topology, 'routers'):
             raise HTTPException(
@@ -1143,6 +1404,8 @@ async def delete_router(router_name: str, current_user: User = Depends(get_curre
                 
                 if router_name in topology_manager.nodes:
                     del topology_manager.nodes[router_name]
+                topology_manager.release_node_ips(router_name)
+                topology_manager.notify_changed(nodes=[router_name])
                     
                 print(f"Router {router_name} removed from network")
             except Exception as e:
@@ -1166,10 +1429,11 @@ async def delete_router(router_name: str, current_user: User = Depends(get_curre
         )
 
 @router.put("/node/router/ip")
-async def update_router_ip(config: UpdateRouterIpConfig, current_user: User = Depends(get_current_active_user)):
+async def update_router_ip(config: UpdateRouterIpConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Обновление IP-адреса маршрутизатора"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         if not hasattr(active_topology, 'routers'):
             raise HTTPException(
@@ -1232,10 +1496,11 @@ async def update_router_ip(config: UpdateRouterIpConfig, current_user: User = De
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/link")
-async def add_link(config: NewLinkConfig, current_user: User = Depends(get_current_active_user)):
+async def add_link(config: NewLinkConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Добавление новой связи между двумя узлами в активную топологию"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         print(f"Adding link between {config.node1} and {config.node2}")
         print(f"Current topology state: nodes={list(topology_manager.nodes.keys() if topology_manager.nodes else [])}")
@@ -1305,10 +1570,11 @@ async def add_link(config: NewLinkConfig, current_user: User = Depends(get_curre
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/link")
-async def delete_link(config: DeleteLinkConfig, current_user: User = Depends(get_current_active_user)):
+async def delete_link(config: DeleteLinkConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Удаление связи между двумя узлами"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         node1 = topology_manager.get_node(config.node1)
         node2 = topology_manager.get_node(config.node2)
@@ -1317,6 +1583,7 @@ async def delete_link(config: DeleteLinkConfig, current_user: User = Depends(get
             raise HTTPException(status_code=404, detail="One or both nodes not found")
             
         topology_manager.net.delLinkBetween(node1, node2)
+        topology_manager.notify_changed(nodes=[config.node1, config.node2])
         
         return {
             "message": "Link deleted successfully",
@@ -1327,10 +1594,10 @@ async def delete_link(config: DeleteLinkConfig, current_user: User = Depends(get
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/node/display-name")
-async def update_display_name(config: UpdateDisplayNameConfig, current_user: User = Depends(get_current_active_user)):
+async def update_display_name(config: UpdateDisplayNameConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Обновление имени узла"""
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         for host in active_topology.hosts:
             if host['name'] == config.name:
@@ -1374,11 +1641,11 @@ async def update_display_name(config: UpdateDisplayNameConfig, current_user: Use
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/node/position")
-async def update_node_position(config: UpdateNodePositionConfig, current_user: User = Depends(get_current_active_user)):
+async def update_node_position(config: UpdateNodePositionConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Обновление позиции (координат x, y) узла"""
     try:
         print(f"Received position update request: {config}")
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         for host in active_topology.hosts:
             if host['name'] == config.name:
@@ -1436,10 +1703,11 @@ async def update_node_position(config: UpdateNodePositionConfig, current_user: U
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/node/host/ip")
-async def update_host_ip(config: UpdateHostIpConfig, current_user: User = Depends(get_current_active_user)):
+async def update_host_ip(config: UpdateHostIpConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Update the IP address of a host"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         host_found = False
         for host in active_topology.hosts:
@@ -1462,18 +1730,12 @@ async def update_host_ip(config: UpdateHostIpConfig, current_user: User = Depend
             )
             
         try:
-            ip_parts = config.ip.split('/')
-            ip = ip_parts[0]
-            netmask = '24'
-            if len(ip_parts) > 1:
-                netmask = ip_parts[1]
-                
-            host_node.setIP(ip, f"/{netmask}")
+            topology_manager.set_host_ip(config.name, config.ip)
             print(f"Updated IP for host {config.name} to {config.ip}")
             
-            host_node.cmd('sysctl -w net.ipv4.ip_forward=1')
+            topology_manager.set_node_sysctl(host_node, 'net.ipv4.ip_forward', 1)
             
-            check_result = host_node.cmd("ip -o -4 addr show")
+            check_result = topology_manager.get_interface_addresses(config.name)
             print(f"IP verification for {config.name}: {check_result}")
             
             await sync_to_async(active_topology.save)()
@@ -1498,10 +1760,11 @@ async def update_host_ip(config: UpdateHostIpConfig, current_user: User = Depend
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/node/switch/ip")
-async def update_switch_ip(config: UpdateSwitchIpConfig, current_user: User = Depends(get_current_active_user)):
+async def update_switch_ip(config: UpdateSwitchIpConfig, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Update the management IP address of a switch"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         switch_found = False
         for switch in active_topology.switches:
@@ -1541,11 +1804,28 @@ async def update_switch_ip(config: UpdateSwitchIpConfig, current_user: User = De
         print(f"Error updating switch IP: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/topology-ready")
+async def get_topology_readiness(wait: float = 0, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """Готовность активной сети; при wait > 0 ожидание готовности до wait секунд"""
+    topology_manager = emulator.topology
+    if wait > 0:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, topology_manager.readiness.wait, min(wait, READY_TIMEOUT))
+    return topology_manager.readiness.get_status()
+
+@router.get("/emulators")
+async def get_emulator_stats(current_user: User = Depends(get_current_active_user)):
+    """Состояние экземпляров эмулятора (только для преподавателей)"""
+    if not current_user.is_staff:
+        raise HTTPException(status_code=403, detail="Only educators can view emulator instances")
+    return {**emulator_manager.get_stats(), "trace_jobs": trace_scheduler.get_stats()}
+
 @router.get("/topology-validate")
-async def validate_topology(current_user: User = Depends(get_current_active_user)):
+async def validate_topology(current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Валидация активной топологии"""
+    topology_validator = emulator.topology_validator
     try:
-        await ensure_active_topology(current_user)
+        await ensure_active_topology(emulator, current_user)
         
         validation_result = topology_validator.validate_topology()
         
@@ -1555,11 +1835,71 @@ async def validate_topology(current_user: User = Depends(get_current_active_user
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/topology/reachability")
+async def get_reachability_matrix(current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
+    """Матрица достижимости хост x хост активной топологии по модели пересылки"""
+    topology_manager = emulator.topology
+    try:
+        await ensure_active_topology(emulator, current_user)
+        
+        loop = asyncio.get_event_loop()
+        matrix = await loop.run_in_executor(
+            None, lambda: reachability_matrix(topology_manager.get_forwarding_model()))
+        # Матрица из примитивов - без поэлементного jsonable_encoder
+        return JSONResponse(matrix)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error computing reachability matrix: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/simulation/{topology_id}/trace")
+async def simulate_packet_trace(topology_id: int, trace_request: PacketTraceRequest, current_user: User = Depends(get_current_active_user)):
+    """Трассировка пакета в симуляции сохранённой топологии (без запуска Mininet)"""
+    try:
+        topology = await get_topology_by_id_for_user(topology_id, current_user)
+        tracer = get_simulated_tracer(topology)
+
+        protocol = trace_request.protocol.lower() if trace_request.protocol else "icmp"
+        packet_config = {**trace_request.packet_config, "protocol": protocol}
+        if protocol in ["tcp", "udp", "http"]:
+            packet_config["dport"] = trace_request.destination_port if trace_request.destination_port else (80 if protocol == "http" else 8080)
+
+        trace_id = f"sim-trace-{time.time()}"
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, tracer.start_trace, trace_id,
+            trace_request.source_node, trace_request.destination_node, packet_config)
+        return {"id": trace_id, **tracer.get_trace_info(trace_id)}
+    except DjangoNetworkTopology.DoesNotExist:
+        raise HTTPException(status_code=404, detail=f"Topology {topology_id} not found or you don't have access to it")
+    except Exception as e:
+        print(f"Error simulating packet trace: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Failed to simulate packet trace: {str(e)}")
+
+@router.post("/simulation/{topology_id}/ping")
+async def simulate_ping(topology_id: int, request: PingRequest, current_user: User = Depends(get_current_active_user)):
+    """Пинг в симуляции сохранённой топологии (без запуска Mininet)"""
+    try:
+        topology = await get_topology_by_id_for_user(topology_id, current_user)
+        tracer = get_simulated_tracer(topology)
+        count = request.count if request.count and request.count > 0 else 1
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, tracer.ping, request.source_node, request.destination_ip, count)
+    except DjangoNetworkTopology.DoesNotExist:
+        raise HTTPException(status_code=404, detail=f"Topology {topology_id} not found or you don't have access to it")
+    except Exception as e:
+        print(f"Error simulating ping: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/node/host/{host_id}")
-async def delete_host(host_id: str, current_user: User = Depends(get_current_active_user)):
+async def delete_host(host_id: str, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Удалить хост из активной топологии"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         host_index = None
         for i, host in enumerate(active_topology.hosts):
@@ -1582,6 +1922,8 @@ async def delete_host(host_id: str, current_user: User = Depends(get_current_act
                         
                 topology_manager.net.delHost(host_node)
                 del topology_manager.nodes[host_id]
+                topology_manager.notify_changed(nodes=[host_id])
+            topology_manager.release_node_ips(host_id)
         except Exception as e:
             print(f"Ошибка при удалении хоста из Mininet: {str(e)}")
         
@@ -1605,10 +1947,11 @@ async def delete_host(host_id: str, current_user: User = Depends(get_current_act
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/node/switch/{switch_id}")
-async def delete_switch(switch_id: str, current_user: User = Depends(get_current_active_user)):
+async def delete_switch(switch_id: str, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Удалить коммутатор из активной топологии"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         switch_index = None
         for i, switch in enumerate(active_topology.switches):
@@ -1631,6 +1974,9 @@ async def delete_switch(switch_id: str, current_user: User = Depends(get_current
                         
                 topology_manager.net.delSwitch(switch_node)
                 del topology_manager.nodes[switch_id]
+                topology_manager.notify_changed(nodes=[switch_id])
+            topology_manager.release_node_ips(switch_id)
+            topology_manager.switch_ip_map.pop(switch_id, None)
         except Exception as e:
             print(f"Ошибка при удалении коммутатора из Mininet: {str(e)}")
         
@@ -1654,10 +2000,11 @@ async def delete_switch(switch_id: str, current_user: User = Depends(get_current
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/node/router/interface")
-async def configure_router_interface(config: ConfigureRouterInterfaceRequest, current_user: User = Depends(get_current_active_user)):
+async def configure_router_interface(config: ConfigureRouterInterfaceRequest, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Настройка интерфейса маршрутизатора"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         if not hasattr(active_topology, 'routers'):
             raise HTTPException(
@@ -1744,10 +2091,11 @@ async def configure_router_interface(config: ConfigureRouterInterfaceRequest, cu
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/node/router/{router_id}/interfaces")
-async def get_router_interfaces(router_id: str, current_user: User = Depends(get_current_active_user)):
+async def get_router_interfaces(router_id: str, current_user: User = Depends(get_current_active_user), emulator: EmulatorInstance = Depends(get_user_emulator)):
     """Получение всех интерфейсов из маршрутизатора"""
+    topology_manager = emulator.topology
     try:
-        active_topology = await ensure_active_topology(current_user)
+        active_topology = await ensure_active_topology(emulator, current_user)
         
         if not hasattr(active_topology, 'routers'):
             raise HTTPException(
@@ -1778,22 +2126,16 @@ async def get_router_interfaces(router_id: str, current_user: User = Depends(get
         
         mininet_interfaces = []
         try:
+            addresses = {}
+            for addr in topology_manager.get_interface_addresses(router_id):
+                addresses.setdefault(addr["interface"], addr)
             for intf in router_node.intfList():
                 if intf.name != 'lo':
-                    ip_cmd_result = router_node.cmd(f"ip -o -4 addr show {intf.name}")
-                    ip_address = None
-                    subnet_mask = None
-                    
-                    if ip_cmd_result:
-                        ip_match = re.search(r'inet\s+(\d+\.\d+\.\d+\.\d+)(?:/(\d+))?', ip_cmd_result)
-                        if ip_match:
-                            ip_address = ip_match.group(1)
-                            subnet_mask = int(ip_match.group(2) or 24)
-                    
+                    addr = addresses.get(intf.name)
                     mininet_interfaces.append({
                         "name": intf.name,
-                        "ip": f"{ip_address}/{subnet_mask}" if ip_address else None,
-                        "subnet_mask": subnet_mask
+                        "ip": f"{addr['address']}/{addr['prefixlen']}" if addr else None,
+                        "subnet_mask": addr['prefixlen'] if addr else None
                     })
         except Exception as e:
             print(f"Error retrieving interfaces from Mininet for router {router_id}: {str(e)}")
@@ -49,6 +49,76 @@ export async function fetchWithAuth(endpoint: string, options: RequestInit = {})
     return response.json();
 }
 
+export interface TraceStreamHandlers {
+    onHop: (hop: any) => void;
+    onComplete: (result: any) => void;
+}
+
+// Чтение потока прыжков трассировки (Server-Sent Events). EventSource не передаёт
+// заголовок Authorization, поэтому поток читается через fetch.
+// Возвращает true, если получено итоговое событие complete.
+export async function streamTrace(traceId: string | number, cursor: number, handlers: TraceStreamHandlers, signal?: AbortSignal) {
+    const token = localStorage.getItem('token');
+
+    const response = await fetch(`${API_URL}/api/network/packet/trace/${traceId}/stream?cursor=${cursor}`, {
+        headers: {
+            'Accept': 'text/event-stream',
+            ...(token && { 'Authorization': `Bearer ${token}` }),
+        },
+        credentials: 'include',
+        signal,
+    });
+
+    if (response.status === 401) {
+        throw new Error('Authentication required. Please log in to continue.');
+    }
+
+    if (!response.ok || !response.body) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.detail || `API Error: ${response.status} ${response.statusText}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            return false;
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        let separator = buffer.indexOf('\n\n');
+        while (separator !== -1) {
+            const message = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+            separator = buffer.indexOf('\n\n');
+
+            let event = 'message';
+            let data = '';
+            for (const line of message.split('\n')) {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            }
+            if (!data) {
+                continue;
+            }
+
+            if (event === 'hop') {
+                handlers.onHop(JSON.parse(data));
+            } else if (event === 'complete') {
+                handlers.onComplete(JSON.parse(data));
+                await reader.cancel();
+                return true;
+            }
+        }
+    }
+}
+
 
 export async function fetchWithDjangoAuth(endpoint: string, options: RequestInit = {}) {
     const token = localStorage.getItem('token');
@@ -219,6 +289,9 @@ export const packetApi = {
 
     getTrace: (traceId: number) => fetchWithAuth(`/api/network/packet/trace/${traceId}`),
 
+    streamTrace: (traceId: number, cursor: number, handlers: TraceStreamHandlers, signal?: AbortSignal) =>
+        streamTrace(traceId, cursor, handlers, signal),
+
     ping: (data: any) => fetchWithAuth('/api/network/packet/ping', {
         method: 'POST',
         body: JSON.stringify(data),
@@ -59,7 +59,7 @@ export function PacketTracer({ devices, onClose }: PacketTracerProps) {
     const [traceResult, setTraceResult] = useState<TraceResult | null>(null);
     const [pingResult, setPingResult] = useState<PingResult | null>(null);
     const [traceId, setTraceId] = useState<number | null>(null);
-    const [polling, setPolling] = useState(false);
+    const [streaming, setStreaming] = useState(false);
     const [pingCount, setPingCount] = useState(4);
     const [selectedTool, setSelectedTool] = useState<ToolType>('trace');
     const [isRunning, setIsRunning] = useState(false);
@@ -99,8 +99,20 @@ export function PacketTracer({ devices, onClose }: PacketTracerProps) {
                 },
             });
 
+            setTraceResult({
+                id: data.trace_id,
+                source_node: source,
+                destination_node: destination,
+                state: data.job?.state || 'queued',
+                current_node: source,
+                route: [],
+                hops: [],
+                completed: false,
+                success: false,
+                error: null
+            });
             setTraceId(data.trace_id);
-            setPolling(true);
+            setStreaming(true);
         } catch (error) {
             console.error('Error starting trace:', error);
             if (error instanceof Error && error.message.includes('Authentication required')) {
@@ -138,41 +150,70 @@ export function PacketTracer({ devices, onClose }: PacketTracerProps) {
     };
 
     useEffect(() => {
-        let pollInterval: NodeJS.Timeout;
+        if (!traceId || !streaming) {
+            return;
+        }
+
+        const controller = new AbortController();
+        // Номер следующего прыжка - курсор для переподключения без повторной загрузки
+        let cursor = 0;
 
-        const pollTrace = async () => {
-            if (traceId && polling) {
+        const streamHops = async () => {
+            for (let attempt = 0; attempt < 5 && !controller.signal.aborted; attempt++) {
                 try {
-                    const data = await packetApi.getTrace(traceId);
-                    setTraceResult(data);
+                    const finished = await packetApi.streamTrace(traceId, cursor, {
+                        onHop: hop => {
+                            cursor = hop.index + 1;
+                            setTraceResult(prev => prev && {
+                                ...prev,
+                                state: 'in_progress',
+                                current_node: hop.node,
+                                hops: [...prev.hops, hop]
+                            });
+                        },
+                        onComplete: result => {
+                            setTraceResult(prev => prev && {
+                                ...prev,
+                                state: result.state,
+                                current_node: result.current_node || prev.current_node,
+                                completed: true,
+                                success: result.success,
+                                error: result.error
+                            });
+                        }
+                    }, controller.signal);
 
-                    if (data.completed || data.error) {
-                        setPolling(false);
-                        setIsRunning(false);
+                    if (finished) {
+                        break;
                     }
                 } catch (error) {
-                    console.error('Error polling trace:', error);
+                    if (controller.signal.aborted) {
+                        return;
+                    }
+                    console.error('Error streaming trace:', error);
                     if (error instanceof Error && error.message.includes('Authentication required')) {
                         router.push('/auth/login');
-                    } else {
+                        return;
+                    }
+                    if (attempt === 4) {
                         setError(error instanceof Error ? error.message : 'Failed to get trace results');
                     }
-                    setPolling(false);
-                    setIsRunning(false);
                 }
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+
+            if (!controller.signal.aborted) {
+                setStreaming(false);
+                setIsRunning(false);
             }
         };
 
-        if (polling) {
-            pollInterval = setInterval(pollTrace, 1000);
-        }
+        streamHops();
 
         return () => {
-            if (pollInterval) {
-                clearInterval(pollInterval);
-            }
+            controller.abort();
         };
-    }, [traceId, polling, router]);
+    }, [traceId, streaming, router]);
 
     const formatTraceResults = (result: TraceResult) => {
         return (